@@ -0,0 +1,294 @@
+"""Local OpenAI-compatible mock of the OpenRouter chat completions API.
+
+Streams Server-Sent Events at a configurable token rate, so the pages can be
+benchmarked offline and deterministically:
+
+    python benchmarks/mock_openrouter.py --port 8787 --tokens-per-second 60
+    OPENROUTER_BASE_URL=http://127.0.0.1:8787/v1 streamlit run "0_🏠_Home.py"
+
+The reply shape follows the request: translation requests get the
+Translator's JSON, diagram requests get a Mermaid block, everything else
+gets markdown prose with a code fence. Usage is reported with a simulated
+prompt cache: prefixes up to a `cache_control` breakpoint are remembered and
+counted as cached tokens when a later request repeats them.
+"""
+
+import argparse
+import itertools
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_WORDS = (
+    "the system streams each token to the page as soon as it arrives while the "
+    "renderer batches chunks into frames and commits finished blocks once so long "
+    "answers stay cheap to display even when the model is fast"
+).split()
+
+
+@dataclass
+class MockConfig:
+    tokens_per_second: float = 80.0
+    chunk_tokens: int = 3
+    latency: float = 0.2              # seconds before the first chunk
+    model_latency: dict = field(default_factory=dict)  # per-model override of latency
+    response_tokens: int = 400
+    special_tokens: list = field(default_factory=lambda: ["<|im_end|>", "<s>"])
+    inject_every: int = 25            # chunks between injected special tokens (0 = never)
+    fail_rate: float = 0.0            # share of requests answered with a 503
+    drop_rate: float = 0.0            # share of streams cut off halfway through
+    stats: dict = field(default_factory=lambda: {"requests": 0, "first_chunk_at": None})
+    prompt_cache: set = field(default_factory=set)  # prefixes cached at a breakpoint
+
+
+def _text(content):
+    """Text of a message content: a string or a list of content parts."""
+    if isinstance(content, list):
+        return "".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content or ""
+
+
+def _tokens(text):
+    return max(len(text) // 4, 1)
+
+
+def prompt_usage(request, config):
+    """(prompt tokens, cached tokens), caching the prefix up to each breakpoint."""
+    messages = request.get("messages", [])
+    texts = [f"{m.get('role')}:{_text(m.get('content'))}" for m in messages]
+    prompt_tokens = sum(_tokens(text) for text in texts)
+    cached = 0
+    for index, message in enumerate(messages):
+        content = message.get("content")
+        if not isinstance(content, list) or not any("cache_control" in part for part in content):
+            continue
+        prefix = "\n".join(texts[:index + 1])
+        if prefix in config.prompt_cache:
+            cached = max(cached, sum(_tokens(text) for text in texts[:index + 1]))
+        config.prompt_cache.add(prefix)
+    return prompt_tokens, cached
+
+
+def _usage(prompt_tokens, cached, text):
+    completion_tokens = len(text) // 4
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "prompt_tokens_details": {"cached_tokens": cached},
+    }
+
+
+def _prose(tokens):
+    words = itertools.islice(itertools.cycle(_WORDS), tokens)
+    paragraphs = []
+    current = []
+    for index, word in enumerate(words, start=1):
+        current.append(word)
+        if index % 60 == 0:
+            paragraphs.append(" ".join(current).capitalize() + ".")
+            current = []
+        if index % 150 == 0:
+            paragraphs.append("```python\nfor chunk in stream:\n    render(chunk)\n```")
+    if current:
+        paragraphs.append(" ".join(current).capitalize() + ".")
+    return "\n\n".join(paragraphs)
+
+
+def build_reply(request, config):
+    """Pick a reply matching what the page asked for."""
+    messages = request.get("messages", [])
+    if messages and messages[-1].get("role") == "assistant":
+        # Assistant prefill: continue the deterministic reply from where it stopped
+        prefill = _text(messages[-1]["content"])
+        full = build_reply({**request, "messages": messages[:-1]}, config)
+        return full[len(prefill):] if full.startswith(prefill) else full
+    system = " ".join(_text(m["content"]) for m in messages if m.get("role") == "system")
+    if "JSON format" in system:
+        text = _prose(min(config.response_tokens, 120))
+        return json.dumps({
+            "detected_language": "French",
+            "confidence_detection": "High",
+            "original_text": _text(messages[-1]["content"])[-200:],
+            "translated_text": text,
+            "confidence_translation": "High",
+            "alternatives": ["An alternative phrasing", "Another option"],
+            "cultural_notes": "A common, polite greeting.",
+            "is_same_language": False,
+        }, ensure_ascii=False, indent=2)
+    if "Identify the language" in system:
+        return "French"
+    if "one translated line per input line" in system:
+        # Live translation: one line back per sentence line after the target language
+        lines = _text(messages[-1]["content"]).split("\n\n", 1)[-1].splitlines()
+        return "\n".join(f"[translated] {line}" for line in lines)
+    if "Mermaid" in system:
+        return (
+            "```mermaid\nflowchart TD\n    A[Client] --> B[API Gateway]\n    B --> C[Service]\n"
+            "    C --> D[(Database)]\n```\n\n" + _prose(config.response_tokens // 2)
+        )
+    return _prose(config.response_tokens)
+
+
+def _chunks(text, config):
+    """Split text into ~chunk_tokens-sized pieces, splicing in special tokens."""
+    size = max(config.chunk_tokens * 4, 1)
+    pieces = [text[i:i + size] for i in range(0, len(text), size)]
+    if config.inject_every and config.special_tokens:
+        tokens = itertools.cycle(config.special_tokens)
+        for index in range(config.inject_every, len(pieces), config.inject_every):
+            # Split the token across two chunks to exercise boundary handling
+            token = next(tokens)
+            half = len(token) // 2
+            pieces[index - 1] += token[:half]
+            pieces[index] = token[half:] + pieces[index]
+    return pieces
+
+
+def make_handler(config):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            config.stats["requests"] += 1
+            if random.random() < config.fail_rate:
+                self._send_json({"error": {"message": "Mock provider overloaded", "code": 503}}, status=503)
+                return
+            text = build_reply(request, config)
+            model = request.get("model", "mock/model")
+            prompt_tokens, cached = prompt_usage(request, config)
+
+            if not request.get("stream"):
+                time.sleep(config.model_latency.get(model, config.latency))
+                self._send_json({
+                    "id": "mock", "object": "chat.completion", "created": int(time.time()), "model": model,
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                    "usage": _usage(prompt_tokens, cached, text),
+                })
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            time.sleep(config.model_latency.get(model, config.latency))
+            delay = config.chunk_tokens / config.tokens_per_second if config.tokens_per_second else 0
+            pieces = _chunks(text, config)
+            # A forced tool call streams the reply as the call's arguments
+            tool = (request.get("tool_choice") or {}).get("function", {}).get("name") if request.get("tools") else None
+            drop_at = len(pieces) // 2 if random.random() < config.drop_rate else None
+            try:
+                for index, piece in enumerate(pieces):
+                    if index == drop_at:
+                        # Simulate a connection lost mid-answer
+                        self.close_connection = True
+                        return
+                    if index == 0:
+                        config.stats["first_chunk_at"] = time.perf_counter()
+                    if tool:
+                        call = {"index": 0, "function": {"arguments": piece}}
+                        if index == 0:
+                            call.update(id="call_mock", type="function")
+                            call["function"]["name"] = tool
+                        delta = {"tool_calls": [call]}
+                    else:
+                        delta = {"content": piece}
+                    self._send_event({
+                        "id": "mock", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                        "choices": [{"index": 0, "delta": delta, "finish_reason": None}],
+                    })
+                    time.sleep(delay)
+                self._send_event({
+                    "id": "mock", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                    "choices": [{"index": 0, "delta": {}, "finish_reason": "tool_calls" if tool else "stop"}],
+                })
+                if (request.get("stream_options") or {}).get("include_usage"):
+                    self._send_event({
+                        "id": "mock", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                        "choices": [], "usage": _usage(prompt_tokens, cached, text),
+                    })
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                # The client closed the stream early
+                pass
+            self.close_connection = True
+
+        def _send_event(self, payload):
+            self.wfile.write(f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        def _send_json(self, payload, status=200):
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return Handler
+
+
+def start_server(config, host="127.0.0.1", port=0):
+    """Start the mock in a background thread; returns (server, base_url)."""
+    server = ThreadingHTTPServer((host, port), make_handler(config))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_port}/v1"
+
+
+def add_arguments(parser):
+    parser.add_argument("--tokens-per-second", type=float, default=80.0)
+    parser.add_argument("--chunk-tokens", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds before the first chunk")
+    parser.add_argument(
+        "--model-latency", nargs="*", default=[], metavar="MODEL=SECONDS",
+        help="Per-model first-chunk latency, e.g. to benchmark the fastest-wins mode"
+    )
+    parser.add_argument("--response-tokens", type=int, default=400)
+    parser.add_argument("--special-tokens", nargs="*", default=["<|im_end|>", "<s>"])
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Share of requests answered with a 503")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="Share of streams cut off halfway through")
+    parser.add_argument("--inject-every", type=int, default=25, help="Chunks between injected special tokens (0 = never)")
+
+
+def config_from_args(args):
+    return MockConfig(
+        tokens_per_second=args.tokens_per_second,
+        chunk_tokens=args.chunk_tokens,
+        latency=args.latency,
+        model_latency={model: float(seconds) for model, _, seconds in (item.rpartition("=") for item in args.model_latency)},
+        response_tokens=args.response_tokens,
+        special_tokens=args.special_tokens,
+        inject_every=args.inject_every,
+        fail_rate=args.fail_rate,
+        drop_rate=args.drop_rate,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    server, base_url = start_server(config_from_args(args), args.host, args.port)
+    print(f"Mock OpenRouter listening on {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
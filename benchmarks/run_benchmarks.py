@@ -0,0 +1,194 @@
+"""Offline page benchmarks driven through Streamlit's AppTest.
+
+Starts the mock OpenRouter server, points the app at it and drives each page
+through a realistic interaction, reporting per page:
+
+- rerun:   time for an idle script rerun with the preloaded history
+- turn:    time for the rerun that streams an answer
+- ttft:    time from the request to the first element sent after the first
+           streamed chunk (time to first rendered token)
+- render:  bytes of page updates sent during the answer
+- peak:    peak Python memory allocated during the answer
+- leaks:   special tokens that made it into the rendered page
+
+    python benchmarks/run_benchmarks.py --history 200 --repeat 3 --json results.json
+"""
+
+import argparse
+import glob
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCHMARK_DIR)
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, BENCHMARK_DIR)
+
+from mock_openrouter import add_arguments, config_from_args, start_server  # noqa: E402
+
+PAGES = {
+    "chatbot": "pages/1_*.py",
+    "diagram": "pages/2_*.py",
+    "personality": "pages/3_*.py",
+    "translator": "pages/4_*.py",
+}
+
+
+class RenderRecorder:
+    """Records the time and size of every message a script run sends to the browser."""
+
+    def __init__(self):
+        self.events = []
+        self.recording = False
+
+    def install(self):
+        from streamlit.runtime.scriptrunner_utils.script_run_context import ScriptRunContext
+
+        recorder = self
+        original = ScriptRunContext.enqueue
+
+        def enqueue(ctx, msg):
+            if recorder.recording:
+                recorder.events.append((time.perf_counter(), msg.ByteSize()))
+            return original(ctx, msg)
+
+        ScriptRunContext.enqueue = enqueue
+
+    def start(self):
+        self.events = []
+        self.recording = True
+
+    def stop(self):
+        self.recording = False
+
+
+def _history(page, count):
+    # Imported late so the store opens inside the benchmark's data directory
+    from utils.conversations import ConversationStore
+
+    conversation = ConversationStore().new(page)
+    for index in range(count):
+        conversation.append({
+            "role": "user" if index % 2 == 0 else "assistant",
+            "content": f"Message {index}: " + "some earlier discussion about streaming and rendering " * 8,
+        })
+    return conversation
+
+
+def _button(at, prefix):
+    return next(button for button in at.button if button.label.startswith(prefix))
+
+
+def _interact(page, at, run_index, history):
+    """Set up history and return a callable that performs the measured interaction."""
+    prompt = f"Explain how streaming works (run {run_index})"
+    if page == "chatbot":
+        at.session_state.messages = _history("chatbot", history)
+        return lambda: at.chat_input[0].set_value(prompt).run()
+    if page == "personality":
+        at.session_state.personality_messages = _history("personality", history)
+        return lambda: at.chat_input[0].set_value(prompt).run()
+    if page == "diagram":
+        at.text_area[0].set_value(f"Create a flowchart for a CI/CD pipeline (run {run_index})")
+        return lambda: _button(at, "📊").click().run()
+    if page == "translator":
+        at.text_area(key="translation_input").set_value(f"Bonjour, comment allez-vous ? ({run_index})")
+        return lambda: _button(at, "🌐 Translate").click().run()
+    raise ValueError(page)
+
+
+def benchmark_page(page, args, config, recorder):
+    from streamlit.testing.v1 import AppTest
+
+    path = glob.glob(os.path.join(REPO_ROOT, PAGES[page]))[0]
+    runs = []
+    for run_index in range(args.warmup + args.repeat):
+        at = AppTest.from_file(path, default_timeout=args.timeout)
+        at.run()
+        at.sidebar.text_input[0].set_value("sk-benchmark").run()
+        interaction = _interact(page, at, run_index, args.history)
+
+        started = time.perf_counter()
+        at.run()
+        rerun = time.perf_counter() - started
+
+        config.stats["first_chunk_at"] = None
+        tracemalloc.start()
+        recorder.start()
+        started = time.perf_counter()
+        interaction()
+        turn = time.perf_counter() - started
+        recorder.stop()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        if at.exception:
+            raise RuntimeError(f"{page}: {at.exception[0].value}")
+        if run_index < args.warmup:
+            continue
+
+        first_chunk = config.stats["first_chunk_at"]
+        rendered_after = [at_time for at_time, _ in recorder.events if first_chunk and at_time >= first_chunk]
+        rendered_text = " ".join(str(element.value) for element in at.markdown)
+        runs.append({
+            "rerun_ms": rerun * 1000,
+            "turn_s": turn,
+            "ttft_ms": (rendered_after[0] - started) * 1000 if rendered_after else None,
+            "render_kb": sum(size for _, size in recorder.events) / 1024,
+            "peak_mb": peak / (1024 * 1024),
+            "leaks": sum(rendered_text.count(token) for token in config.special_tokens),
+        })
+
+    summary = {}
+    for metric in runs[0]:
+        values = [run[metric] for run in runs if run[metric] is not None]
+        summary[metric] = statistics.median(values) if values else None
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", nargs="*", choices=list(PAGES), default=list(PAGES))
+    parser.add_argument("--history", type=int, default=100, help="Messages preloaded into chat pages")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--warmup", type=int, default=1, help="Unmeasured runs per page (imports, pools)")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--json", help="Write the results to this file")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    config = config_from_args(args)
+    server, base_url = start_server(config)
+
+    # Must be set before the app modules are imported by the first AppTest run
+    os.environ["OPENROUTER_BASE_URL"] = base_url
+    os.environ.setdefault("AI_WORLD_DATA_DIR", tempfile.mkdtemp(prefix="ai-world-bench-"))
+
+    recorder = RenderRecorder()
+    recorder.install()
+
+    results = {}
+    for page in args.pages:
+        results[page] = benchmark_page(page, args, config, recorder)
+    server.shutdown()
+
+    print(f"{'page':<12} {'rerun ms':>9} {'turn s':>7} {'ttft ms':>8} {'render KB':>10} {'peak MB':>8} {'leaks':>6}")
+    for page, summary in results.items():
+        ttft = f"{summary['ttft_ms']:.0f}" if summary["ttft_ms"] is not None else "-"
+        print(
+            f"{page:<12} {summary['rerun_ms']:>9.1f} {summary['turn_s']:>7.2f} {ttft:>8} "
+            f"{summary['render_kb']:>10.1f} {summary['peak_mb']:>8.1f} {summary['leaks']:>6.0f}"
+        )
+
+    if args.json:
+        with open(args.json, "w") as handle:
+            json.dump({"config": vars(args), "results": results}, handle, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,15 @@
 import streamlit as st
-from openai import OpenAI
+from utils.cancellation import render_stop_button
+from utils.completions import stream_caption, render_race_settings
+from utils.context import ContextWindow
+from utils.conversations import link_conversation, new_conversation, render_conversation_panel, session_conversation
+from utils.generation import current_generation, discard_generation, finish_generation, start_generation
+from utils.memory import track_memory
+from utils.metrics import render_performance_panel
+from utils.openrouter import get_client
+from utils.resilience import error_hint
+from utils.streaming import StreamRenderer
+from utils.transcript import render_transcript
 
 st.set_page_config(
     page_title="AI Chatbot - Shah's AI World",
@@ -15,6 +25,9 @@ st.markdown("""
 Chat with various AI models powered by OpenRouter. Enter your API key and select a model to get started.
 """)
 
+# Chat history, stored on disk with only the recent turns kept in memory
+track_memory("chatbot", session_conversation("messages", "chatbot"))
+
 # Sidebar configuration
 with st.sidebar:
     st.header("⚙️ Configuration")
@@ -45,11 +58,23 @@ with st.sidebar:
 
     st.caption(f"Model ID: `{selected_model}`")
 
+    # Optionally race several models and keep whichever answers first
+    race_models = render_race_settings(model_options, key="chat")
+
+    st.markdown("---")
+
+    # Rolling latency and throughput per model
+    render_performance_panel("chatbot")
+
     st.markdown("---")
 
-    # Clear chat button
+    # Saved conversation id, and resuming an earlier conversation
+    render_conversation_panel("messages", "chatbot")
+
+    # Clear chat button (the old conversation stays saved)
     if st.button("🗑️ Clear Chat", use_container_width=True):
-        st.session_state.messages = []
+        discard_generation("chat")
+        new_conversation("messages", "chatbot")
         st.rerun()
 
 # Check for API key
@@ -64,84 +89,93 @@ if not api_key:
     """)
     st.stop()
 
-# Initialize OpenAI client with OpenRouter
-client = OpenAI(
-    base_url="https://openrouter.ai/api/v1",
-    api_key=api_key,
-    default_headers={
-        "HTTP-Referer": "https://shahs-ai-world.hf.space",
-        "X-Title": "Shah's AI World",
-    }
-)
+# Reuse the pooled OpenRouter client for this API key
+client = get_client(api_key)
 
-# Initialize chat history in session state
-if "messages" not in st.session_state:
-    st.session_state.messages = []
+# Display chat history (recent turns in full, older ones paged on demand)
+render_transcript(st.session_state.messages, key="chat")
 
-# Display chat history
-for message in st.session_state.messages:
-    with st.chat_message(message["role"]):
-        st.markdown(message["content"])
+# Follow an answer generated in the background and add it to the history
+def show_answer(generation):
+    with st.chat_message("assistant"):
+        # Offer Stop while the answer is still coming in
+        stop_button = st.empty() if generation.stopped else render_stop_button("chat")
+
+        # Stream the response
+        renderer = StreamRenderer()
+        for content in generation.follow():
+            renderer.write(content)
+
+        # Final cleanup of response text
+        response_text = renderer.close().strip()
+
+        # Add assistant response to chat history (a stopped or broken answer is kept as far as it got),
+        # and only then let the generation go: a rerun in between re-attaches instead of losing it
+        if response_text:
+            message = {"role": "assistant", "content": response_text}
+            if generation.stopped or generation.error:
+                message["stopped"] = True
+            st.session_state.messages.append(message)
+        finish_generation("chat")
+        stop_button.empty()
+
+        if generation.error:
+            st.error(f"Error: {str(generation.error)}")
+            st.info(error_hint(generation.error))
+        elif generation.stream and stream_caption(generation.stream, model_options):
+            st.caption(stream_caption(generation.stream, model_options))
+
+# An answer still being generated from an earlier run: reruns re-attach to it
+generation = current_generation("chat")
+prompt = st.chat_input("What would you like to know?")
+
+if generation is not None:
+    if prompt:
+        # A new question stops the previous answer
+        generation.stop()
+    show_answer(generation)
 
 # Handle user input
-if prompt := st.chat_input("What would you like to know?"):
+if prompt:
     # Add user message to chat history
     st.session_state.messages.append({"role": "user", "content": prompt})
+    link_conversation(st.session_state.messages)
 
     # Display user message
     with st.chat_message("user"):
         st.markdown(prompt)
 
-    # Generate AI response
-    with st.chat_message("assistant"):
-        try:
-            response = client.chat.completions.create(
-                model=selected_model,
-                messages=st.session_state.messages,
-                stream=True,
-                extra_headers={
-                    "HTTP-Referer": "https://shahs-ai-world.hf.space",
-                    "X-Title": "Shah's AI World"
-                },
-                extra_body={
-                    "provider": {
-                        "data_collection": "deny"
-                    }
+    # Generate AI response in the background and follow it here
+    try:
+        request_options = {
+            "extra_headers": {
+                "HTTP-Referer": "https://shahs-ai-world.hf.space",
+                "X-Title": "Shah's AI World"
+            },
+            "extra_body": {
+                "provider": {
+                    "data_collection": "deny"
                 }
-            )
-
-            # Stream the response
-            response_text = ""
-            response_placeholder = st.empty()
-
-            for chunk in response:
-                if chunk.choices[0].delta.content is not None:
-                    # Clean up unwanted tokens
-                    content = chunk.choices[0].delta.content
-                    content = (
-                        content.replace('<s>', '')
-                        .replace('<|im_start|>', '')
-                        .replace('<|im_end|>', '')
-                        .replace("<|OUT|>", "")
-                    )
-                    response_text += content
-                    response_placeholder.markdown(response_text + "▌")
-
-            # Final cleanup of response text
-            response_text = (
-                response_text.replace('<s>', '')
-                .replace('<|im_start|>', '')
-                .replace('<|im_end|>', '')
-                .replace("<|OUT|>", "")
-                .strip()
-            )
-            response_placeholder.markdown(response_text)
-
-            # Add assistant response to chat history
-            st.session_state.messages.append(
-                {"role": "assistant", "content": response_text}
-            )
-
-        except Exception as e:
-            st.error(f"Error: {str(e)}")
-            st.info("Please check your API key and try again.")
+            }
+        }
+
+        # Send recent turns within the model's token budget, older ones as a summary
+        context = ContextWindow(selected_model, st.session_state.messages.summary)
+        messages = context.build(st.session_state.messages, client, **request_options)
+        st.session_state.messages.save_summary()
+
+        generation = start_generation(
+            "chat",
+            client,
+            race_models or [selected_model],
+            messages,
+            "chatbot",
+            # Fall through the other models when the selected one is down
+            fallbacks=model_options.values(),
+            **request_options
+        )
+        show_answer(generation)
+
+    except Exception as e:
+        st.error(f"Error: {str(e)}")
+        st.info(error_hint(e))
@@ -1,7 +1,17 @@
 import streamlit as st
 import re
-from openai import OpenAI
+import time
 from streamlit_mermaid import st_mermaid
+from utils.cache import cache_key, get_cache, normalize_prompt, prompt_version
+from utils.cancellation import render_stop_button
+from utils.completions import stream_caption, render_race_settings
+from utils.generation import current_generation, discard_generation, finish_generation, start_generation
+from utils.memory import session_storage
+from utils.mermaid import validate_mermaid
+from utils.metrics import get_metrics, render_performance_panel
+from utils.openrouter import get_client
+from utils.resilience import error_hint, resilient_create
+from utils.streaming import StreamRenderer
 
 st.set_page_config(
     page_title="Diagram Generator - Shah's AI World",
@@ -51,6 +61,18 @@ IMPORTANT RULES:
 5. Keep diagrams clean and readable - don't overcomplicate them.
 """
 
+# Prompt for repairing diagrams that fail local validation
+REPAIR_SYSTEM_PROMPT = """You fix syntax errors in Mermaid diagram code.
+
+You are given the broken code and the parser errors. Change only what is needed to fix the errors and keep the diagram's meaning.
+Wrap node and edge labels that contain brackets or special characters in double quotes.
+Reply with the corrected code only, in a single ```mermaid code block."""
+
+MAX_REPAIR_ATTEMPTS = 2
+
+# Cached diagrams are invalidated whenever the prompt changes
+SYSTEM_PROMPT_VERSION = prompt_version(SYSTEM_PROMPT)
+
 # Sidebar configuration
 with st.sidebar:
     st.header("⚙️ Configuration")
@@ -81,6 +103,14 @@ with st.sidebar:
 
     st.caption(f"Model ID: `{selected_model}`")
 
+    # Optionally race several models and keep whichever answers first
+    race_models = render_race_settings(model_options, key="diagram")
+
+    st.markdown("---")
+
+    # Rolling latency and throughput per model
+    render_performance_panel("diagram")
+
     st.markdown("---")
 
     # Diagram type helper
@@ -106,15 +136,11 @@ if not api_key:
     """)
     st.stop()
 
-# Initialize OpenAI client with OpenRouter
-client = OpenAI(
-    base_url="https://openrouter.ai/api/v1",
-    api_key=api_key,
-    default_headers={
-        "HTTP-Referer": "https://shahs-ai-world.hf.space",
-        "X-Title": "Shah's AI World",
-    }
-)
+# Reuse the pooled OpenRouter client for this API key
+client = get_client(api_key)
+
+# Shared diagram cache (in-memory LRU backed by SQLite)
+diagram_cache = get_cache("diagrams")
 
 # Main content area
 col1, col2 = st.columns([1, 1])
@@ -147,18 +173,29 @@ with col1:
         > "Create a class diagram for a payment processing system with Payment, CreditCard, PayPal, and Transaction classes"
         """)
 
-    generate_btn = st.button("📊 Generate Diagram", type="primary", use_container_width=True)
+    button_col1, button_col2 = st.columns([3, 1])
+    with button_col1:
+        generate_btn = st.button("📊 Generate Diagram", type="primary", use_container_width=True)
+    with button_col2:
+        regenerate_btn = st.button(
+            "🔄 Regenerate",
+            use_container_width=True,
+            help="Skip the cache and generate a fresh diagram"
+        )
 
 with col2:
     diagram_placeholder = st.container()
 
-# Initialize session state for storing generated response
-if "diagram_response" not in st.session_state:
-    st.session_state.diagram_response = ""
+# Initialize session state for storing generated response (spilled to disk under memory pressure)
+storage = session_storage("diagram")
+storage.setdefault("diagram_response", "")
 
 if "show_preview" not in st.session_state:
     st.session_state.show_preview = False
 
+if "diagram_stopped" not in st.session_state:
+    st.session_state.diagram_stopped = False
+
 # Function to extract mermaid code from response
 def extract_mermaid_code(text):
     """Extract Mermaid code from markdown code blocks."""
@@ -166,72 +203,162 @@ def extract_mermaid_code(text):
     matches = re.findall(pattern, text)
     return matches[0].strip() if matches else None
 
-# Generate diagram
-if generate_btn and prompt:
+# Function to fix broken mermaid code with a small, code-only request
+def repair_mermaid_code(code, errors, model):
+    """Send the broken code and validator errors back to the model; return the fixed code."""
+    error_list = "\n".join(f"- {error}" for error in errors)
+    messages = [
+        {"role": "system", "content": REPAIR_SYSTEM_PROMPT},
+        {"role": "user", "content": f"Errors:\n{error_list}\n\n```mermaid\n{code}\n```"}
+    ]
+    response, _ = resilient_create(
+        client,
+        model,
+        metrics=get_metrics(),
+        page="diagram",
+        messages=messages,
+        extra_headers={
+            "HTTP-Referer": "https://shahs-ai-world.hf.space",
+            "X-Title": "Shah's AI World"
+        },
+        extra_body={
+            "provider": {
+                "data_collection": "deny"
+            }
+        }
+    )
+    content = response.choices[0].message.content or ""
+    return extract_mermaid_code(content)
+
+# A diagram still being generated from an earlier run: reruns re-attach to it
+generation = current_generation("diagram")
+
+# Generate diagram (Regenerate skips the cache)
+if (generate_btn or regenerate_btn) and prompt:
+    # Raced requests are cached under the whole set of models
+    request_models = race_models or [selected_model]
+    key = cache_key(",".join(request_models), normalize_prompt(prompt), SYSTEM_PROMPT_VERSION)
+    cached = None if regenerate_btn else diagram_cache.get(key)
+
+    if cached:
+        # The cached diagram replaces anything still being generated
+        discard_generation("diagram")
+        generation = None
+        with diagram_placeholder:
+            st.caption(f"⚡ Served from cache - saved ~{cached['latency']:.1f}s. Click Regenerate for a fresh diagram.")
+        storage["diagram_response"] = cached["response"]
+        st.session_state.diagram_stopped = False
+    else:
+        try:
+            generation = start_generation(
+                "diagram",
+                client,
+                request_models,
+                [
+                    {"role": "system", "content": SYSTEM_PROMPT},
+                    {"role": "user", "content": prompt}
+                ],
+                "diagram",
+                # Fall through the other models when the selected one is down
+                fallbacks=model_options.values(),
+                meta={"cache_key": key},
+                extra_headers={
+                    "HTTP-Referer": "https://shahs-ai-world.hf.space",
+                    "X-Title": "Shah's AI World"
+                },
+                extra_body={
+                    "provider": {
+                        "data_collection": "deny"
+                    }
+                }
+            )
+        except Exception as e:
+            with diagram_placeholder:
+                st.error(f"Error: {str(e)}")
+                st.info(error_hint(e))
+
+elif (generate_btn or regenerate_btn) and not prompt:
+    st.warning("Please enter a description for your diagram.")
+
+# Follow the diagram being generated in the background
+if generation is not None:
     with diagram_placeholder:
+        # Offer Stop while the diagram is still coming in
+        stop_button = st.empty() if generation.stopped else render_stop_button("diagram")
         with st.spinner("Generating diagram..."):
+            # Stream the response
+            renderer = StreamRenderer()
+            for content in generation.follow():
+                renderer.write(content)
+
+            # Final cleanup
+            response_text = renderer.close().strip()
+        stop_button.empty()
+
+        # Store the raw diagram before letting the generation go: a rerun during
+        # the repair below then keeps it instead of losing the whole response.
+        # A stopped or broken partial response is kept, but never repaired or cached
+        failed = generation.stopped or generation.error
+        if response_text or not failed:
+            storage["diagram_response"] = response_text
+            st.session_state.diagram_stopped = bool(failed)
+        finish_generation("diagram")
+
+        if failed:
+            if generation.error:
+                st.error(f"Error: {str(generation.error)}")
+                st.info(error_hint(generation.error))
+        else:
             try:
-                response = client.chat.completions.create(
-                    model=selected_model,
-                    messages=[
-                        {"role": "system", "content": SYSTEM_PROMPT},
-                        {"role": "user", "content": prompt}
-                    ],
-                    stream=True,
-                    extra_headers={
-                        "HTTP-Referer": "https://shahs-ai-world.hf.space",
-                        "X-Title": "Shah's AI World"
-                    },
-                    extra_body={
-                        "provider": {
-                            "data_collection": "deny"
-                        }
-                    }
-                )
-
-                # Stream the response
-                response_text = ""
-                response_placeholder = st.empty()
-
-                for chunk in response:
-                    if chunk.choices[0].delta.content is not None:
-                        content = chunk.choices[0].delta.content
-                        content = (
-                            content.replace('<s>', '')
-                            .replace('<|im_start|>', '')
-                            .replace('<|im_end|>', '')
-                            .replace("<|OUT|>", "")
-                        )
-                        response_text += content
-                        response_placeholder.markdown(response_text + "▌")
-
-                # Final cleanup
-                response_text = (
-                    response_text.replace('<s>', '')
-                    .replace('<|im_start|>', '')
-                    .replace('<|im_end|>', '')
-                    .replace("<|OUT|>", "")
-                    .strip()
-                )
-                response_placeholder.markdown(response_text)
-
-                # Store response in session state
-                st.session_state.diagram_response = response_text
+                if stream_caption(generation.stream, model_options):
+                    st.caption(stream_caption(generation.stream, model_options))
+
+                # Validate locally; if broken, send only the diagram code back for repair
+                repair_started = time.perf_counter()
+                mermaid_code = extract_mermaid_code(response_text)
+                errors = validate_mermaid(mermaid_code) if mermaid_code else []
+                attempts = 0
+                while errors and attempts < MAX_REPAIR_ATTEMPTS:
+                    attempts += 1
+                    with st.spinner(f"Fixing diagram syntax (attempt {attempts})..."):
+                        repaired_code = repair_mermaid_code(mermaid_code, errors, generation.stream.model)
+                    if not repaired_code:
+                        break
+                    response_text = response_text.replace(mermaid_code, repaired_code, 1)
+                    mermaid_code = repaired_code
+                    errors = validate_mermaid(mermaid_code)
+                if attempts and not errors:
+                    st.caption(f"🔧 Diagram syntax repaired automatically ({attempts} round-trip{'s' if attempts > 1 else ''})")
+
+                latency = generation.elapsed + time.perf_counter() - repair_started
+
+                # Store the repaired response in session state
+                if attempts:
+                    storage["diagram_response"] = response_text
+
+                # Cache responses that contain a valid diagram
+                if mermaid_code and not errors:
+                    diagram_cache.set(generation.meta["cache_key"], {"response": response_text, "mermaid": mermaid_code, "latency": latency})
 
             except Exception as e:
                 st.error(f"Error: {str(e)}")
-                st.info("Please check your API key and try again.")
-
-elif generate_btn and not prompt:
-    st.warning("Please enter a description for your diagram.")
+                st.info(error_hint(e))
 
 # Show preview button and render diagram if response exists
-if st.session_state.diagram_response:
+if storage["diagram_response"]:
     st.markdown("---")
 
-    mermaid_code = extract_mermaid_code(st.session_state.diagram_response)
+    if st.session_state.diagram_stopped:
+        st.caption("⏹️ Generation was stopped - the diagram may be incomplete.")
+
+    mermaid_code = extract_mermaid_code(storage["diagram_response"])
 
     if mermaid_code:
+        # Flag anything the local validator still rejects before it reaches the browser
+        mermaid_errors = validate_mermaid(mermaid_code)
+        if mermaid_errors:
+            st.warning("This diagram may not render:\n\n" + "\n".join(f"- {error}" for error in mermaid_errors))
+
         if st.session_state.show_preview:
             # Preview mode - show rendered diagram
             st.subheader("Diagram Preview")
@@ -242,7 +369,7 @@ if st.session_state.diagram_response:
         else:
             # Code mode - show the raw response with code and explanation
             st.subheader("Generated Code & Explanation")
-            st.markdown(st.session_state.diagram_response)
+            st.markdown(storage["diagram_response"])
             if st.button("👁️ Preview Diagram", type="secondary", use_container_width=True):
                 st.session_state.show_preview = True
                 st.rerun()
@@ -1,5 +1,17 @@
 import streamlit as st
-from openai import OpenAI
+from utils.cache import cache_key, get_cache, normalize_prompt, prompt_version
+from utils.cancellation import render_stop_button
+from utils.completions import stream_caption, render_race_settings
+from utils.context import to_api_messages
+from utils.conversations import link_conversation, new_conversation, render_conversation_panel, session_conversation
+from utils.generation import current_generation, discard_generation, finish_generation, follow_all, start_generation
+from utils.memory import session_storage, track_memory
+from utils.metrics import render_performance_panel
+from utils.openrouter import get_client
+from utils.resilience import error_hint
+from utils.streaming import StreamRenderer
+from utils.transcript import render_transcript
+from utils.warmup import get_cache_warmer
 
 st.set_page_config(
     page_title="Personality Bot - Shah's AI World",
@@ -174,6 +186,27 @@ Always:
     }
 }
 
+# Earlier panel questions each personality sees again as context
+PANEL_HISTORY_ROUNDS = 3
+
+# Initialize personality in session state
+if "selected_personality" not in st.session_state:
+    st.session_state.selected_personality = list(PERSONALITIES.keys())[0]
+
+# Chat history, stored on disk with only the recent turns kept in memory;
+# a resumed conversation brings its personality back with it
+conversation = session_conversation("personality_messages", "personality")
+track_memory("personality", conversation)
+if conversation.meta.get("personality") in PERSONALITIES:
+    st.session_state.selected_personality = conversation.meta["personality"]
+else:
+    conversation.meta["personality"] = st.session_state.selected_personality
+
+# Panel questions and every personality's answers
+panel_storage = session_storage("personality_panel")
+if "panel_rounds" not in panel_storage:
+    panel_storage["panel_rounds"] = []
+
 # Sidebar configuration
 with st.sidebar:
     st.header("⚙️ Configuration")
@@ -203,20 +236,40 @@ with st.sidebar:
     selected_model = model_options[selected_model_name]
     st.caption(f"Model ID: `{selected_model}`")
 
+    # Optionally race several models and keep whichever answers first
+    race_models = render_race_settings(model_options, key="personality")
+
+    # Ask every personality at once instead of chatting with one
+    panel_mode = st.toggle(
+        "🎭 Panel mode",
+        key="personality_panel",
+        help="Send each question to all five personalities at once and compare their answers side by side"
+    )
+
     st.markdown("---")
 
-    # Clear chat button
+    # Rolling latency and throughput per model
+    render_performance_panel("personality")
+
+    st.markdown("---")
+
+    # Saved conversation id, and resuming an earlier conversation
+    render_conversation_panel("personality_messages", "personality")
+
+    # Clear chat button (the old conversation stays saved)
     if st.button("🗑️ Clear Chat", use_container_width=True):
-        st.session_state.personality_messages = []
+        discard_generation("personality")
+        for idx in range(len(PERSONALITIES)):
+            discard_generation(f"panel_{idx}")
+        panel_storage["panel_rounds"] = []
+        new_conversation("personality_messages", "personality", personality=st.session_state.get("selected_personality"))
         st.rerun()
 
-# Initialize personality in session state
-if "selected_personality" not in st.session_state:
-    st.session_state.selected_personality = list(PERSONALITIES.keys())[0]
-
 # Personality selection on main UI
 st.markdown("### Select a Personality")
 
+# In panel mode the question sits here, above the answers streaming into each column
+panel_question = st.empty()
 personality_cols = st.columns(5)
 for idx, (name, details) in enumerate(PERSONALITIES.items()):
     with personality_cols[idx]:
@@ -233,13 +286,17 @@ for idx, (name, details) in enumerate(PERSONALITIES.items()):
         ):
             if st.session_state.selected_personality != name:
                 st.session_state.selected_personality = name
-                st.session_state.personality_messages = []
+                discard_generation("personality")
+                new_conversation("personality_messages", "personality", personality=name)
                 st.rerun()
 
 # Show selected personality info
 selected_personality = st.session_state.selected_personality
 personality = PERSONALITIES[selected_personality]
-st.markdown(f"**{selected_personality}** - {personality['description']}")
+if panel_mode:
+    st.markdown("**🎭 Panel mode** - every personality answers each question")
+else:
+    st.markdown(f"**{selected_personality}** - {personality['description']}")
 
 # Check for API key
 if not api_key:
@@ -253,19 +310,8 @@ if not api_key:
     """)
     st.stop()
 
-# Initialize OpenAI client with OpenRouter
-client = OpenAI(
-    base_url="https://openrouter.ai/api/v1",
-    api_key=api_key,
-    default_headers={
-        "HTTP-Referer": "https://shahs-ai-world.hf.space",
-        "X-Title": "Shah's AI World",
-    }
-)
-
-# Initialize chat history in session state
-if "personality_messages" not in st.session_state:
-    st.session_state.personality_messages = []
+# Reuse the pooled OpenRouter client for this API key
+client = get_client(api_key)
 
 st.markdown("---")
 
@@ -298,31 +344,237 @@ starters = {
     ]
 }
 
-# Display chat history
-for message in st.session_state.personality_messages:
-    with st.chat_message(message["role"]):
-        st.markdown(message["content"])
-
-# Handle user input
-if prompt := st.chat_input(f"Chat with {selected_personality}..."):
-    # Add user message to chat history
-    st.session_state.personality_messages.append({"role": "user", "content": prompt})
+# Starter answers are pre-generated per (personality, model, starter) and shared by every session
+starter_cache = get_cache("starters")
+
+def starter_key(name, model, starter):
+    return cache_key(model, name, normalize_prompt(starter), prompt_version(PERSONALITIES[name]["system_prompt"]))
+
+# Warm the rest of a personality's starters once the visitor uses one of them. The requests
+# run on the visitor's own key, so nothing is generated before they ask for a starter
+def warm_starters(name, clicked):
+    warmed_key = f"personality_starters_warmed_{selected_model}_{name}"
+    if warmed_key in st.session_state:
+        return
+    st.session_state[warmed_key] = True
+    get_cache_warmer("starters").warm(
+        client,
+        selected_model,
+        "personality",
+        [
+            (
+                starter_key(name, selected_model, starter),
+                [{"role": "system", "content": PERSONALITIES[name]["system_prompt"]}, {"role": "user", "content": starter}],
+            )
+            for starter in starters[name]
+            if starter != clicked
+        ],
+        extra_headers={
+            "HTTP-Referer": "https://shahs-ai-world.hf.space",
+            "X-Title": "Shah's AI World"
+        },
+        extra_body={
+            "provider": {
+                "data_collection": "deny"
+            }
+        }
+    )
 
-    # Display user message
-    with st.chat_message("user"):
-        st.markdown(prompt)
+# Follow an answer generated in the background and add it to the history
+def show_answer(generation):
+    with st.chat_message("assistant"):
+        # Offer Stop while the answer is still coming in
+        stop_button = st.empty() if generation.stopped else render_stop_button("personality")
+
+        # Stream the response
+        renderer = StreamRenderer()
+        for content in generation.follow():
+            renderer.write(content)
+
+        # Final cleanup
+        response_text = renderer.close().strip()
+
+        # Add assistant response to chat history (a stopped or broken answer is kept as far as it got),
+        # and only then let the generation go: a rerun in between re-attaches instead of losing it
+        if response_text:
+            message = {"role": "assistant", "content": response_text}
+            if generation.stopped or generation.error:
+                message["stopped"] = True
+            st.session_state.personality_messages.append(message)
+        finish_generation("personality")
+        stop_button.empty()
+
+        if generation.error:
+            st.error(f"Error: {str(generation.error)}")
+            st.info(error_hint(generation.error))
+        elif generation.stream and stream_caption(generation.stream, model_options):
+            st.caption(stream_caption(generation.stream, model_options))
+
+# Each personality's request in panel mode: its own system prompt and its own earlier answers
+def panel_messages(name, question):
+    messages = [{"role": "system", "content": PERSONALITIES[name]["system_prompt"]}]
+    for panel_round in panel_storage["panel_rounds"][-PANEL_HISTORY_ROUNDS:]:
+        answer = panel_round["answers"].get(name)
+        if answer:
+            messages.append({"role": "user", "content": panel_round["question"]})
+            messages.append({"role": "assistant", "content": answer["content"]})
+    messages.append({"role": "user", "content": question})
+    return messages
+
+# Follow all five panel answers with one driver loop and save them as a round
+def show_panel(generations):
+    panel_question.markdown(f"🧑 **{generations[0].meta['question']}**")
+    stop_button = st.empty() if all(generation.stopped for generation in generations) else render_stop_button("panel")
+
+    # Every answer streams into its personality's column
+    renderers = [StreamRenderer(personality_cols[idx].container()) for idx in range(len(generations))]
+    for index, content in follow_all(generations):
+        renderers[index].write(content)
+
+    answers = {}
+    for generation, renderer in zip(generations, renderers):
+        response_text = renderer.close().strip()
+        if response_text:
+            answers[generation.meta["personality"]] = {
+                "content": response_text,
+                "stopped": bool(generation.stopped or generation.error),
+            }
+
+    # Save the whole round before letting any generation go, so a rerun in between
+    # re-attaches to all of them instead of dropping the finished answers.
+    # Reassign rather than append in place, so a concurrent spill cannot drop the new round
+    panel_storage["panel_rounds"] = panel_storage["panel_rounds"] + [{"question": generations[0].meta["question"], "answers": answers}]
+    for idx in range(len(generations)):
+        finish_generation(f"panel_{idx}")
+    stop_button.empty()
+
+    for idx, generation in enumerate(generations):
+        with personality_cols[idx]:
+            if generation.error:
+                st.error(f"Error: {str(generation.error)}")
+                st.info(error_hint(generation.error))
+            elif generation.stopped:
+                st.caption("⏹️ Stopped before the answer was complete")
+            elif generation.stream and stream_caption(generation.stream, model_options):
+                st.caption(stream_caption(generation.stream, model_options))
+
+# The latest panel round in the columns, earlier ones behind an expander
+def render_panel_rounds(rounds):
+    if not rounds:
+        return
+    latest = rounds[-1]
+    panel_question.markdown(f"🧑 **{latest['question']}**")
+    for idx, name in enumerate(PERSONALITIES):
+        answer = latest["answers"].get(name)
+        with personality_cols[idx]:
+            if answer:
+                st.markdown(answer["content"])
+                if answer["stopped"]:
+                    st.caption("⏹️ Stopped before the answer was complete")
+            else:
+                st.caption("No answer")
+    if len(rounds) > 1:
+        with st.expander(f"🕘 Earlier panel questions ({len(rounds) - 1})"):
+            for panel_round in reversed(rounds[:-1]):
+                st.markdown(f"🧑 **{panel_round['question']}**")
+                cols = st.columns(5)
+                for idx, name in enumerate(PERSONALITIES):
+                    answer = panel_round["answers"].get(name)
+                    cols[idx].markdown(answer["content"] if answer else "_No answer_")
+                st.markdown("---")
+
+if panel_mode:
+    # Panel answers still being generated from an earlier run: reruns re-attach to them
+    generations = [current_generation(f"panel_{idx}") for idx in range(len(PERSONALITIES))]
+    generations = generations if all(generations) else None
+    if generations and st.session_state.get("panel_stop"):
+        for generation in generations:
+            generation.stop()
+    prompt = st.chat_input("Ask all five personalities...")
+
+    if generations is not None:
+        if prompt:
+            # A new question stops the previous answers
+            for generation in generations:
+                generation.stop()
+        show_panel(generations)
+
+    if prompt:
+        # Every personality answers at once on the background workers, so the
+        # round takes as long as the slowest answer rather than the sum of all five
+        try:
+            generations = [
+                start_generation(
+                    f"panel_{idx}",
+                    client,
+                    race_models or [selected_model],
+                    panel_messages(name, prompt),
+                    "personality",
+                    # Fall through the other models when the selected one is down
+                    fallbacks=model_options.values(),
+                    meta={"personality": name, "question": prompt},
+                    extra_headers={
+                        "HTTP-Referer": "https://shahs-ai-world.hf.space",
+                        "X-Title": "Shah's AI World"
+                    },
+                    extra_body={
+                        "provider": {
+                            "data_collection": "deny"
+                        }
+                    }
+                )
+                for idx, name in enumerate(PERSONALITIES)
+            ]
+            show_panel(generations)
 
-    # Prepare messages with system prompt
-    system_prompt = PERSONALITIES[selected_personality]["system_prompt"]
-    messages_with_system = [{"role": "system", "content": system_prompt}] + st.session_state.personality_messages
+        except Exception as e:
+            st.error(f"Error: {str(e)}")
+            st.info(error_hint(e))
+    elif generations is None:
+        render_panel_rounds(panel_storage["panel_rounds"])
 
-    # Generate AI response
-    with st.chat_message("assistant"):
+    st.markdown("---")
+else:
+    # Display chat history (recent turns in full, older ones paged on demand)
+    render_transcript(st.session_state.personality_messages, key="personality")
+
+    # An answer still being generated from an earlier run: reruns re-attach to it
+    generation = current_generation("personality")
+    prompt = st.chat_input(f"Chat with {selected_personality}...")
+    # A starter without a pre-generated answer is sent like a typed question
+    prompt = prompt or st.session_state.pop("personality_starter", None)
+
+    if generation is not None:
+        if prompt:
+            # A new question stops the previous answer
+            generation.stop()
+        show_answer(generation)
+
+    # Handle user input
+    if prompt:
+        # Add user message to chat history
+        st.session_state.personality_messages.append({"role": "user", "content": prompt})
+        link_conversation(st.session_state.personality_messages)
+
+        # Display user message
+        with st.chat_message("user"):
+            st.markdown(prompt)
+
+        # Prepare messages with system prompt
+        system_prompt = PERSONALITIES[selected_personality]["system_prompt"]
+        messages_with_system = [{"role": "system", "content": system_prompt}] + to_api_messages(st.session_state.personality_messages)
+
+        # Generate AI response in the background and follow it here
         try:
-            response = client.chat.completions.create(
-                model=selected_model,
-                messages=messages_with_system,
-                stream=True,
+            # Race the chosen models when "Fastest wins" is on
+            generation = start_generation(
+                "personality",
+                client,
+                race_models or [selected_model],
+                messages_with_system,
+                "personality",
+                # Fall through the other models when the selected one is down
+                fallbacks=model_options.values(),
                 extra_headers={
                     "HTTP-Referer": "https://shahs-ai-world.hf.space",
                     "X-Title": "Shah's AI World"
@@ -333,54 +585,34 @@ if prompt := st.chat_input(f"Chat with {selected_personality}..."):
                     }
                 }
             )
-
-            # Stream the response
-            response_text = ""
-            response_placeholder = st.empty()
-
-            for chunk in response:
-                if chunk.choices[0].delta.content is not None:
-                    content = chunk.choices[0].delta.content
-                    content = (
-                        content.replace('<s>', '')
-                        .replace('<|im_start|>', '')
-                        .replace('<|im_end|>', '')
-                        .replace("<|OUT|>", "")
-                    )
-                    response_text += content
-                    response_placeholder.markdown(response_text + "▌")
-
-            # Final cleanup
-            response_text = (
-                response_text.replace('<s>', '')
-                .replace('<|im_start|>', '')
-                .replace('<|im_end|>', '')
-                .replace("<|OUT|>", "")
-                .strip()
-            )
-            response_placeholder.markdown(response_text)
-
-            # Add assistant response to chat history
-            st.session_state.personality_messages.append(
-                {"role": "assistant", "content": response_text}
-            )
+            show_answer(generation)
 
         except Exception as e:
             st.error(f"Error: {str(e)}")
-            st.info("Please check your API key and try again.")
+            st.info(error_hint(e))
 
-# Show conversation starters and tips after chat input area
-st.markdown("---")
+    # Show conversation starters and tips after chat input area
+    st.markdown("---")
 
-# Conversation starters (always visible)
-with st.expander("💭 Conversation Starters", expanded=len(st.session_state.personality_messages) == 0):
-    if selected_personality in starters:
-        cols = st.columns(3)
-        for idx, starter in enumerate(starters[selected_personality]):
-            with cols[idx % 3]:
-                if st.button(starter, key=f"starter_bottom_{idx}", use_container_width=True):
-                    st.session_state.personality_messages.append({"role": "user", "content": starter})
-                    st.rerun()
+    # Conversation starters (always visible)
+    with st.expander("💭 Conversation Starters", expanded=len(st.session_state.personality_messages) == 0):
+        if selected_personality in starters:
+            cols = st.columns(3)
+            for idx, starter in enumerate(starters[selected_personality]):
+                with cols[idx % 3]:
+                    if st.button(starter, key=f"starter_bottom_{idx}", use_container_width=True):
+                        # Opening a conversation with a starter answers instantly from the warmed cache
+                        warm_starters(selected_personality, starter)
+                        cached = None
+                        if not st.session_state.personality_messages and generation is None:
+                            cached = starter_cache.get(starter_key(selected_personality, selected_model, starter))
+                        if cached:
+                            st.session_state.personality_messages.append({"role": "user", "content": starter})
+                            st.session_state.personality_messages.append({"role": "assistant", "content": cached["answer"]})
+                            link_conversation(st.session_state.personality_messages)
+                        else:
+                            st.session_state.personality_starter = starter
+                        st.rerun()
 
 # Tips section
 with st.expander("💡 Tips for Using Different Personalities"):
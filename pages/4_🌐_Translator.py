@@ -1,6 +1,26 @@
 import streamlit as st
-from openai import OpenAI
-import json
+import time
+from utils.cache import cache_key, get_cache, normalize_text, prompt_version
+from utils.cancellation import render_stop_button
+from utils.completions import stream_caption, render_race_settings
+from utils.documents import (
+    DEFAULT_CONCURRENCY,
+    SUPPORTED_TYPES,
+    decode_upload,
+    split_document,
+    translate_segments,
+    translated_filename,
+)
+from utils.generation import current_generation, discard_generation, finish_generation, follow_all, start_generation
+from utils.jsonstream import IncrementalJSONParser
+from utils.langdetect import detect_language
+from utils.live import LIVE_DEBOUNCE, join_sentences, reused_prefix, split_sentences
+from utils.memory import session_storage
+from utils.metrics import get_metrics, render_performance_panel
+from utils.openrouter import get_client
+from utils.resilience import error_hint, get_circuit_breaker, resilient_create
+from utils.streaming import FLUSH_INTERVAL
+from utils.structured import repair_json
 
 st.set_page_config(
     page_title="Translator - Shah's AI World",
@@ -70,6 +90,60 @@ Rules:
 - Be accurate and natural in translations - avoid literal word-for-word translation
 - Consider formal vs informal register in your translations"""
 
+# The same structure as a JSON schema, for models that can be held to one
+CONFIDENCE_LEVEL = {"type": "string", "enum": ["High", "Medium", "Low"]}
+TRANSLATION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "detected_language": {"type": "string"},
+        "confidence_detection": CONFIDENCE_LEVEL,
+        "original_text": {"type": "string"},
+        "translated_text": {"type": "string"},
+        "confidence_translation": CONFIDENCE_LEVEL,
+        "alternatives": {"type": "array", "items": {"type": "string"}},
+        "cultural_notes": {"type": "string"},
+        "is_same_language": {"type": "boolean"},
+    },
+    "required": [
+        "detected_language", "confidence_detection", "original_text", "translated_text",
+        "confidence_translation", "alternatives", "cultural_notes", "is_same_language",
+    ],
+    "additionalProperties": False,
+}
+
+# Compact prompt for document segments - plain text out, formatting preserved
+DOCUMENT_SYSTEM_PROMPT = """You are an expert translator. Translate the text in the user's message into the requested target language.
+
+Rules:
+- Reply with the translated text only - no explanations, notes or code fences
+- Keep the original formatting: line breaks, markdown syntax, lists and links
+- In subtitles (SRT), keep cue numbers and timestamps exactly as they are and translate only the dialogue
+- In CSV rows, keep delimiters, quoting and the number of columns; translate only text cells
+- Leave code, URLs and numbers unchanged"""
+
+# Live mode prompt - one translated line per source sentence, so each can be cached on its own
+LIVE_SYSTEM_PROMPT = """You are an expert translator. The user's message gives a target language, then text with one sentence per line.
+
+Rules:
+- Translate each line into the target language, keeping the meaning of the surrounding lines in mind
+- Reply with exactly one translated line per input line, in the same order
+- Reply with the translations only - no numbering, explanations, notes or code fences"""
+
+# Detects the source language once for a multi-language translation
+DETECT_SYSTEM_PROMPT = """Identify the language of the user's text. Reply with the name of the language in English and nothing else, e.g. "French"."""
+
+# Multi-language results are laid out in rows of this many languages
+MULTI_COLUMNS = 3
+
+# Detection only needs the start of the text
+DETECT_CHARS = 500
+
+# Cached translations are invalidated whenever the prompt changes
+TRANSLATION_PROMPT_VERSION = prompt_version(TRANSLATION_SYSTEM_PROMPT)
+DOCUMENT_PROMPT_VERSION = prompt_version(DOCUMENT_SYSTEM_PROMPT)
+LIVE_PROMPT_VERSION = prompt_version(LIVE_SYSTEM_PROMPT)
+DETECT_PROMPT_VERSION = prompt_version(DETECT_SYSTEM_PROMPT)
+
 # Sidebar configuration
 with st.sidebar:
     st.header("⚙️ Configuration")
@@ -99,11 +173,37 @@ with st.sidebar:
     selected_model = model_options[selected_model_name]
     st.caption(f"Model ID: `{selected_model}`")
 
+    # Optionally race several models and keep whichever answers first
+    race_models = render_race_settings(model_options, key="translator")
+
+    st.markdown("---")
+
+    # Rolling latency and throughput per model
+    render_performance_panel("translator")
+
+    st.markdown("---")
+
+    # Translation mode
+    translation_mode = st.radio(
+        "Mode",
+        options=["📝 Text", "📄 Document"],
+        help="Translate typed text, or upload a .txt, .md, .srt or .csv file"
+    )
+
+    if translation_mode == "📄 Document":
+        document_concurrency = st.slider(
+            "Parallel requests",
+            min_value=1,
+            max_value=8,
+            value=DEFAULT_CONCURRENCY,
+            help="How many document segments are translated at the same time"
+        )
+
     st.markdown("---")
 
     # Clear history button
     if st.button("🗑️ Clear History", use_container_width=True):
-        st.session_state.translation_history = []
+        session_storage("translator")["translation_history"] = []
         st.rerun()
 
 # Check for API key
@@ -118,19 +218,131 @@ if not api_key:
     """)
     st.stop()
 
-# Initialize OpenAI client with OpenRouter
-client = OpenAI(
-    base_url="https://openrouter.ai/api/v1",
-    api_key=api_key,
-    default_headers={
-        "HTTP-Referer": "https://shahs-ai-world.hf.space",
-        "X-Title": "Shah's AI World",
-    }
-)
+# Reuse the pooled OpenRouter client for this API key
+client = get_client(api_key)
+
+# Shared translation cache (in-memory LRU backed by SQLite)
+translation_cache = get_cache("translations")
 
-# Initialize translation history
-if "translation_history" not in st.session_state:
-    st.session_state.translation_history = []
+# Shared request metrics and circuit breaker (also used from the document worker threads)
+metrics = get_metrics()
+circuit_breaker = get_circuit_breaker()
+
+# Initialize translation history (spilled to disk under memory pressure)
+storage = session_storage("translator")
+storage.setdefault("translation_history", [])
+
+# Document mode: translate an uploaded file in concurrent segments
+if translation_mode == "📄 Document":
+    st.markdown("---")
+    st.subheader("📄 Translate a Document")
+
+    uploaded_file = st.file_uploader(
+        "Upload a document",
+        type=SUPPORTED_TYPES,
+        help="The file is split into paragraphs (subtitle cues for .srt, rows for .csv) and translated in parallel"
+    )
+    document_target = st.selectbox(
+        "Translate to:",
+        options=list(LANGUAGES.keys()),
+        index=0,
+        key="document_target"
+    )
+    translate_document_btn = st.button("🌐 Translate Document", type="primary", use_container_width=True)
+
+    def translate_segment(body):
+        # Runs in a worker thread - no Streamlit calls here
+        cached = translation_cache.get(cache_key(selected_model, document_target, body, DOCUMENT_PROMPT_VERSION))
+        if cached:
+            return cached["translation"]
+
+        messages = [
+            {"role": "system", "content": DOCUMENT_SYSTEM_PROMPT},
+            {"role": "user", "content": f"Target language: {document_target}\n\n{body}"}
+        ]
+        response, model_used = resilient_create(
+            client,
+            selected_model,
+            fallbacks=model_options.values(),
+            breaker=circuit_breaker,
+            metrics=metrics,
+            page="translator",
+            messages=messages,
+            extra_headers={
+                "HTTP-Referer": "https://shahs-ai-world.hf.space",
+                "X-Title": "Shah's AI World"
+            },
+            extra_body={
+                "provider": {
+                    "data_collection": "deny"
+                }
+            }
+        )
+        content = response.choices[0].message.content or ""
+
+        # Keep the segment's indentation; the separators after it are re-added on assembly
+        indent = body[:len(body) - len(body.lstrip())]
+        translation = indent + content.strip()
+        # Filed under the model that answered, so a fallback's text is never served as the selected model's
+        translation_cache.set(cache_key(model_used, document_target, body, DOCUMENT_PROMPT_VERSION), {"translation": translation})
+        return translation
+
+    if translate_document_btn and uploaded_file:
+        document_text = decode_upload(uploaded_file.getvalue())
+        file_type = uploaded_file.name.rsplit(".", 1)[-1].lower()
+        segments = split_document(document_text, file_type)
+
+        progress = st.progress(0.0, text=f"Translating {len(segments)} segments...")
+        preview = st.empty()
+        translations = [None] * len(segments)
+        assembled = []
+        # The end of the assembled text, kept separately so the preview never re-joins the whole document
+        preview_tail = ""
+
+        try:
+            results = translate_segments(segments, translate_segment, document_concurrency)
+            for done, (index, translation) in enumerate(results, start=1):
+                translations[index] = translation
+
+                # Extend the in-order preview as soon as the next segment is ready
+                while len(assembled) < len(segments) and translations[len(assembled)] is not None:
+                    position = len(assembled)
+                    assembled.append(translations[position] + segments[position][1])
+                    preview_tail = (preview_tail + assembled[-1])[-2000:]
+
+                progress.progress(done / len(segments), text=f"Translated {done} of {len(segments)} segments")
+                preview.text(preview_tail)
+
+            preview.empty()
+            storage["document_result"] = {
+                "source": uploaded_file.name,
+                "file_name": translated_filename(uploaded_file.name, LANGUAGES[document_target]),
+                "segments": len(segments),
+                "text": "".join(assembled),
+            }
+
+        except Exception as e:
+            st.error(f"Error: {str(e)}")
+            st.info(error_hint(e))
+
+    elif translate_document_btn and not uploaded_file:
+        st.warning("Please upload a document to translate.")
+
+    # Keep the last result so it survives the rerun triggered by the download button
+    document_result = storage.get("document_result")
+    if document_result:
+        st.success(f"Translated {document_result['segments']} segments of {document_result['source']}")
+        st.download_button(
+            "⬇️ Download Translation",
+            data=document_result["text"],
+            file_name=document_result["file_name"],
+            mime="text/plain",
+            use_container_width=True
+        )
+        with st.expander("Preview"):
+            st.text(document_result["text"][:5000])
+
+    st.stop()
 
 # Main translation interface
 st.markdown("---")
@@ -146,107 +358,545 @@ with col1:
         key="translation_input"
     )
 
+    live_mode = st.toggle(
+        "⚡ Live translate",
+        key="translator_live",
+        help="Translate each edit as soon as you pause (Ctrl+Enter or click outside the box); sentences that did not change are reused"
+    )
+
     translate_btn = st.button("🌐 Translate", type="primary", use_container_width=True)
 
 with col2:
     st.subheader("🎯 Translation")
-    target_language = st.selectbox(
-        "Translate to:",
-        options=list(LANGUAGES.keys()),
-        index=0,  # Default to English
-        help="Select the language you want to translate to"
+    multi_mode = st.toggle(
+        "🌍 Several languages",
+        key="translator_multi",
+        help="Translate into several languages at once: the source language is detected once and every language is translated in parallel"
     )
+    if multi_mode:
+        target_languages = st.multiselect(
+            "Translate to:",
+            options=list(LANGUAGES.keys()),
+            default=["English", "Spanish", "French"],
+            key="translator_targets",
+            help="Select the languages you want to translate to"
+        )
+        target_language = target_languages[0] if target_languages else "English"
+    else:
+        target_language = st.selectbox(
+            "Translate to:",
+            options=list(LANGUAGES.keys()),
+            index=0,  # Default to English
+            help="Select the language you want to translate to"
+        )
+    live_container = st.container()
     result_container = st.container()
 
+# Multi-language results span the full width
+multi_container = st.container()
+
+# Display a parsed translation result
+def show_translation(result, input_text):
+    st.markdown(f"**🔍 Detected Language:** {result.get('detected_language', 'Unknown')} ({result.get('confidence_detection', 'N/A')} confidence)")
+
+    st.markdown("---")
+
+    if result.get('is_same_language', False):
+        st.info("The input text is already in the target language.")
+        st.markdown(f"**📄 Text:** {result.get('original_text', input_text)}")
+    else:
+        st.markdown(f"### 🎯 Translation")
+        st.success(result.get('translated_text', 'Translation not available'))
+        st.caption(f"Confidence: {result.get('confidence_translation', 'N/A')}")
+
+    # Alternatives
+    alternatives = result.get('alternatives', [])
+    if alternatives and len(alternatives) > 0:
+        st.markdown("**🌟 Alternatives:**")
+        for alt in alternatives:
+            if alt:
+                st.markdown(f"• {alt}")
+
+    # Cultural notes
+    cultural_notes = result.get('cultural_notes', '')
+    if cultural_notes and cultural_notes.strip():
+        st.markdown("**💡 Cultural Notes:**")
+        st.info(cultural_notes)
+
+# Display a translation that is still streaming in
+def show_partial_translation(parser, detected=None):
+    if "detected_language" in parser.complete:
+        st.markdown(f"**🔍 Detected Language:** {parser.fields['detected_language']} ({parser.fields.get('confidence_detection', 'N/A')} confidence)")
+    elif detected:
+        st.markdown(f"**🔍 Detected Language:** {detected}")
+    else:
+        st.caption("Detecting language...")
+
+    st.markdown("---")
+
+    st.markdown("### 🎯 Translation")
+    if "translated_text" in parser.fields:
+        st.success(parser.fields["translated_text"] + "▌")
+    else:
+        st.caption("Translating...")
+
+# Add a translation to the session history
+def add_to_history(result, input_text, target_language, stopped=False):
+    entry = {
+        "original": input_text,
+        "detected_lang": result.get('detected_language', 'Unknown'),
+        "target_lang": target_language,
+        "translation": result.get('translated_text', ''),
+        "alternatives": result.get('alternatives', []),
+        "cultural_notes": result.get('cultural_notes', ''),
+        "stopped": stopped
+    }
+
+    # Keep only last 10 translations; a new list, so a concurrent spill cannot drop the entry
+    storage["translation_history"] = [entry] + storage["translation_history"][:9]
+
+# The result for text that is already in the target language
+def same_language_result(text, language):
+    return {
+        "detected_language": language,
+        "confidence_detection": "High",
+        "original_text": text,
+        "translated_text": text,
+        "confidence_translation": "High",
+        "alternatives": [],
+        "cultural_notes": "",
+        "is_same_language": True,
+    }
+
+# Live mode: translate the sentences that changed, reusing the ones that did not
+def live_key(model, target, sentence):
+    return cache_key("live", model, target, normalize_text(sentence), LIVE_PROMPT_VERSION)
+
+def follow_live_translation(live_generation):
+    with live_container:
+        sentences = live_generation.meta["sentences"]
+        reused = live_generation.meta["reused"]
+        prefix = join_sentences(reused, sentences)
+        placeholder = st.empty()
+        chunks = []
+        last_frame = 0.0
+        for content in live_generation.follow():
+            chunks.append(content)
+            if time.monotonic() - last_frame >= FLUSH_INTERVAL:
+                placeholder.success(prefix + " ".join("".join(chunks).split("\n")) + "▌")
+                last_frame = time.monotonic()
+        finish_generation("translator_live")
+
+        if live_generation.stopped:
+            placeholder.empty()
+            return
+        if live_generation.error:
+            placeholder.empty()
+            st.error(f"Error: {str(live_generation.error)}")
+            st.info(error_hint(live_generation.error))
+            return
+
+        # Cache each sentence when the reply lines up with the source; otherwise keep the reply as a whole
+        lines = [line.strip() for line in "".join(chunks).splitlines() if line.strip()]
+        pending = sentences[len(reused):]
+        if len(lines) == len(pending):
+            for (sentence, _), line in zip(pending, lines):
+                translation_cache.set(live_key(live_generation.stream.model, live_generation.meta["target"], sentence), {"translation": line})
+            translation = join_sentences(reused + lines, sentences)
+        else:
+            translation = prefix + " ".join(lines)
+        storage["live_result"] = {
+            "source": live_generation.meta["source"],
+            "target": live_generation.meta["target"],
+            "model": live_generation.meta["model"],
+            "translation": translation,
+        }
+        placeholder.success(translation)
+        st.caption(f"⚡ Live - reused {len(reused)} of {len(sentences)} sentences, translated the rest in {live_generation.elapsed:.1f}s")
+
+def run_live_translation(text, target):
+    request_models = race_models or [selected_model]
+    request = {"source": text, "target": target, "model": ",".join(request_models)}
+    live_generation = current_generation("translator_live")
+    if live_generation is not None and any(live_generation.meta[name] != value for name, value in request.items()):
+        # Newer input arrived: the stale translation is cancelled and never renders
+        discard_generation("translator_live")
+        live_generation = None
+
+    if live_generation is None:
+        if not text.strip():
+            return
+        result = storage.get("live_result")
+        if result and all(result[name] == value for name, value in request.items()):
+            with live_container:
+                st.success(result["translation"])
+            return
+
+        detected, detection_confidence = detect_language(text)
+        if detected == target and detection_confidence == "High":
+            with live_container:
+                st.success(text)
+                st.caption("⚡ Already in the target language - detected locally, no request sent")
+            return
+
+        sentences = split_sentences(text)
+        reused = reused_prefix(
+            sentences,
+            lambda sentence: (translation_cache.get(live_key(request["model"], target, sentence)) or {}).get("translation")
+        )
+        if len(reused) == len(sentences):
+            translation = join_sentences(reused, sentences)
+            storage["live_result"] = {**request, "translation": translation}
+            with live_container:
+                st.success(translation)
+                st.caption(f"⚡ Live - all {len(sentences)} sentences reused")
+            return
+
+        # Debounce: an edit arriving during the pause reruns the page before anything is sent
+        with live_container:
+            status = st.empty()
+        time.sleep(LIVE_DEBOUNCE)
+        status.caption("Translating...")
+        try:
+            live_generation = start_generation(
+                "translator_live",
+                client,
+                request_models,
+                [
+                    {"role": "system", "content": LIVE_SYSTEM_PROMPT},
+                    {"role": "user", "content": f"Target language: {target}\n\n" + "\n".join(sentence for sentence, _ in sentences[len(reused):])}
+                ],
+                "translator",
+                # Fall through the other models when the selected one is down
+                fallbacks=model_options.values(),
+                meta={**request, "sentences": sentences, "reused": reused},
+                extra_headers={
+                    "HTTP-Referer": "https://shahs-ai-world.hf.space",
+                    "X-Title": "Shah's AI World"
+                },
+                extra_body={
+                    "provider": {
+                        "data_collection": "deny"
+                    }
+                }
+            )
+        except Exception as e:
+            status.empty()
+            with live_container:
+                st.error(f"Error: {str(e)}")
+                st.info(error_hint(e))
+            return
+        status.empty()
+    follow_live_translation(live_generation)
+
+# Several languages: one detection and one plain translation per language, all in parallel
+# Keyed by the model that answered: read with the selected model, written with the one that replied
+def multi_key(model, target, text):
+    # Same entries as document segments, so each mode reuses the other's translations
+    return cache_key(model, target, text, DOCUMENT_PROMPT_VERSION)
+
+def detect_key(model, text):
+    return cache_key(model, normalize_text(text)[:DETECT_CHARS], DETECT_PROMPT_VERSION)
+
+def start_multi_request(key, messages, meta):
+    return start_generation(
+        key,
+        client,
+        [selected_model],
+        messages,
+        "translator",
+        # Fall through the other models when the selected one is down
+        fallbacks=model_options.values(),
+        meta=meta,
+        extra_headers={
+            "HTTP-Referer": "https://shahs-ai-world.hf.space",
+            "X-Title": "Shah's AI World"
+        },
+        extra_body={
+            "provider": {
+                "data_collection": "deny"
+            }
+        }
+    )
+
+def start_multi_translation(text, targets):
+    """Start every uncached request for a multi-language translation and remember it for reruns."""
+    # Requests still running for an earlier text must not fill in this one
+    discard_generation("translator_detect")
+    for code in LANGUAGES.values():
+        discard_generation(f"translator_multi_{code}")
+
+    result = {"source": text, "targets": targets, "detected": None, "translations": {}, "failed": {}, "recorded": False}
+    detected, detection_confidence = detect_language(text)
+    cached = None if detection_confidence == "High" else translation_cache.get(detect_key(selected_model, text))
+    if detection_confidence == "High":
+        # Detected locally: no detection request, and the target matching the source needs no translation
+        result["detected"] = detected
+        if detected in targets:
+            result["translations"][detected] = text
+    elif cached:
+        result["detected"] = cached["language"]
+    else:
+        start_multi_request(
+            "translator_detect",
+            [
+                {"role": "system", "content": DETECT_SYSTEM_PROMPT},
+                {"role": "user", "content": text[:DETECT_CHARS]}
+            ],
+            {"detect": True}
+        )
+    for target in targets:
+        if target in result["translations"]:
+            continue
+        cached = translation_cache.get(multi_key(selected_model, target, text))
+        if cached:
+            result["translations"][target] = cached["translation"]
+        else:
+            start_multi_request(
+                f"translator_multi_{LANGUAGES[target]}",
+                [
+                    {"role": "system", "content": DOCUMENT_SYSTEM_PROMPT},
+                    {"role": "user", "content": f"Target language: {target}\n\n{text}"}
+                ],
+                {"target": target}
+            )
+    storage["multi_result"] = result
+
+def show_multi_translation(result):
+    """Grid of every target language, filled in as each translation streams in and finishes."""
+    keys = ["translator_detect"] + [f"translator_multi_{LANGUAGES[target]}" for target in result["targets"]]
+    running = [(key, current_generation(key)) for key in keys]
+    running = [(key, generation) for key, generation in running if generation is not None]
+    if running and st.session_state.get("translator_multi_stop"):
+        for _, generation in running:
+            generation.stop()
+
+    with multi_container:
+        st.markdown("---")
+        detected = st.empty()
+        stop_button = st.empty() if all(generation.stopped for _, generation in running) else render_stop_button("translator_multi")
+
+        cells = {}
+        targets = result["targets"]
+        for row in range(0, len(targets), MULTI_COLUMNS):
+            for col, target in zip(st.columns(MULTI_COLUMNS), targets[row:row + MULTI_COLUMNS]):
+                with col:
+                    st.markdown(f"**{target}**")
+                    cells[target] = st.empty()
+
+        def show_detected():
+            if result["detected"]:
+                detected.markdown(f"**🔍 Detected Language:** {result['detected']}")
+            else:
+                detected.caption("Detecting language...")
+
+        def show_cell(target):
+            if target in result["translations"]:
+                cells[target].success(result["translations"][target])
+            elif target in result["failed"]:
+                cells[target].caption(result["failed"][target])
+            else:
+                cells[target].caption("Translating...")
+
+        show_detected()
+        for target in targets:
+            show_cell(target)
+
+        texts = [[] for _ in running]
+        last_frames = [0.0] * len(running)
+        for index, content in follow_all([generation for _, generation in running]):
+            key, generation = running[index]
+            if content:
+                texts[index].append(content)
+                target = generation.meta.get("target")
+                if target and time.monotonic() - last_frames[index] >= FLUSH_INTERVAL:
+                    cells[target].success("".join(texts[index]) + "▌")
+                    last_frames[index] = time.monotonic()
+                continue
+
+            # This request is done: settle its cell right away
+            finish_generation(key)
+            text = "".join(texts[index]).strip()
+            if generation.meta.get("detect"):
+                if text and not generation.error and not generation.stopped:
+                    result["detected"] = text.splitlines()[0].strip(' ."')
+                    translation_cache.set(detect_key(generation.stream.model, result["source"]), {"language": result["detected"]})
+                show_detected()
+                continue
+            target = generation.meta["target"]
+            if generation.error:
+                result["failed"][target] = f"Error: {str(generation.error)}"
+            elif generation.stopped:
+                result["failed"][target] = "⏹️ Stopped before the translation was complete"
+            elif text:
+                # Only complete translations are cached
+                result["translations"][target] = text
+                translation_cache.set(multi_key(generation.stream.model, target, result["source"]), {"translation": text})
+            show_cell(target)
+        stop_button.empty()
+
+        if running:
+            storage["multi_result"] = result
+        if not result["recorded"]:
+            for target in targets:
+                if target in result["translations"]:
+                    add_to_history(
+                        {"detected_language": result["detected"] or "Unknown", "translated_text": result["translations"][target]},
+                        result["source"],
+                        target
+                    )
+            result["recorded"] = True
+            storage["multi_result"] = result
+
+# A translation still being generated from an earlier run: reruns re-attach to it
+generation = current_generation("translator")
+
+if multi_mode:
+    if translate_btn and input_text and target_languages:
+        start_multi_translation(input_text, target_languages)
+    elif translate_btn and input_text:
+        with result_container:
+            st.warning("Please select at least one language.")
+    if storage.get("multi_result"):
+        show_multi_translation(storage["multi_result"])
+
+if live_mode and not translate_btn and not multi_mode:
+    run_live_translation(input_text, target_language)
+elif not live_mode:
+    discard_generation("translator_live")
+
 # Process translation
-if translate_btn and input_text:
-    with result_container:
-        with st.spinner("Translating..."):
-            try:
-                response = client.chat.completions.create(
-                    model=selected_model,
-                    messages=[
-                        {"role": "system", "content": TRANSLATION_SYSTEM_PROMPT},
-                        {"role": "user", "content": f"Translate the following text to {target_language}:\n\n{input_text}"}
-                    ],
-                    extra_headers={
-                        "HTTP-Referer": "https://shahs-ai-world.hf.space",
-                        "X-Title": "Shah's AI World"
-                    },
-                    extra_body={
-                        "provider": {
-                            "data_collection": "deny"
-                        }
+if translate_btn and input_text and not multi_mode:
+    # Identical requests are served from the shared translation cache
+    request_models = race_models or [selected_model]
+    key = cache_key(",".join(request_models), target_language, normalize_text(input_text), TRANSLATION_PROMPT_VERSION)
+
+    # Detected locally in microseconds; a confident match with the target needs no request at all
+    detected, detection_confidence = detect_language(input_text)
+    source_hint = f" from {detected}" if detection_confidence == "High" else ""
+    same_language = detected == target_language and detection_confidence == "High"
+    cached = None if same_language else translation_cache.get(key)
+
+    if same_language:
+        discard_generation("translator")
+        generation = None
+        result = same_language_result(input_text, detected)
+        with result_container:
+            st.caption("⚡ Already in the target language - detected locally, no request sent")
+            show_translation(result, input_text)
+        add_to_history(result, input_text, target_language)
+    elif cached:
+        # The cached translation replaces anything still being generated
+        discard_generation("translator")
+        generation = None
+        with result_container:
+            st.caption(f"⚡ Cache hit - saved ~{cached['latency']:.1f}s")
+            show_translation(cached["result"], input_text)
+        add_to_history(cached["result"], input_text, target_language)
+    else:
+        try:
+            # Race the chosen models when "Fastest wins" is on
+            generation = start_generation(
+                "translator",
+                client,
+                request_models,
+                [
+                    {"role": "system", "content": TRANSLATION_SYSTEM_PROMPT},
+                    {"role": "user", "content": f"Translate the following text{source_hint} to {target_language}:\n\n{input_text}"}
+                ],
+                "translator",
+                # Fall through the other models when the selected one is down
+                fallbacks=model_options.values(),
+                meta={"cache_key": key, "models": request_models, "input_text": input_text, "target_language": target_language, "detected": source_hint and detected},
+                # JSON schema, forced tool call or JSON mode, whichever the answering model supports
+                structured_output={"name": "translation", "schema": TRANSLATION_SCHEMA},
+                extra_headers={
+                    "HTTP-Referer": "https://shahs-ai-world.hf.space",
+                    "X-Title": "Shah's AI World"
+                },
+                extra_body={
+                    "provider": {
+                        "data_collection": "deny"
                     }
-                )
-
-                response_text = response.choices[0].message.content.strip()
-
-                # Try to parse JSON response
-                try:
-                    # Clean up response if needed
-                    if "```json" in response_text:
-                        response_text = response_text.split("```json")[1].split("```")[0].strip()
-                    elif "```" in response_text:
-                        response_text = response_text.split("```")[1].split("```")[0].strip()
-
-                    result = json.loads(response_text)
-
-                    # Display results
-                    st.markdown(f"**🔍 Detected Language:** {result.get('detected_language', 'Unknown')} ({result.get('confidence_detection', 'N/A')} confidence)")
-
-                    st.markdown("---")
-
-                    if result.get('is_same_language', False):
-                        st.info("The input text is already in the target language.")
-                        st.markdown(f"**📄 Text:** {result.get('original_text', input_text)}")
-                    else:
-                        st.markdown(f"### 🎯 Translation")
-                        st.success(result.get('translated_text', 'Translation not available'))
-                        st.caption(f"Confidence: {result.get('confidence_translation', 'N/A')}")
-
-                    # Alternatives
-                    alternatives = result.get('alternatives', [])
-                    if alternatives and len(alternatives) > 0:
-                        st.markdown("**🌟 Alternatives:**")
-                        for alt in alternatives:
-                            if alt:
-                                st.markdown(f"• {alt}")
-
-                    # Cultural notes
-                    cultural_notes = result.get('cultural_notes', '')
-                    if cultural_notes and cultural_notes.strip():
-                        st.markdown("**💡 Cultural Notes:**")
-                        st.info(cultural_notes)
-
-                    # Add to history
-                    st.session_state.translation_history.insert(0, {
-                        "original": input_text,
-                        "detected_lang": result.get('detected_language', 'Unknown'),
-                        "target_lang": target_language,
-                        "translation": result.get('translated_text', ''),
-                        "alternatives": alternatives,
-                        "cultural_notes": cultural_notes
-                    })
-
-                    # Keep only last 10 translations
-                    st.session_state.translation_history = st.session_state.translation_history[:10]
-
-                except json.JSONDecodeError:
-                    # If JSON parsing fails, display raw response
-                    st.markdown("### Translation Result")
-                    st.write(response_text)
-
-            except Exception as e:
+                }
+            )
+        except Exception as e:
+            with result_container:
                 st.error(f"Error: {str(e)}")
-                st.info("Please check your API key and try again.")
+                st.info(error_hint(e))
 
 elif translate_btn and not input_text:
     with result_container:
         st.warning("Please enter text to translate.")
 
+# Follow the translation being generated in the background
+if generation is not None:
+    with result_container:
+        # Offer Stop while the translation is still coming in
+        stop_button = st.empty() if generation.stopped else render_stop_button("translator")
+        source_text = generation.meta["input_text"]
+        source_target = generation.meta["target_language"]
+
+        # Stream the JSON, showing each field as soon as it can be displayed
+        live = st.empty()
+        with live.container():
+            st.caption("Translating...")
+        parser = IncrementalJSONParser()
+        chunks = []
+        last_frame = 0.0
+
+        for content in generation.follow():
+            chunks.append(content)
+            parser.feed(content)
+            # Draw as soon as the language is known; the input echo before the translation can be long
+            visible = "detected_language" in parser.complete or "translated_text" in parser.fields
+            if visible and time.monotonic() - last_frame >= FLUSH_INTERVAL:
+                with live.container():
+                    show_partial_translation(parser, generation.meta.get("detected"))
+                last_frame = time.monotonic()
+
+        response_text = "".join(chunks).strip()
+        live.empty()
+        stop_button.empty()
+        finish_generation("translator")
+
+        if generation.stopped or generation.error:
+            if generation.error:
+                st.error(f"Error: {str(generation.error)}")
+                st.info(error_hint(generation.error))
+            # Keep what arrived so far, but never cache it
+            if parser.fields.get("translated_text", "").strip():
+                show_translation(parser.fields, source_text)
+                add_to_history(parser.fields, source_text, source_target, stopped=True)
+        else:
+            if stream_caption(generation.stream, model_options):
+                st.caption(stream_caption(generation.stream, model_options))
+
+            result = parser.fields if parser.done else None
+            if result is None:
+                # Last resort for output that slipped past the schema: repair the JSON
+                result = repair_json(response_text)
+                if result is not None and result.get("translated_text", "").strip():
+                    metrics.increment("repairs", "translator", generation.stream.model)
+                else:
+                    result = None
+
+            if result is not None:
+                # Only well-formed (or repaired) results from the requested models are cached; a fallback's is not
+                if generation.stream.model in generation.meta["models"]:
+                    translation_cache.set(generation.meta["cache_key"], {"result": result, "latency": generation.elapsed})
+
+                st.caption(f"Cache miss - translated in {generation.elapsed:.1f}s")
+                show_translation(result, source_text)
+                add_to_history(result, source_text, source_target)
+            else:
+                # If JSON parsing fails, display raw response
+                metrics.increment("parse_failures", "translator", generation.stream.model)
+                st.markdown("### Translation Result")
+                st.write(response_text)
+
 # Display placeholder when no translation yet
-if not translate_btn:
+if not translate_btn and generation is None and not (live_mode and input_text.strip()) and not multi_mode:
     with result_container:
         st.markdown("""
         <div style='padding: 40px; text-align: center; color: #888; background: #f8f9fa; border-radius: 10px;'>
@@ -258,20 +908,22 @@ if not translate_btn:
 # Translation History
 st.markdown("---")
 
-if st.session_state.translation_history:
+if storage["translation_history"]:
     with st.expander("📜 Translation History", expanded=False):
-        for i, item in enumerate(st.session_state.translation_history):
+        for i, item in enumerate(storage["translation_history"]):
             col1, col2 = st.columns(2)
             with col1:
                 st.markdown(f"**{item['detected_lang']}:** {item['original'][:100]}{'...' if len(item['original']) > 100 else ''}")
             with col2:
                 st.markdown(f"**{item['target_lang']}:** {item['translation'][:100]}{'...' if len(item['translation']) > 100 else ''}")
-            if i < len(st.session_state.translation_history) - 1:
+                if item.get("stopped"):
+                    st.caption("⏹️ Stopped before the translation was complete")
+            if i < len(storage["translation_history"]) - 1:
                 st.divider()
 
 # Quick language pairs
 st.markdown("---")
-with st.expander("🚀 Quick Translate Examples", expanded=len(st.session_state.translation_history) == 0):
+with st.expander("🚀 Quick Translate Examples", expanded=len(storage["translation_history"]) == 0):
     st.markdown("Click any example to try it:")
 
     examples = [
@@ -283,12 +935,20 @@ with st.expander("🚀 Quick Translate Examples", expanded=len(st.session_state.
         ("Ciao, come stai?", "Italian greeting"),
     ]
 
+    # Fill the input from a callback, before the text area is created on rerun
+    def use_example(text):
+        st.session_state.translation_input = text
+
     cols = st.columns(3)
     for idx, (text, desc) in enumerate(examples):
         with cols[idx % 3]:
-            if st.button(f"'{text[:20]}...' ({desc})", key=f"example_{idx}", use_container_width=True):
-                st.session_state.translation_input = text
-                st.rerun()
+            st.button(
+                f"'{text[:20]}...' ({desc})",
+                key=f"example_{idx}",
+                use_container_width=True,
+                on_click=use_example,
+                args=(text,)
+            )
 
 # Tips
 with st.expander("💡 Translation Tips"):
@@ -0,0 +1,88 @@
+import hmac
+import os
+import streamlit as st
+from utils.cache import get_cache
+from utils.cancellation import get_stream_reaper
+from utils.conversations import get_conversation_store
+from utils.generation import get_generation_worker
+from utils.memory import format_bytes, get_session_memory
+
+st.set_page_config(
+    page_title="Admin - Shah's AI World",
+    page_icon="🛠️",
+    layout="wide"
+)
+
+st.title("🛠️ Admin")
+
+# The admin view is off unless the server sets a token
+admin_token = os.environ.get("ADMIN_TOKEN", "")
+if not admin_token:
+    st.info("The admin view is disabled. Set the `ADMIN_TOKEN` environment variable to enable it.")
+    st.stop()
+
+with st.sidebar:
+    st.header("⚙️ Configuration")
+    token = st.text_input("Admin token", type="password", placeholder="Enter the admin token")
+    st.button("🔄 Refresh", use_container_width=True)
+
+if not hmac.compare_digest(token.encode("utf-8"), admin_token.encode("utf-8")):
+    st.warning("👈 Please enter the admin token in the sidebar.")
+    st.stop()
+
+memory = get_session_memory().summary()
+
+# Session memory across every connected session
+st.subheader("🧠 Session Memory")
+col1, col2, col3, col4 = st.columns(4)
+col1.metric("In memory", format_bytes(memory["total"]), help="Approximate size of chat transcripts, diagrams and translations held by all sessions")
+col2.metric("Budget", format_bytes(memory["budget"]), help="Set with SESSION_MEMORY_BUDGET_MB")
+col3.metric("Sessions", len(memory["sessions"]))
+col4.metric("Spilled to disk", memory["spills"], help=f"{format_bytes(memory['spilled_bytes'])} moved to disk in total")
+
+if memory["apps"]:
+    table = [
+        "| App | Memory | Share |",
+        "|---|---|---|",
+    ]
+    for app, size in sorted(memory["apps"].items(), key=lambda item: item[1], reverse=True):
+        share = size / memory["total"] if memory["total"] else 0
+        table.append(f"| {app} | {format_bytes(size)} | {share:.0%} |")
+    st.markdown("\n".join(table))
+
+    st.markdown("**Largest sessions**")
+    table = [
+        "| Session | Apps | Memory | Idle | Spilled |",
+        "|---|---|---|---|---|",
+    ]
+    for row in memory["sessions"][:25]:
+        table.append(
+            f"| `{row['session'][:8]}` | {', '.join(row['apps'])} | {format_bytes(row['bytes'])} "
+            f"| {row['idle']:.0f}s | {', '.join(row['spilled']) or '-'} |"
+        )
+    st.markdown("\n".join(table))
+else:
+    st.caption("No sessions recorded yet.")
+
+st.markdown("---")
+
+# Background work and storage
+st.subheader("⚙️ Background Work & Storage")
+col1, col2, col3, col4 = st.columns(4)
+col1.metric("Answers generating", get_generation_worker().running())
+col2.metric("Open streams", get_stream_reaper().open_streams())
+col3.metric("Streams reaped", get_stream_reaper().reaped, help="Closed because their session went away")
+conversation_stats = get_conversation_store().stats()
+col4.metric("Saved conversations", conversation_stats["conversations"], help=f"{conversation_stats['messages']} messages")
+
+table = [
+    "| Cache | Hits | Misses | In memory | On disk |",
+    "|---|---|---|---|---|",
+]
+for name in ("diagrams", "translations", "starters"):
+    stats = get_cache(name).stats()
+    table.append(
+        f"| {name} | {stats['hits']} | {stats['misses']} "
+        f"| {stats['memory_entries']} ({format_bytes(stats['memory_bytes'])}) | {stats['disk_entries']} |"
+    )
+st.markdown("\n".join(table))
@@ -0,0 +1,18 @@
+from utils.conversations import ConversationStore
+
+
+def test_two_sessions_appending_to_one_conversation(tmp_path):
+    store = ConversationStore(str(tmp_path / "conversations.sqlite3"))
+    first = store.new("chat")
+    first.append({"role": "user", "content": "hello"})
+    second = store.load(first.id, "chat")
+
+    first.append({"role": "assistant", "content": "hi from the first session"})
+    second.append({"role": "assistant", "content": "hi from the second session"})
+    first.append({"role": "user", "content": "thanks"})
+
+    expected = ["hello", "hi from the first session", "hi from the second session", "thanks"]
+    assert [message["content"] for message in first] == expected
+    assert [message["content"] for message in store.load(first.id)] == expected
+    assert len(second) == 3
+    assert store.stats() == {"conversations": 1, "messages": 4}
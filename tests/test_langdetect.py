@@ -0,0 +1,77 @@
+import pytest
+
+from utils.langdetect import _distinct_weights, detect_language
+
+
+@pytest.mark.parametrize("text", [
+    "I visited São Paulo last year and the food was wonderful, I want to go back soon.",
+    "We had a wonderful piñata at the birthday party and the kids loved every minute of it.",
+    "My friend Łukasz is coming over for dinner tonight and bringing his new girlfriend.",
+    "We stayed at a small café in Åkersberga during our holiday and it was really lovely.",
+])
+def test_borrowed_letter_does_not_decide_the_language(text):
+    language, _ = detect_language(text)
+    assert language == "English"
+
+
+@pytest.mark.parametrize("text", [
+    "Привіт, як справи? Дякую, у мене все добре, а як твої справи сьогодні?",
+    "سلام، حال شما چطور است؟ من امروز خیلی خوشحال هستم و می خواهم به پارک بروم.",
+])
+def test_other_languages_of_a_shared_script_are_not_confident(text):
+    assert detect_language(text)[1] != "High"
+
+
+@pytest.mark.parametrize("text, language", [
+    ("Привет, как дела? Спасибо, у меня всё хорошо, а как твои дела сегодня?", "Russian"),
+    ("مرحبا، كيف حالك اليوم؟ أنا بخير والحمد لله وأريد أن أذهب إلى الحديقة.", "Arabic"),
+    ("नमस्ते, आप कैसे हैं? मैं आज बहुत खुश हूँ।", "Hindi"),
+    ("今天天气很好，我们去公园散步吧。", "Chinese (Simplified)"),
+])
+def test_shared_scripts_are_capped_at_medium(text, language):
+    assert detect_language(text) == (language, "Medium")
+
+
+@pytest.mark.parametrize("text, language", [
+    ("今日は天気がいいですね", "Japanese"),
+    ("오늘 날씨가 좋네요", "Korean"),
+    ("สวัสดีครับ สบายดีไหม", "Thai"),
+    ("Γεια σου, τι κάνεις;", "Greek"),
+])
+def test_own_scripts_are_confident(text, language):
+    assert detect_language(text) == (language, "High")
+
+
+@pytest.mark.parametrize("text, language", [
+    ("Die Straße ist heute sehr ruhig, weil alle Leute im Urlaub sind und nichts passiert.", "German"),
+    ("Eu não sei o que fazer amanhã à tarde, você tem alguma ideia para nós?", "Portuguese"),
+    ("Could you send me the report by Friday afternoon?", "English"),
+    ("Pourriez-vous m'envoyer le rapport avant vendredi après-midi ?", "French"),
+    ("Kannst du mir den Bericht bis Freitagnachmittag schicken?", "German"),
+])
+def test_latin_languages(text, language):
+    assert detect_language(text) == (language, "High")
+
+
+@pytest.mark.parametrize("text", [
+    # Norwegian and Malay, close enough to Swedish and Indonesian to score as them
+    "Katten sover på sofaen fordi det er veldig kaldt ute.",
+    "Kucing itu sedang tidur di atas sofa kerana cuaca di luar sangat sejuk.",
+])
+def test_close_relatives_are_not_confident(text):
+    assert detect_language(text)[1] != "High"
+
+
+def test_close_relative_with_its_own_letter_is_confident():
+    assert detect_language("Katten sover i soffan eftersom det är väldigt kallt ute.") == ("Swedish", "High")
+
+
+def test_distinct_letter_counts_after_lowercasing():
+    # casefold() would have turned "ß" into "ss" before the lookup
+    weights = _distinct_weights("STRASSE Straße", ["English", "German"])
+    assert weights[0] == 0 and weights[1] > 0
+
+
+@pytest.mark.parametrize("text", ["Hi", "Ciao, come stai?", "12345 !!!", ""])
+def test_short_or_unclear_text_is_left_to_the_model(text):
+    assert detect_language(text) == (None, None)
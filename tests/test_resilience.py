@@ -0,0 +1,69 @@
+import time
+from types import SimpleNamespace
+
+from utils.completions import CompletionStream
+from utils.metrics import MetricsCollector
+from utils.resilience import CircuitBreaker
+
+
+def _chunk(content=None, finish_reason=None):
+    delta = SimpleNamespace(content=content, tool_calls=None)
+    return SimpleNamespace(choices=[SimpleNamespace(delta=delta, finish_reason=finish_reason)], usage=None)
+
+
+class _Response:
+    def __init__(self, model):
+        self._chunks = iter([_chunk(f"answer from {model}"), _chunk(finish_reason="stop")])
+
+    def __iter__(self):
+        return self._chunks
+
+    def close(self):
+        pass
+
+
+class _Client:
+    def __init__(self):
+        self.models = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model, **kwargs):
+        self.models.append(model)
+        return _Response(model)
+
+
+def _trip(breaker, model):
+    for _ in range(breaker.failures):
+        breaker.record_failure(model)
+
+
+def test_open_circuit_closes_to_half_open_after_reset():
+    breaker = CircuitBreaker(failures=2, reset_seconds=0.05)
+    _trip(breaker, "a/model")
+    assert breaker.is_open("a/model")
+    assert not breaker.allow("a/model")
+    time.sleep(0.06)
+    assert not breaker.is_open("a/model")
+    assert breaker.allow("a/model")
+    # The half-open trial failed: open again straight away
+    breaker.record_failure("a/model")
+    assert breaker.is_open("a/model")
+
+
+def test_tripped_model_rejoins_the_race_after_reset(tmp_path):
+    breaker = CircuitBreaker(failures=1, reset_seconds=0.05)
+    metrics = MetricsCollector(path=str(tmp_path / "metrics.prom"))
+    _trip(breaker, "b/model")
+
+    client = _Client()
+    stream = CompletionStream(client, ["a/model", "b/model"], [], "test", breaker=breaker, metrics=metrics)
+    "".join(stream)
+    stream.close()
+    assert client.models == ["a/model"]
+
+    time.sleep(0.06)
+    client = _Client()
+    stream = CompletionStream(client, ["a/model", "b/model"], [], "test", breaker=breaker, metrics=metrics)
+    "".join(stream)
+    stream.close()
+    assert sorted(client.models) == ["a/model", "b/model"]
@@ -0,0 +1 @@
+"""Shared helpers used across the Shah's AI World pages."""
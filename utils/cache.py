@@ -0,0 +1,146 @@
+"""Content-addressed result cache: in-process LRU backed by SQLite."""
+
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+import streamlit as st
+
+from utils.paths import data_path
+
+DEFAULT_MEMORY_BYTES = 16 * 1024 * 1024
+DEFAULT_DISK_ENTRIES = 20000
+
+
+def normalize_text(text):
+    """Normalize text so trivially different inputs share a cache entry."""
+    text = unicodedata.normalize("NFC", text)
+    lines = (re.sub(r"[ \t]+", " ", line).strip() for line in text.strip().splitlines())
+    return "\n".join(lines)
+
+
+def normalize_prompt(prompt):
+    """Normalize a free-text request: case, whitespace, wrapping quotes and trailing punctuation."""
+    text = re.sub(r"\s+", " ", unicodedata.normalize("NFC", prompt)).strip().casefold()
+    text = text.strip("\"'“”‘’> ")
+    return text.rstrip(".!?;, ")
+
+
+def prompt_version(prompt):
+    """Short fingerprint of a system prompt, so editing it invalidates old entries."""
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:12]
+
+
+def cache_key(*parts):
+    """Hash the parts that identify a result into a cache key."""
+    return hashlib.sha256("\x1f".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+
+
+class TwoTierCache:
+    """JSON values in a size-bounded memory LRU, persisted to SQLite.
+
+    Memory hits are served without touching disk; disk hits are promoted
+    back into memory. Both tiers evict least-recently-used entries.
+    """
+
+    def __init__(self, name, max_memory_bytes=DEFAULT_MEMORY_BYTES,
+                 max_disk_entries=DEFAULT_DISK_ENTRIES, db_path=None):
+        self.name = name
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_entries = max_disk_entries
+        self.memory_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path or data_path("cache", f"{name}.sqlite3"), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    def get(self, key):
+        """Return the cached value, or None on a miss."""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return json.loads(self._memory[key])
+
+            row = self._db.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+            self._remember(key, row[0])
+            self.hits += 1
+            return json.loads(row[0])
+
+    def contains(self, key):
+        """True if the key is cached; unlike get() this does not count as a hit or miss."""
+        with self._lock:
+            if key in self._memory:
+                return True
+            return self._db.execute("SELECT 1 FROM entries WHERE key = ?", (key,)).fetchone() is not None
+
+    def set(self, key, value):
+        """Store a JSON-serializable value in both tiers."""
+        payload = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._remember(key, payload)
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries (key, value, last_access) VALUES (?, ?, ?)",
+                (key, payload, time.time()),
+            )
+            self._db.execute(
+                "DELETE FROM entries WHERE key NOT IN "
+                "(SELECT key FROM entries ORDER BY last_access DESC LIMIT ?)",
+                (self.max_disk_entries,),
+            )
+            self._db.commit()
+
+    def delete(self, key):
+        with self._lock:
+            payload = self._memory.pop(key, None)
+            if payload is not None:
+                self.memory_bytes -= len(payload)
+            self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            disk_entries = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self.memory_bytes,
+                "disk_entries": disk_entries,
+            }
+
+    def _remember(self, key, payload):
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self.memory_bytes -= len(previous)
+        if len(payload) > self.max_memory_bytes:
+            return
+        self._memory[key] = payload
+        self.memory_bytes += len(payload)
+        while self.memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self.memory_bytes -= len(evicted)
+
+
+@st.cache_resource
+def get_cache(name, max_memory_bytes=DEFAULT_MEMORY_BYTES):
+    """Process-wide cache instance shared by every session."""
+    return TwoTierCache(name, max_memory_bytes=max_memory_bytes)
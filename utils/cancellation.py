@@ -0,0 +1,128 @@
+"""Stopping generations early and closing streams nobody is reading any more.
+
+A Stop click stops the session's answer and keeps the text so far. Sessions
+that disconnect mid-answer never click anything, so a reaper thread closes
+streams whose session has stayed inactive for longer than a reconnect takes.
+"""
+
+import os
+import socket
+import threading
+import time
+import weakref
+
+import streamlit as st
+from streamlit.runtime import Runtime
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+# How often the reaper looks for streams of disconnected sessions, and how
+# long a session may stay disconnected (e.g. reconnecting) before they are closed
+REAP_INTERVAL = float(os.environ.get("STREAM_REAP_INTERVAL", "5"))
+REAP_GRACE = float(os.environ.get("STREAM_REAP_GRACE", "30"))
+
+
+def current_session_id():
+    """The session running this script thread, or None outside a script run."""
+    ctx = get_script_run_ctx(suppress_warning=True)
+    return ctx.session_id if ctx else None
+
+
+def abort_response(response):
+    """Close a streaming response at once, even while another thread is blocked reading it.
+
+    Closing the socket alone does not wake a blocked read, so HTTP/1.1
+    connections are shut down first. HTTP/2 connections are shared with other
+    requests; closing the response resets only this stream.
+    """
+    http_response = getattr(response, "response", response)
+    try:
+        if http_response.http_version != "HTTP/2":
+            network_stream = http_response.extensions.get("network_stream")
+            sock = network_stream.get_extra_info("socket") if network_stream else None
+            if sock is not None:
+                sock.shutdown(socket.SHUT_RDWR)
+    except (OSError, AttributeError):
+        pass
+    response.close()
+
+
+class StreamReaper:
+    """Tracks open streams per session and aborts those of sessions that went away.
+
+    Anything with an abort() method can be registered: API streams and
+    background generations alike.
+    """
+
+    def __init__(self, interval=REAP_INTERVAL, grace=REAP_GRACE):
+        self.interval = interval
+        self.grace = grace
+        self.reaped = 0
+        self._streams = {}
+        self._inactive_since = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        threading.Thread(target=self._loop, name="stream-reaper", daemon=True).start()
+
+    def register(self, session_id, stream):
+        with self._lock:
+            self._streams.setdefault(session_id, weakref.WeakSet()).add(stream)
+
+    def unregister(self, session_id, stream):
+        with self._lock:
+            streams = self._streams.get(session_id)
+            if streams is not None:
+                streams.discard(stream)
+                if not streams:
+                    del self._streams[session_id]
+                    self._inactive_since.pop(session_id, None)
+
+    def open_streams(self):
+        with self._lock:
+            return sum(len(streams) for streams in self._streams.values())
+
+    def reap(self):
+        """Abort every stream whose session has been gone past the grace period; returns how many."""
+        if not Runtime.exists():
+            return 0
+        runtime = Runtime.instance()
+        now = time.monotonic()
+        with self._lock:
+            orphaned = []
+            for session_id in self._streams:
+                if runtime.is_active_session(session_id):
+                    self._inactive_since.pop(session_id, None)
+                elif now - self._inactive_since.setdefault(session_id, now) >= self.grace:
+                    orphaned.append(session_id)
+            streams = []
+            for session_id in orphaned:
+                streams.extend(self._streams.pop(session_id))
+                del self._inactive_since[session_id]
+        for stream in streams:
+            stream.abort()
+        self.reaped += len(streams)
+        return len(streams)
+
+    def _loop(self):
+        while not self._wake.wait(self.interval):
+            try:
+                self.reap()
+            except Exception:
+                # Never let one bad session stop the reaper
+                pass
+
+
+@st.cache_resource
+def get_stream_reaper():
+    """Process-wide stream reaper, created once per server."""
+    return StreamReaper()
+
+
+def render_stop_button(key):
+    """Show a Stop button while an answer streams; returns its placeholder for clearing.
+
+    The click is picked up on the rerun it triggers, under the `{key}_stop`
+    session state key (see utils.generation.current_generation).
+    """
+    placeholder = st.empty()
+    placeholder.button("⏹️ Stop", key=f"{key}_stop", help="Stop generating and keep the answer so far")
+    return placeholder
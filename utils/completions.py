@@ -0,0 +1,426 @@
+"""Streaming chat completions with retries, fallbacks and optional model racing."""
+
+import queue
+import threading
+import time
+
+import streamlit as st
+
+from utils.cancellation import abort_response, current_session_id, get_stream_reaper
+from utils.metrics import get_metrics
+from utils.prompt_cache import cacheable_messages, usage_counts
+from utils.structured import structured_mode, structured_output_options
+from utils.resilience import (
+    RETRY_ATTEMPTS,
+    ModelUnavailableError,
+    StreamInterruptedError,
+    backoff_delay,
+    fallback_chain,
+    get_circuit_breaker,
+    is_retryable,
+    should_fall_through,
+)
+
+_DONE = object()
+_CLOSED = object()
+
+# A resumed stream is checked for text repeating the end of the partial answer
+OVERLAP_CHARS = 200
+MIN_OVERLAP = 8
+
+
+def chunk_content(chunk):
+    """Content of a streamed chunk, or None for role/usage-only chunks.
+
+    Structured output requested through a forced tool call arrives as the
+    call's arguments instead of content; those are returned the same way.
+    """
+    if not chunk.choices:
+        return None
+    delta = chunk.choices[0].delta
+    if delta.content:
+        return delta.content
+    for call in getattr(delta, "tool_calls", None) or ():
+        if call.function and call.function.arguments:
+            return call.function.arguments
+    return delta.content
+
+
+def chunk_finished(chunk):
+    """True for the chunk that carries the finish reason."""
+    return bool(chunk.choices and chunk.choices[0].finish_reason)
+
+
+def strip_overlap(partial, continuation):
+    """Drop the start of a continuation that repeats the end of the partial answer."""
+    trailing = partial[len(partial.rstrip()):]
+    if trailing and continuation.startswith(trailing):
+        continuation = continuation[len(trailing):]
+    partial = partial.rstrip()
+    for size in range(min(len(partial), len(continuation), OVERLAP_CHARS), MIN_OVERLAP - 1, -1):
+        if partial.endswith(continuation[:size]):
+            return continuation[size:]
+    return continuation
+
+
+class CompletionStream:
+    """Iterates the text of a streamed chat completion.
+
+    With one model this wraps the API stream, retrying transient failures
+    with backoff and falling through `fallbacks` when a model's circuit is
+    open. A stream that breaks mid-answer is resumed by sending the partial
+    answer back as an assistant prefill, so the model continues where it
+    stopped instead of starting over.
+
+    With several models ("fastest wins"), the prompt is sent to all of them
+    at once; the first model to produce a token wins, and the other
+    in-flight streams are closed straight away so they stop generating (and
+    billing).
+
+    Creating the stream blocks until the first token has arrived, so `model`
+    is always the model whose answer is being streamed; with `start=False`
+    that wait happens in start() instead, so the stream can be aborted while
+    it waits. Every request is reported to the metrics collector under
+    `page`. Prompts are marked for provider prompt caching, and the token
+    usage of the answer (including cached prompt tokens) is kept in `usage`.
+    `structured_output` ({"name", "schema"}) asks each model for JSON
+    matching the schema in whatever way it supports (utils.structured).
+    Streams opened from a script run are registered with the reaper,
+    which aborts them if the session disconnects; callers close() them in a
+    `finally`. Worker threads pass in the `breaker` and `metrics` they were
+    given on the script thread.
+    """
+
+    def __init__(self, client, models, messages, page, fallbacks=(), start=True,
+                 breaker=None, metrics=None, structured_output=None, **request_options):
+        self.client = client
+        self.models = list(dict.fromkeys(models))
+        self.messages = messages
+        self.page = page
+        self.fallbacks = list(fallbacks)
+        # Ask for the usage chunk at the end of the stream to read cached-token counts
+        self.request_options = {"stream_options": {"include_usage": True}, **request_options}
+        self.structured_output = structured_output
+        self.model = None
+        self.cancelled = []
+        # (event, model) pairs for "retry", "fallback" and "resume"
+        self.events = []
+
+        self._breaker = breaker or get_circuit_breaker()
+        self._metrics = metrics or get_metrics()
+        self._text = []
+        self._trackers = {}
+        self._usages = {}
+        self._responses = {}
+        self._lock = threading.Lock()
+        self._closed = False
+        self._started = False
+        self._first = None
+
+        self._session_id = current_session_id()
+        if self._session_id:
+            get_stream_reaper().register(self._session_id, self)
+
+        # Models with an open circuit sit the race out; once it has been open for the reset
+        # time they rejoin as the half-open trial, and a failure opens the circuit again
+        racers = [model for model in self.models if not self._breaker.is_open(model)]
+        if len(racers) > 1:
+            self._queue = queue.Queue()
+            for model in racers:
+                self._trackers[model] = self._metrics.track(page, model)
+                threading.Thread(target=self._run, args=(model,), daemon=True).start()
+            self._chunks = self._race(racers)
+        else:
+            self._chunks = self._resilient(racers[0] if racers else self.models[0])
+
+        if start:
+            self.start()
+
+    @property
+    def usage(self):
+        """Token usage the provider reported for the answering model, or None."""
+        return self._usages.get(self.model)
+
+    def start(self):
+        """Wait for the first token so the winner is known before rendering starts."""
+        if not self._started:
+            self._started = True
+            self._first = next(self._chunks, None)
+
+    def __iter__(self):
+        self.start()
+        if self._first is not None:
+            yield self._first
+            self._first = None
+        yield from self._chunks
+
+    def close(self):
+        """Stop reading; closes every stream that is still open. Safe to call twice."""
+        self.abort()
+        self._chunks.close()
+        if self._session_id:
+            get_stream_reaper().unregister(self._session_id, self)
+
+    def abort(self):
+        """Close the upstream connections now; safe to call from any thread."""
+        self._closed = True
+        self._cancel(list(self._responses))
+        if hasattr(self, "_queue"):
+            # Wake a reader waiting for the next racer chunk
+            self._queue.put((None, _CLOSED))
+
+    def _resilient(self, model):
+        """Stream from `model`, retrying, resuming and falling back as needed."""
+        last_error = None
+        for candidate in fallback_chain(model, self.fallbacks):
+            if not self._breaker.allow(candidate):
+                continue
+            if candidate != model:
+                self.events.append(("fallback", candidate))
+                self._metrics.increment("fallbacks", self.page, candidate)
+            self.model = candidate
+
+            for attempt in range(RETRY_ATTEMPTS + 1):
+                if self._closed:
+                    return
+                if attempt:
+                    self.events.append(("retry", candidate))
+                    self._metrics.increment("retries", self.page, candidate)
+                    time.sleep(backoff_delay(attempt, last_error))
+                try:
+                    yield from self._attempt(candidate)
+                except Exception as e:
+                    if self._closed:
+                        return
+                    last_error = e
+                    if not is_retryable(e):
+                        # The provider answered, so the model itself is healthy
+                        self._breaker.record_success(candidate)
+                        if should_fall_through(e) and not self._text:
+                            break
+                        raise
+                    self._breaker.record_failure(candidate)
+                    if not self._breaker.allow(candidate):
+                        break
+                    continue
+                self._breaker.record_success(candidate)
+                return
+        raise last_error or ModelUnavailableError("All models are temporarily unavailable.")
+
+    def _options(self, model, resumed=False):
+        """Request options for `model`, including its structured output mode."""
+        if resumed and structured_mode(model) == "tool":
+            # The prefill continues the arguments as plain text; a forced tool call would start over
+            return self.request_options
+        return {**self.request_options, **structured_output_options(model, self.structured_output)}
+
+    def _attempt(self, model):
+        """One streamed request; continues the partial answer if there is one."""
+        partial = "".join(self._text)
+        messages = cacheable_messages(self.messages, model)
+        if partial:
+            self.events.append(("resume", model))
+            self._metrics.increment("resumes", self.page, model)
+            # Providers reject a prefill that ends in whitespace
+            messages = messages + [{"role": "assistant", "content": partial.rstrip()}]
+
+        tracker = self._metrics.track(self.page, model).start(messages)
+        response = None
+        head = [] if partial else None
+        finished = False
+        usage = None
+        try:
+            response = self.client.chat.completions.create(
+                model=model,
+                messages=messages,
+                stream=True,
+                **self._options(model, resumed=bool(partial))
+            )
+            with self._lock:
+                self._responses[model] = response
+            for chunk in response:
+                if self._closed:
+                    return
+                finished = finished or chunk_finished(chunk)
+                if chunk.usage is not None:
+                    usage = self._usages[model] = chunk.usage
+                content = chunk_content(chunk)
+                if not content:
+                    continue
+                tracker.chunk(content)
+                if head is not None:
+                    # Hold back the start of a resumed answer until any repeat can be trimmed
+                    head.append(content)
+                    if sum(len(piece) for piece in head) < OVERLAP_CHARS:
+                        continue
+                    content = strip_overlap(partial, "".join(head))
+                    head = None
+                    if not content:
+                        continue
+                self._text.append(content)
+                yield content
+            if head:
+                content = strip_overlap(partial, "".join(head))
+                if content:
+                    self._text.append(content)
+                    yield content
+            if not finished:
+                raise StreamInterruptedError(f"The {model} stream ended before the answer was complete.")
+        except Exception as e:
+            if self._closed:
+                tracker.finish(cancelled=True)
+            else:
+                tracker.finish(error=e)
+            raise
+        finally:
+            tracker.finish(cancelled=self._closed, **usage_counts(usage))
+            with self._lock:
+                self._responses.pop(model, None)
+            if response is not None:
+                response.close()
+
+    def _run(self, model):
+        # Runs in a worker thread - no Streamlit calls here
+        tracker = self._trackers[model]
+        response = None
+        finished = False
+        usage = None
+        messages = cacheable_messages(self.messages, model)
+        try:
+            tracker.start(messages)
+            response = self.client.chat.completions.create(
+                model=model,
+                messages=messages,
+                stream=True,
+                **self._options(model)
+            )
+            with self._lock:
+                if model in self.cancelled or self._closed:
+                    return
+                self._responses[model] = response
+            for chunk in response:
+                if model in self.cancelled or self._closed:
+                    return
+                finished = finished or chunk_finished(chunk)
+                if chunk.usage is not None:
+                    usage = self._usages[model] = chunk.usage
+                content = chunk_content(chunk)
+                if content:
+                    tracker.chunk(content)
+                    self._queue.put((model, content))
+            if not finished:
+                raise StreamInterruptedError(f"The {model} stream ended before the answer was complete.")
+            tracker.finish(**usage_counts(usage))
+            self._breaker.record_success(model)
+            self._queue.put((model, _DONE))
+        except Exception as e:
+            if model not in self.cancelled and not self._closed:
+                tracker.finish(error=e)
+                if is_retryable(e):
+                    self._breaker.record_failure(model)
+                self._queue.put((model, e))
+        finally:
+            with self._lock:
+                self._responses.pop(model, None)
+            if response is not None:
+                response.close()
+
+    def _race(self, racers):
+        try:
+            pending = set(racers)
+            while self.model is None:
+                model, item = self._queue.get()
+                if item is _CLOSED:
+                    return
+                if item is _DONE or isinstance(item, Exception):
+                    # Finished without a single token, or failed: the others may still answer
+                    pending.discard(model)
+                    if not pending:
+                        break
+                    continue
+                self.model = model
+                self._cancel([other for other in racers if other != model])
+                self._text.append(item)
+                yield item
+
+            while self.model is not None:
+                model, item = self._queue.get()
+                if item is _CLOSED:
+                    return
+                if model != self.model:
+                    continue
+                if item is _DONE:
+                    return
+                if isinstance(item, Exception):
+                    if not is_retryable(item):
+                        raise item
+                    # The winner broke mid-answer: carry on from the partial text
+                    break
+                self._text.append(item)
+                yield item
+        finally:
+            # Stopped early (or failed): nothing else should keep streaming
+            self._cancel([model for model in racers if model != self.model])
+
+        # No racer answered, or the winner's stream broke
+        yield from self._resilient(self.model or racers[0])
+
+    def _cancel(self, models):
+        closing = []
+        with self._lock:
+            for model in models:
+                if model in self.cancelled:
+                    continue
+                self.cancelled.append(model)
+                if model in self._trackers:
+                    self._trackers[model].finish(cancelled=True)
+                response = self._responses.pop(model, None)
+                if response is not None:
+                    closing.append(response)
+        for response in closing:
+            abort_response(response)
+
+
+def render_race_settings(model_options, key):
+    """Sidebar controls for "fastest wins" mode; returns the model ids to race, or []."""
+    race = st.toggle(
+        "⚡ Fastest wins",
+        key=f"{key}_race",
+        help="Send each prompt to several models at once, stream whichever answers first and cancel the rest"
+    )
+    if not race:
+        return []
+    names = st.multiselect(
+        "Race between",
+        options=list(model_options.keys()),
+        default=list(model_options.keys()),
+        key=f"{key}_race_models"
+    )
+    if len(names) < 2:
+        st.caption("Pick at least two models to race.")
+        return []
+    return [model_options[name] for name in names]
+
+
+def stream_caption(stream, model_options):
+    """One-line note on races, retries, fallbacks, resumes and cache hits; None if nothing happened."""
+    names = {model: name for name, model in model_options.items()}
+    name = names.get(stream.model, stream.model)
+    notes = []
+    if len(stream.models) > 1:
+        cancelled = len([model for model in stream.cancelled if model != stream.model])
+        notes.append(f"⚡ {name} answered first")
+        if cancelled:
+            notes[-1] += f" - cancelled {cancelled} other request{'s' if cancelled > 1 else ''}"
+    events = [event for event, _ in stream.events]
+    if "fallback" in events:
+        notes.append(f"↪️ Answered by {name} while the first choice was unavailable")
+    if "resume" in events:
+        notes.append("🔁 The stream dropped and was resumed where it stopped")
+    elif "retry" in events:
+        retries = events.count("retry")
+        notes.append(f"🔁 Succeeded after {retries} retr{'ies' if retries > 1 else 'y'}")
+    usage = usage_counts(stream.usage)
+    if usage.get("cached_tokens") and usage.get("prompt_tokens"):
+        notes.append(f"🗄️ {usage['cached_tokens']:,} of {usage['prompt_tokens']:,} prompt tokens read from the provider cache")
+    return " · ".join(notes) or None
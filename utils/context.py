@@ -0,0 +1,123 @@
+"""Token-budgeted context window with a rolling summary of older turns."""
+
+from utils.resilience import resilient_create
+
+# Input token budget per model. Kept well below the context limits so long
+# chats stay fast and cheap; older turns are folded into a summary instead.
+MODEL_CONTEXT_BUDGETS = {
+    "deepseek/deepseek-v3.2": 24000,
+    "google/gemini-2.5-flash": 32000,
+    "anthropic/claude-sonnet-4": 32000,
+}
+DEFAULT_CONTEXT_BUDGET = 16000
+
+# Tokens held back for the rolling summary and per-message formatting
+SUMMARY_TOKENS = 600
+MESSAGE_OVERHEAD = 4
+
+# Older turns are clipped to this many characters before being summarized
+SUMMARY_INPUT_CHARS = 2000
+
+SUMMARY_SYSTEM_PROMPT = """You maintain a running summary of a conversation between a user and an AI assistant.
+
+Merge the new turns into the existing summary. Keep facts, names, decisions, open questions and the user's preferences.
+Drop greetings and filler. Write in compact prose or bullet points, at most 250 words. Reply with the summary only."""
+
+
+def estimate_text_tokens(text):
+    """Rough token count for a piece of text."""
+    # ~4 ASCII characters per token; other scripts are closer to one each
+    ascii_chars = sum(1 for char in text if ord(char) < 128)
+    return ascii_chars // 4 + (len(text) - ascii_chars)
+
+
+def estimate_tokens(message):
+    """Estimate the tokens a message costs, caching the result on the message."""
+    tokens = message.get("tokens")
+    if tokens is None:
+        tokens = estimate_text_tokens(message.get("content") or "") + MESSAGE_OVERHEAD
+        message["tokens"] = tokens
+    return tokens
+
+
+def to_api_messages(messages):
+    """Strip bookkeeping keys so only role/content reach the API."""
+    return [{"role": message["role"], "content": message["content"]} for message in messages]
+
+
+class ContextWindow:
+    """Sends a sliding window of recent turns plus a summary of everything older.
+
+    `state` is a dict (kept in session state) holding the rolling summary and
+    how many messages it covers, so the summary is only extended when the
+    window moves forward.
+    """
+
+    def __init__(self, model, state, budget=None):
+        self.model = model
+        self.state = state
+        self.budget = budget or MODEL_CONTEXT_BUDGETS.get(model, DEFAULT_CONTEXT_BUDGET)
+        self.state.setdefault("summary", "")
+        self.state.setdefault("covered", 0)
+
+    def window_start(self, messages):
+        """Index of the oldest message that still fits in the budget."""
+        available = self.budget - SUMMARY_TOKENS
+        used = 0
+        start = len(messages)
+        while start > 0:
+            cost = estimate_tokens(messages[start - 1])
+            if used + cost > available and start < len(messages):
+                break
+            used += cost
+            start -= 1
+
+        # Begin the window on a user turn
+        while 0 < start < len(messages) - 1 and messages[start]["role"] != "user":
+            start += 1
+        return start
+
+    def build(self, messages, client, **request_kwargs):
+        """Return the messages to send, summarizing turns that fell out of the window."""
+        if self.state["covered"] > len(messages):
+            # The history was cleared or replaced
+            self.state["summary"], self.state["covered"] = "", 0
+
+        start = self.window_start(messages)
+        if start > self.state["covered"]:
+            self._fold(messages[self.state["covered"]:start], start, client, request_kwargs)
+        # The summary may already cover turns that would fit again (e.g. after a model switch)
+        start = max(start, self.state["covered"])
+
+        window = to_api_messages(messages[start:])
+        if not self.state["summary"]:
+            return window
+        summary = {
+            "role": "system",
+            "content": f"Summary of the earlier conversation:\n{self.state['summary']}",
+        }
+        return [summary] + window
+
+    def _fold(self, dropped, covered, client, request_kwargs):
+        transcript = "\n\n".join(
+            f"{message['role'].upper()}: {message['content'][:SUMMARY_INPUT_CHARS]}"
+            for message in dropped
+        )
+        try:
+            response, _ = resilient_create(
+                client,
+                self.model,
+                messages=[
+                    {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+                    {"role": "user", "content": f"Existing summary:\n{self.state['summary'] or '(none)'}\n\nNew turns:\n{transcript}"},
+                ],
+                max_tokens=SUMMARY_TOKENS,
+                **request_kwargs
+            )
+            summary = (response.choices[0].message.content or "").strip()
+        except Exception:
+            # Summaries are best effort; retry with a larger fold next turn
+            return
+        if summary:
+            self.state["summary"] = summary
+            self.state["covered"] = covered
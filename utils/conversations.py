@@ -0,0 +1,310 @@
+"""Persistent chat conversations, paged from SQLite with a bounded in-memory tail.
+
+Every message is appended to a log in the data directory, so conversations
+survive restarts and redeploys and can be resumed by id. A session keeps
+only the most recent messages (and the last page of older ones it looked at)
+in memory; everything else is read back on demand.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import streamlit as st
+
+from utils.memory import approx_size
+from utils.paths import data_path
+
+# Messages a session keeps in memory; older ones are paged from disk
+TAIL_MESSAGES = int(os.environ.get("CONVERSATION_TAIL", "40"))
+PAGE_MESSAGES = 50
+CACHED_PAGES = 2
+
+# Bookkeeping keys that are cheap to recompute and not worth storing
+_TRANSIENT_KEYS = ("tokens",)
+
+
+class ConversationStore:
+    """Append-only message log for every conversation, in one SQLite database."""
+
+    def __init__(self, db_path=None):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path or data_path("conversations", "conversations.sqlite3"), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS conversations ("
+            "id TEXT PRIMARY KEY, page TEXT NOT NULL, meta TEXT NOT NULL, summary TEXT NOT NULL, "
+            "message_count INTEGER NOT NULL, created REAL NOT NULL, updated REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            "conversation_id TEXT NOT NULL, seq INTEGER NOT NULL, role TEXT NOT NULL, "
+            "content TEXT NOT NULL, extra TEXT NOT NULL, PRIMARY KEY (conversation_id, seq))"
+        )
+        self._db.commit()
+
+    def new(self, page, meta=None):
+        """A new, empty conversation; it is only written once it has a message."""
+        return Conversation(self, uuid.uuid4().hex, page, meta or {})
+
+    def load(self, conversation_id, page=None):
+        """Resume a stored conversation, or None if there is no such conversation (for `page`)."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT page, meta, summary, message_count FROM conversations WHERE id = ?",
+                (conversation_id,),
+            ).fetchone()
+        if row is None or (page is not None and row[0] != page):
+            return None
+        return Conversation(self, conversation_id, row[0], json.loads(row[1]), json.loads(row[2]), row[3])
+
+    def append(self, conversation, message):
+        """Add a message after the last stored one; returns its position in the conversation.
+
+        The position is taken inside the same transaction, so two sessions
+        holding one conversation interleave their messages instead of clashing.
+        """
+        role = message["role"]
+        content = message["content"]
+        extra = {key: value for key, value in message.items()
+                 if key not in ("role", "content") and key not in _TRANSIENT_KEYS}
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR IGNORE INTO conversations (id, page, meta, summary, message_count, created, updated) "
+                "VALUES (?, ?, ?, ?, 0, ?, ?)",
+                (conversation.id, conversation.page, json.dumps(conversation.meta, ensure_ascii=False),
+                 json.dumps(conversation.summary, ensure_ascii=False), now, now),
+            )
+            seq = self._db.execute(
+                "SELECT COALESCE(MAX(seq) + 1, 0) FROM messages WHERE conversation_id = ?",
+                (conversation.id,),
+            ).fetchone()[0]
+            self._db.execute(
+                "INSERT INTO messages (conversation_id, seq, role, content, extra) VALUES (?, ?, ?, ?, ?)",
+                (conversation.id, seq, role, content, json.dumps(extra, ensure_ascii=False)),
+            )
+            self._db.execute(
+                "UPDATE conversations SET message_count = ?, updated = ? WHERE id = ?",
+                (seq + 1, now, conversation.id),
+            )
+            self._db.commit()
+        return seq
+
+    def save_summary(self, conversation):
+        with self._lock:
+            self._db.execute(
+                "UPDATE conversations SET summary = ? WHERE id = ?",
+                (json.dumps(conversation.summary, ensure_ascii=False), conversation.id),
+            )
+            self._db.commit()
+
+    def messages(self, conversation_id, start, stop):
+        """Messages start..stop-1 of a conversation, oldest first."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT role, content, extra FROM messages "
+                "WHERE conversation_id = ? AND seq >= ? AND seq < ? ORDER BY seq",
+                (conversation_id, start, stop),
+            ).fetchall()
+        return [{"role": role, "content": content, **json.loads(extra)} for role, content, extra in rows]
+
+    def stats(self):
+        with self._lock:
+            conversations, messages = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(message_count), 0) FROM conversations"
+            ).fetchone()
+        return {"conversations": conversations, "messages": messages}
+
+
+class Conversation:
+    """List-like view of a stored conversation that keeps only its recent tail in memory.
+
+    Supports len(), indexing, slicing, iteration and append(), so pages and
+    helpers written for a plain list of messages keep working. `summary` is
+    the rolling context summary (see utils.context.ContextWindow); call
+    save_summary() after it changes. spill() frees the tail under memory
+    pressure (see utils.memory); it is read back on the next access. spill()
+    may run on another session's thread, so the tail is only touched under
+    the lock.
+    """
+
+    def __init__(self, store, conversation_id, page, meta, summary=None, count=0, tail_size=TAIL_MESSAGES):
+        self.store = store
+        self.id = conversation_id
+        self.page = page
+        self.meta = meta
+        self.summary = summary or {}
+        self.tail_size = tail_size
+        self._count = count
+        self._tail = store.messages(conversation_id, max(count - tail_size, 0), count) if count else []
+        self._pages = OrderedDict()
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return self._count
+
+    def __bool__(self):
+        return self._count > 0
+
+    def __iter__(self):
+        for start in range(0, self._count, PAGE_MESSAGES):
+            yield from self[start:start + PAGE_MESSAGES]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._count)
+            if step != 1:
+                return list(self[start:stop])[::step]
+            return self._range(start, stop)
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("conversation index out of range")
+        return self._range(index, index + 1)[0]
+
+    def append(self, message):
+        with self._lock:
+            seq = self.store.append(self, message)
+            # Another session holding this conversation may have appended in between:
+            # then the tail is read back from disk, with both sessions' messages in order
+            stale = seq != self._count
+            self._count = seq + 1
+            if stale or self._tail is None:
+                self._tail = None
+                return
+            self._tail.append(message)
+            if len(self._tail) > self.tail_size:
+                del self._tail[:len(self._tail) - self.tail_size]
+
+    def save_summary(self):
+        if self._count:
+            self.store.save_summary(self)
+
+    @property
+    def spilled(self):
+        return self._tail is None
+
+    def memory_bytes(self):
+        """Approximate bytes held in memory (the tail and cached pages)."""
+        with self._lock:
+            messages = (self._tail or []) + [message for rows in self._pages.values() for message in rows]
+            return approx_size(messages) + approx_size(self.summary)
+
+    def spill(self):
+        """Drop everything that can be read back from disk; returns the bytes freed."""
+        with self._lock:
+            if self.spilled:
+                return 0
+            freed = self.memory_bytes() - approx_size(self.summary)
+            self._tail = None
+            self._pages.clear()
+            return freed
+
+    def _load_tail(self):
+        if self._tail is None:
+            self._tail = self.store.messages(self.id, max(self._count - self.tail_size, 0), self._count)
+
+    def _range(self, start, stop):
+        with self._lock:
+            if start >= stop:
+                return []
+            self._load_tail()
+            tail_start = self._count - len(self._tail)
+            if start >= tail_start:
+                return self._tail[start - tail_start:stop - tail_start]
+
+            messages = []
+            position = start
+            while position < min(stop, tail_start):
+                page = position // PAGE_MESSAGES
+                rows = self._page(page)
+                offset = position - page * PAGE_MESSAGES
+                end = min(stop, tail_start, (page + 1) * PAGE_MESSAGES)
+                messages.extend(rows[offset:end - page * PAGE_MESSAGES])
+                position = end
+            if stop > tail_start:
+                messages.extend(self._tail[:stop - tail_start])
+            return messages
+
+    def _page(self, page):
+        if page in self._pages:
+            self._pages.move_to_end(page)
+            return self._pages[page]
+        rows = self.store.messages(self.id, page * PAGE_MESSAGES, (page + 1) * PAGE_MESSAGES)
+        # A page that is still filling up would go stale, so only full ones are kept
+        if len(rows) == PAGE_MESSAGES:
+            self._pages[page] = rows
+            while len(self._pages) > CACHED_PAGES:
+                self._pages.popitem(last=False)
+        return rows
+
+
+@st.cache_resource
+def get_conversation_store():
+    """Process-wide conversation store shared by every session."""
+    return ConversationStore()
+
+
+def session_conversation(key, page):
+    """This session's conversation under `key`, resuming the one named in the URL if any."""
+    conversation = st.session_state.get(key)
+    requested = st.query_params.get("conversation")
+    if requested and (conversation is None or conversation.id != requested):
+        resumed = get_conversation_store().load(requested, page)
+        if resumed is not None:
+            conversation = resumed
+        else:
+            # Unknown id (or another page's): keep the current conversation and drop the link
+            del st.query_params["conversation"]
+    if conversation is None:
+        conversation = get_conversation_store().new(page)
+    st.session_state[key] = conversation
+    return conversation
+
+
+def new_conversation(key, page, **meta):
+    """Start a fresh conversation under `key`; the previous one stays resumable by id."""
+    st.session_state[key] = get_conversation_store().new(page, meta)
+    if "conversation" in st.query_params:
+        del st.query_params["conversation"]
+    return st.session_state[key]
+
+
+def link_conversation(conversation):
+    """Put the conversation's id in the URL so a reload or bookmark resumes it."""
+    if st.query_params.get("conversation") != conversation.id:
+        st.query_params["conversation"] = conversation.id
+
+
+def _resume_from_input(key, page):
+    # Runs as the input's on_change callback, so an ID is applied once and the box is cleared
+    resume_id = st.session_state[f"{key}_resume"].strip()
+    st.session_state[f"{key}_resume"] = ""
+    if not resume_id:
+        return
+    if get_conversation_store().load(resume_id, page) is None:
+        st.session_state[f"{key}_resume_missing"] = True
+    else:
+        st.query_params["conversation"] = resume_id
+
+
+def render_conversation_panel(key, page):
+    """Sidebar note with the conversation id, and a box to resume another one by id."""
+    conversation = st.session_state.get(key)
+    if conversation:
+        st.caption(f"💾 Saved as conversation `{conversation.id}`")
+    st.text_input(
+        "Resume a conversation",
+        key=f"{key}_resume",
+        placeholder="Paste a conversation ID",
+        help="Conversations are saved on the server; bookmark the page or keep the ID to come back to one",
+        on_change=_resume_from_input,
+        args=(key, page)
+    )
+    if st.session_state.pop(f"{key}_resume_missing", False):
+        st.caption("No saved conversation with that ID.")
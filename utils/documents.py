@@ -0,0 +1,117 @@
+"""Splits uploaded documents into segments and translates them concurrently."""
+
+import os
+import re
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from utils.context import estimate_text_tokens
+
+SUPPORTED_TYPES = ["txt", "md", "srt", "csv"]
+
+DEFAULT_SEGMENT_TOKENS = 1200
+DEFAULT_CONCURRENCY = 4
+
+_BLOCK_BREAK = re.compile(r"\n[ \t]*\n\s*")
+_LINE_BREAK = re.compile(r"\r?\n")
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?。！？])\s+")
+
+
+def decode_upload(data):
+    """Decode uploaded bytes, tolerating a BOM and non-UTF-8 files."""
+    try:
+        return data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        return data.decode("latin-1")
+
+
+def _split_units(text, separator):
+    """Split text into (body, trailing separator) pairs that rejoin losslessly."""
+    units = []
+    position = 0
+    for match in separator.finditer(text):
+        units.append((text[position:match.start()], match.group()))
+        position = match.end()
+    units.append((text[position:], ""))
+    return [unit for unit in units if unit[0] or unit[1]]
+
+
+def _pack(units, max_tokens):
+    """Greedily merge consecutive units into segments under the token budget."""
+    segments = []
+    current = None
+    for unit_body, unit_separator in units:
+        unit_tokens = estimate_text_tokens(unit_body)
+        if current and current[0].strip() and current[2] + unit_tokens > max_tokens:
+            segments.append((current[0], current[1]))
+            current = None
+        if current is None:
+            current = [unit_body, unit_separator, unit_tokens]
+        else:
+            current[0] += current[1] + unit_body
+            current[1] = unit_separator
+            current[2] += unit_tokens
+    if current:
+        segments.append((current[0], current[1]))
+    return segments
+
+
+def split_document(text, file_type, max_tokens=DEFAULT_SEGMENT_TOKENS):
+    """Split a document into (body, separator) segments under `max_tokens` each.
+
+    Text and markdown split on paragraphs, SRT on subtitle cues and CSV on
+    rows. Paragraphs that are too large on their own fall back to sentences.
+    Joining every body with its separator gives back the original text.
+    """
+    separator = _LINE_BREAK if file_type == "csv" else _BLOCK_BREAK
+    units = []
+    for body, trailing in _split_units(text, separator):
+        if estimate_text_tokens(body) > max_tokens and file_type != "csv":
+            sentences = _split_units(body, _SENTENCE_BREAK)
+            last_body, last_separator = sentences[-1]
+            sentences[-1] = (last_body, last_separator + trailing)
+            units.extend(_pack(sentences, max_tokens))
+        else:
+            units.append((body, trailing))
+    return _pack(units, max_tokens)
+
+
+def translate_segments(segments, translate, concurrency=DEFAULT_CONCURRENCY):
+    """Translate segment bodies in parallel, yielding (index, translation) as each finishes.
+
+    At most `concurrency` requests are in flight at once. Whitespace-only
+    segments are passed through without a request. If any segment fails,
+    the queued ones are dropped and the error is raised.
+    """
+    work = []
+    for index, (body, _) in enumerate(segments):
+        if body.strip():
+            work.append((index, body))
+        else:
+            yield index, body
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        pending = {}
+        position = 0
+        while position < len(work) or pending:
+            # Submit lazily so abandoning the generator leaves nothing queued
+            while position < len(work) and len(pending) < concurrency:
+                index, body = work[position]
+                pending[executor.submit(translate, body)] = index
+                position += 1
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = pending.pop(future)
+                try:
+                    translation = future.result()
+                except Exception:
+                    for other in pending:
+                        other.cancel()
+                    raise
+                yield index, translation
+
+
+def translated_filename(name, language_code):
+    """e.g. notes.srt -> notes.fr.srt"""
+    stem, extension = os.path.splitext(name)
+    return f"{stem}.{language_code}{extension}"
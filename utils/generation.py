@@ -0,0 +1,311 @@
+"""Background generation of streamed answers, decoupled from script runs.
+
+Answers are generated on a process-wide thread pool and written into a
+per-session ring buffer that the page follows. Any rerun - a sidebar change,
+another button, a websocket reconnect - only interrupts the following, so the
+next run re-attaches to the running answer instead of abandoning it or
+sending the request again.
+"""
+
+import collections
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+
+from utils.cancellation import current_session_id, get_stream_reaper
+from utils.completions import CompletionStream
+from utils.metrics import get_metrics
+from utils.resilience import get_circuit_breaker
+from utils.sanitize import StreamSanitizer
+from utils.streaming import FLUSH_INTERVAL
+
+# Answers generated at the same time across all sessions; more wait in line
+GENERATION_WORKERS = int(os.environ.get("GENERATION_WORKERS", "16"))
+
+# Chunks kept for followers; one that falls further behind catches up from the full text
+RING_CHUNKS = int(os.environ.get("GENERATION_RING_CHUNKS", "512"))
+
+# Finished answers nobody came back for are dropped after this many seconds
+FINISHED_TTL = float(os.environ.get("GENERATION_FINISHED_TTL", "600"))
+
+
+class RingBuffer:
+    """The most recent chunks of a text, addressed by character offset."""
+
+    def __init__(self, capacity=RING_CHUNKS):
+        self._chunks = collections.deque(maxlen=capacity)
+        self.size = 0
+
+    def append(self, chunk):
+        self._chunks.append((self.size, chunk))
+        self.size += len(chunk)
+
+    def read(self, offset):
+        """Text written since `offset`, or None if part of it was already overwritten."""
+        if offset >= self.size:
+            return ""
+        if not self._chunks or self._chunks[0][0] > offset:
+            return None
+        pieces = []
+        for start, chunk in reversed(self._chunks):
+            if start <= offset:
+                pieces.append(chunk[offset - start:])
+                break
+            pieces.append(chunk)
+        return "".join(reversed(pieces))
+
+
+class Generation:
+    """One answer being generated in the background; safe to use from any thread.
+
+    `meta` carries whatever the page needs to finish the answer on a later
+    run (cache key, source text, ...).
+    """
+
+    def __init__(self, page, meta=None):
+        self.page = page
+        self.meta = meta or {}
+        self.stream = None
+        self.error = None
+        self.stopped = False
+        self.started = time.perf_counter()
+        self.finished = None
+
+        self._buffer = RingBuffer()
+        self._text = []
+        self._condition = threading.Condition()
+        # Events set on every write, for followers of several generations at once
+        self._watchers = set()
+
+    @property
+    def running(self):
+        return self.finished is None
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def text(self):
+        with self._condition:
+            return "".join(self._text)
+
+    def write(self, chunk):
+        if not chunk:
+            return
+        with self._condition:
+            self._text.append(chunk)
+            self._buffer.append(chunk)
+            self._notify()
+
+    def finish(self, error=None):
+        with self._condition:
+            if error is not None and not self.stopped:
+                self.error = error
+            self.finished = time.perf_counter()
+            self._notify()
+
+    def stop(self):
+        """Stop generating now; the text so far is kept."""
+        if not self.running:
+            return
+        self.stopped = True
+        if self.stream is not None:
+            self.stream.abort()
+
+    # The reaper aborts generations of sessions that went away
+    abort = stop
+
+    def read(self, offset):
+        """(text written since `offset`, whether that is the end of the answer)."""
+        with self._condition:
+            return self._read(offset)
+
+    def watch(self, event):
+        """Set `event` on every write and on finish, until unwatch()."""
+        with self._condition:
+            self._watchers.add(event)
+        event.set()
+
+    def unwatch(self, event):
+        with self._condition:
+            self._watchers.discard(event)
+
+    def follow(self, poll_interval=FLUSH_INTERVAL):
+        """Yield the text so far, then each new chunk as it arrives, until the answer is finished."""
+        offset = 0
+        while True:
+            with self._condition:
+                if offset == self._buffer.size and self.running:
+                    self._condition.wait(poll_interval)
+                chunk, done = self._read(offset)
+            if chunk:
+                offset += len(chunk)
+                yield chunk
+            if done:
+                return
+
+    def _read(self, offset):
+        chunk = self._buffer.read(offset)
+        if chunk is None:
+            # Fell behind the ring: catch up from the full text
+            chunk = "".join(self._text)[offset:]
+        return chunk, not self.running and offset + len(chunk) >= self._buffer.size
+
+    def _notify(self):
+        self._condition.notify_all()
+        for event in self._watchers:
+            event.set()
+
+
+def follow_all(generations, poll_interval=FLUSH_INTERVAL):
+    """Yield (index, chunk) from several generations as chunks arrive, until all are finished.
+
+    One loop drives every answer: it sleeps until any of them writes, then
+    drains whatever each has produced, so the page renders N streams without
+    a thread (or a blocking follow()) per answer. Each generation's last
+    item is (index, ""), so callers can finish that answer right away.
+    """
+    event = threading.Event()
+    offsets = [0] * len(generations)
+    pending = set(range(len(generations)))
+    for generation in generations:
+        generation.watch(event)
+    try:
+        while pending:
+            event.wait(poll_interval)
+            event.clear()
+            for index in sorted(pending):
+                chunk, done = generations[index].read(offsets[index])
+                if chunk:
+                    offsets[index] += len(chunk)
+                    yield index, chunk
+                if done:
+                    pending.discard(index)
+                    yield index, ""
+    finally:
+        for generation in generations:
+            generation.unwatch(event)
+
+
+class GenerationWorker:
+    """Process-wide thread pool holding each session's generations by page key."""
+
+    def __init__(self, max_workers=GENERATION_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="generation")
+        self._generations = {}
+        self._lock = threading.Lock()
+        # Handed to the worker threads, which cannot use st.cache_resource themselves
+        self._breaker = get_circuit_breaker()
+        self._metrics = get_metrics()
+        self._reaper = get_stream_reaper()
+
+    def submit(self, session_id, key, client, models, messages, page, fallbacks=(), meta=None, **request_options):
+        """Start generating; replaces (and stops) the session's previous generation for `key`."""
+        generation = Generation(page, meta)
+        with self._lock:
+            self._prune()
+            previous = self._generations.get((session_id, key))
+            self._generations[(session_id, key)] = generation
+        if previous is not None:
+            previous.stop()
+        if session_id:
+            self._reaper.register(session_id, generation)
+        self._executor.submit(
+            self._generate, session_id, generation, client, models, messages, fallbacks, request_options
+        )
+        return generation
+
+    def get(self, session_id, key):
+        with self._lock:
+            return self._generations.get((session_id, key))
+
+    def pop(self, session_id, key):
+        with self._lock:
+            return self._generations.pop((session_id, key), None)
+
+    def running(self):
+        """How many answers are being generated right now."""
+        with self._lock:
+            return sum(1 for generation in self._generations.values() if generation.running)
+
+    def _prune(self):
+        now = time.perf_counter()
+        for generation_key, generation in list(self._generations.items()):
+            if not generation.running and now - generation.finished > FINISHED_TTL:
+                del self._generations[generation_key]
+
+    def _generate(self, session_id, generation, client, models, messages, fallbacks, request_options):
+        # Runs in a worker thread - no Streamlit calls here
+        stream = None
+        try:
+            if generation.stopped:
+                return
+            stream = CompletionStream(
+                client,
+                models,
+                messages,
+                generation.page,
+                fallbacks=fallbacks,
+                start=False,
+                breaker=self._breaker,
+                metrics=self._metrics,
+                **request_options
+            )
+            generation.stream = stream
+            if generation.stopped:
+                return
+            # Blocks until the first token, so the sanitizer knows which model answered
+            stream.start()
+            sanitizer = StreamSanitizer.for_model(stream.model)
+            for content in stream:
+                # Drop special tokens, even when split across chunks
+                generation.write(sanitizer.feed(content))
+            generation.write(sanitizer.flush())
+            generation.finish()
+        except Exception as e:
+            generation.finish(error=e)
+        finally:
+            if stream is not None:
+                stream.close()
+            if generation.running:
+                generation.finish()
+            if session_id:
+                self._reaper.unregister(session_id, generation)
+
+
+@st.cache_resource
+def get_generation_worker():
+    """Process-wide generation worker, created once per server."""
+    return GenerationWorker()
+
+
+def start_generation(key, client, models, messages, page, fallbacks=(), meta=None, **request_options):
+    """Start this session's answer for `key` in the background and return it."""
+    return get_generation_worker().submit(
+        current_session_id(), key, client, models, messages, page,
+        fallbacks=fallbacks, meta=meta, **request_options
+    )
+
+
+def current_generation(key):
+    """This session's generation for `key`, if any; stops it if its Stop button was clicked."""
+    generation = get_generation_worker().get(current_session_id(), key)
+    if generation is not None and st.session_state.get(f"{key}_stop"):
+        generation.stop()
+    return generation
+
+
+def finish_generation(key):
+    """Forget this session's generation for `key` once its answer has been used."""
+    get_generation_worker().pop(current_session_id(), key)
+
+
+def discard_generation(key):
+    """Stop and forget this session's generation for `key` (e.g. when the chat is cleared)."""
+    generation = get_generation_worker().pop(current_session_id(), key)
+    if generation is not None:
+        generation.stop()
@@ -0,0 +1,153 @@
+"""Incremental parser for a JSON object that arrives in streamed chunks."""
+
+import json
+import re
+
+_STRING_RUN = re.compile(r'[^"\\]+')
+_WHITESPACE = " \t\r\n"
+
+# Models sometimes emit raw newlines inside strings; accept them
+_decode = json.JSONDecoder(strict=False).decode
+
+# Parser states
+_SEEK_OBJECT, _SEEK_KEY, _KEY, _SEEK_COLON, _SEEK_VALUE, _STRING, _RAW, _DONE = range(8)
+
+
+class IncrementalJSONParser:
+    """Parses a flat JSON object field by field as text streams in.
+
+    Anything before the first "{" (such as a partial ```json fence) and
+    anything after the closing "}" is ignored. String values are exposed
+    while they are still arriving; other values (lists, booleans, numbers)
+    appear once they are complete.
+
+        parser.feed(chunk)
+        parser.fields     # every key seen so far, strings possibly partial
+        parser.complete   # keys whose value has fully arrived
+        parser.done       # the closing brace has been seen
+    """
+
+    def __init__(self):
+        self.fields = {}
+        self.complete = set()
+        self.done = False
+
+        self._state = _SEEK_OBJECT
+        self._key = None
+        self._raw = ""          # undecoded key/string text, or raw non-string value
+        self._decoded = ""      # already decoded prefix of the current string
+        self._escape = False
+        self._depth = 0
+        self._in_string = False
+
+    def feed(self, chunk):
+        """Consume the next chunk of text."""
+        position = 0
+        length = len(chunk)
+        while position < length and self._state != _DONE:
+            state = self._state
+            char = chunk[position]
+
+            if state == _SEEK_OBJECT:
+                if char == "{":
+                    self._state = _SEEK_KEY
+            elif state == _SEEK_KEY:
+                if char == '"':
+                    self._state = _KEY
+                    self._raw = self._decoded = ""
+                elif char == "}":
+                    self._state = _DONE
+                    self.done = True
+            elif state in (_KEY, _STRING):
+                # Copy plain runs in one step; stop at quotes and backslashes
+                if not self._escape:
+                    run = _STRING_RUN.match(chunk, position)
+                    if run:
+                        self._raw += run.group()
+                        position = run.end()
+                        continue
+                if self._escape:
+                    self._raw += char
+                    self._escape = False
+                elif char == "\\":
+                    self._raw += char
+                    self._escape = True
+                else:
+                    self._end_string(state)
+            elif state == _SEEK_COLON:
+                if char == ":":
+                    self._state = _SEEK_VALUE
+            elif state == _SEEK_VALUE:
+                if char == '"':
+                    self._state = _STRING
+                    self._raw = self._decoded = ""
+                    self.fields[self._key] = ""
+                elif char not in _WHITESPACE:
+                    self._state = _RAW
+                    self._raw = ""
+                    self._depth = 0
+                    self._in_string = False
+                    continue
+            elif state == _RAW:
+                if self._consume_raw(char):
+                    continue
+            position += 1
+        if self._state == _STRING:
+            self._decode_partial()
+        return self
+
+    def _end_string(self, state):
+        text = self._decoded + _decode(f'"{self._raw}"')
+        self._raw = self._decoded = ""
+        if state == _KEY:
+            self._key = text
+            self._state = _SEEK_COLON
+        else:
+            self.fields[self._key] = text
+            self.complete.add(self._key)
+            self._state = _SEEK_KEY
+
+    def _decode_partial(self):
+        # Decode what has arrived, holding back a trailing escape that may be
+        # incomplete (at most "\\uXXXX") or a high surrogate awaiting its pair
+        raw = self._raw
+        for cut in range(len(raw), max(len(raw) - 6, 0) - 1, -1):
+            try:
+                text = _decode(f'"{raw[:cut]}"')
+            except json.JSONDecodeError:
+                continue
+            if text and "\ud800" <= text[-1] <= "\udbff":
+                text = text[:-1]
+                cut -= 6
+            self._decoded += text
+            self._raw = raw[cut:]
+            break
+        self.fields[self._key] = self._decoded
+
+    def _consume_raw(self, char):
+        """Feed one character of a non-string value; True if it must be re-read."""
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+            elif char == "\\":
+                self._escape = True
+            elif char == '"':
+                self._in_string = False
+        elif char == '"':
+            self._in_string = True
+        elif char in "[{":
+            self._depth += 1
+        elif char in "]}" and self._depth > 0:
+            self._depth -= 1
+        elif self._depth == 0 and (char in ",}" or char in _WHITESPACE):
+            try:
+                self.fields[self._key] = _decode(self._raw)
+                self.complete.add(self._key)
+            except json.JSONDecodeError:
+                pass
+            self._raw = ""
+            self._state = _SEEK_KEY
+            # Let the key scanner see the "," or "}"
+            return True
+        self._raw += char
+        return False
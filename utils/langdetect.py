@@ -0,0 +1,268 @@
+"""Fast local language detection for the Translator's languages.
+
+Scripts with a language of their own (Japanese kana, Hangul, Thai, Greek)
+are decided from Unicode ranges alone. Scripts several languages share
+(Cyrillic, Arabic, Devanagari, Han) only ever give a "Medium" guess, so the
+model still confirms them. Latin-script text is scored against character
+1-3 gram profiles built from the sample text below; the profiles are built
+once into a numpy matrix, so detection is a lookup and one dot product.
+Languages with a close relative (Swedish and Norwegian, Indonesian and
+Malay, ...) are only "High" when a letter rules the relative out.
+Short or ambiguous text returns None and the model detects it instead.
+"""
+
+import functools
+import math
+import operator
+import re
+import unicodedata
+from collections import Counter
+
+import numpy as np
+
+# Letters needed before a detection is trusted enough to skip the model
+MIN_LETTERS = 20
+
+# Average log-likelihood lead per n-gram the winner needs over the runner-up
+MIN_MARGIN = 0.15
+
+NGRAM_SIZES = (1, 2, 3)
+
+# Unicode ranges of the scripts of the Translator's non-Latin languages, checked in order
+SCRIPT_RANGES = (
+    ("Japanese", ((0x3040, 0x30FF), (0x31F0, 0x31FF))),
+    ("Korean", ((0xAC00, 0xD7AF), (0x1100, 0x11FF), (0x3130, 0x318F))),
+    ("Thai", ((0x0E00, 0x0E7F),)),
+    ("Greek", ((0x0370, 0x03FF), (0x1F00, 0x1FFF))),
+    ("Arabic", ((0x0600, 0x06FF), (0x0750, 0x077F), (0xFB50, 0xFDFF), (0xFE70, 0xFEFF))),
+    ("Hindi", ((0x0900, 0x097F),)),
+    ("Russian", ((0x0400, 0x04FF),)),
+    ("Chinese (Simplified)", ((0x4E00, 0x9FFF), (0x3400, 0x4DBF))),
+)
+
+# Scripts other languages write too; letters the named language never uses rule it out
+SHARED_SCRIPTS = {
+    "Russian": "іїєґўјљњђћџѕ",
+    "Arabic": "پچژگکی",
+    "Hindi": "ळ",
+    "Chinese (Simplified)": "",
+}
+
+# Letters only one of the Latin-script languages uses. Names and loanwords carry them
+# into other languages' text, so each occurrence only adds to that language's score
+DISTINCT_LETTERS = {
+    "Turkish": "ığş",
+    "Polish": "łąęśźżćń",
+    "Vietnamese": "ơưđạảấầẩẫậắằẳẵặẹẻẽếềểễệỉịọỏốồổỗộớờởỡợụủứừửữựỳỵỷỹ",
+    "German": "ß",
+    "Swedish": "å",
+    "Spanish": "ñ¿¡",
+    "Portuguese": "ãõ",
+}
+
+# Languages the n-gram profiles cannot reliably tell from a close relative (listed or
+# not). They are only trusted as "High" with a letter none of the relatives write
+CLOSE_RELATIVES = {
+    "Swedish": "äö",          # Norwegian and Danish write æ and ø instead
+    "Indonesian": "",         # Malay is spelled almost the same
+    "Spanish": "ñ¿¡",         # Portuguese
+    "Portuguese": "ãõç",      # Spanish
+    "Polish": "łąęśźżćń",     # Czech and Slovak
+}
+
+# Representative text for each Latin-script language
+LATIN_SAMPLES = {
+    "English": (
+        "All human beings are born free and equal in dignity and rights. They are endowed with reason and "
+        "conscience and should act towards one another in a spirit of brotherhood. I would like to know what "
+        "you think about the weather today, because it has been raining all morning and the children want to "
+        "play outside. Thank you very much for your help with the project; we could not have finished it without "
+        "you. Where is the nearest train station, and how long does it take to get there from here? The meeting "
+        "was moved to next week, so please check your calendar and let me know which day works best for you."
+    ),
+    "Spanish": (
+        "Todos los seres humanos nacen libres e iguales en dignidad y derechos y, dotados como están de razón y "
+        "conciencia, deben comportarse fraternalmente los unos con los otros. Me gustaría saber qué piensas del "
+        "tiempo de hoy, porque ha llovido toda la mañana y los niños quieren jugar fuera. Muchas gracias por tu "
+        "ayuda con el proyecto; no lo habríamos terminado sin ti. ¿Dónde está la estación de tren más cercana y "
+        "cuánto se tarda en llegar desde aquí? La reunión se cambió a la próxima semana, así que revisa tu "
+        "calendario y dime qué día te viene mejor."
+    ),
+    "French": (
+        "Tous les êtres humains naissent libres et égaux en dignité et en droits. Ils sont doués de raison et de "
+        "conscience et doivent agir les uns envers les autres dans un esprit de fraternité. J'aimerais savoir ce "
+        "que tu penses du temps aujourd'hui, parce qu'il a plu toute la matinée et les enfants veulent jouer "
+        "dehors. Merci beaucoup pour ton aide avec le projet ; nous n'aurions pas pu le finir sans toi. Où se "
+        "trouve la gare la plus proche, et combien de temps faut-il pour y aller d'ici ? La réunion a été "
+        "déplacée à la semaine prochaine, alors vérifie ton agenda et dis-moi quel jour te convient le mieux."
+    ),
+    "German": (
+        "Alle Menschen sind frei und gleich an Würde und Rechten geboren. Sie sind mit Vernunft und Gewissen "
+        "begabt und sollen einander im Geist der Brüderlichkeit begegnen. Ich würde gern wissen, was du über das "
+        "Wetter heute denkst, weil es den ganzen Morgen geregnet hat und die Kinder draußen spielen wollen. Vielen "
+        "Dank für deine Hilfe bei dem Projekt; ohne dich hätten wir es nicht geschafft. Wo ist der nächste "
+        "Bahnhof, und wie lange braucht man von hier aus dorthin? Die Besprechung wurde auf nächste Woche "
+        "verschoben, also schau bitte in deinen Kalender und sag mir, welcher Tag dir am besten passt."
+    ),
+    "Italian": (
+        "Tutti gli esseri umani nascono liberi ed eguali in dignità e diritti. Essi sono dotati di ragione e di "
+        "coscienza e devono agire gli uni verso gli altri in spirito di fratellanza. Vorrei sapere cosa pensi del "
+        "tempo di oggi, perché ha piovuto tutta la mattina e i bambini vogliono giocare fuori. Grazie mille per il "
+        "tuo aiuto con il progetto; non avremmo potuto finirlo senza di te. Dov'è la stazione dei treni più "
+        "vicina e quanto ci vuole per arrivarci da qui? La riunione è stata spostata alla settimana prossima, "
+        "quindi controlla il tuo calendario e dimmi quale giorno ti va meglio."
+    ),
+    "Portuguese": (
+        "Todos os seres humanos nascem livres e iguais em dignidade e em direitos. Dotados de razão e de "
+        "consciência, devem agir uns para com os outros em espírito de fraternidade. Eu gostaria de saber o que "
+        "você acha do tempo hoje, porque choveu a manhã toda e as crianças querem brincar lá fora. Muito obrigado "
+        "pela sua ajuda com o projeto; não teríamos conseguido terminá-lo sem você. Onde fica a estação de trem "
+        "mais próxima e quanto tempo leva para chegar lá daqui? A reunião foi transferida para a próxima semana, "
+        "então verifique a sua agenda e me diga qual dia é melhor para você."
+    ),
+    "Dutch": (
+        "Alle mensen worden vrij en gelijk in waardigheid en rechten geboren. Zij zijn begiftigd met verstand en "
+        "geweten, en behoren zich jegens elkaar in een geest van broederschap te gedragen. Ik wil graag weten wat "
+        "je van het weer vandaag vindt, want het heeft de hele ochtend geregend en de kinderen willen buiten "
+        "spelen. Heel erg bedankt voor je hulp met het project; zonder jou hadden we het niet afgekregen. Waar is "
+        "het dichtstbijzijnde treinstation en hoe lang duurt het om daar vanaf hier te komen? De vergadering is "
+        "naar volgende week verplaatst, dus kijk even in je agenda en laat me weten welke dag je het beste uitkomt."
+    ),
+    "Turkish": (
+        "Bütün insanlar hür, haysiyet ve haklar bakımından eşit doğarlar. Akıl ve vicdana sahiptirler ve "
+        "birbirlerine karşı kardeşlik zihniyeti ile hareket etmelidirler. Bugünkü hava hakkında ne düşündüğünü "
+        "bilmek isterim, çünkü bütün sabah yağmur yağdı ve çocuklar dışarıda oynamak istiyor. Proje konusundaki "
+        "yardımın için çok teşekkür ederim; sen olmadan bitiremezdik. En yakın tren istasyonu nerede ve buradan "
+        "oraya gitmek ne kadar sürer? Toplantı gelecek haftaya ertelendi, bu yüzden lütfen takvimine bak ve hangi "
+        "günün sana en uygun olduğunu bana söyle."
+    ),
+    "Polish": (
+        "Wszyscy ludzie rodzą się wolni i równi pod względem swej godności i swych praw. Są oni obdarzeni rozumem "
+        "i sumieniem i powinni postępować wobec innych w duchu braterstwa. Chciałbym wiedzieć, co myślisz o "
+        "dzisiejszej pogodzie, ponieważ padało przez całe rano, a dzieci chcą bawić się na dworze. Bardzo "
+        "dziękuję za pomoc przy projekcie; bez ciebie nie udałoby się nam go skończyć. Gdzie jest najbliższa "
+        "stacja kolejowa i ile czasu zajmuje dojazd stąd? Spotkanie zostało przeniesione na przyszły tydzień, "
+        "więc sprawdź proszę swój kalendarz i daj mi znać, który dzień najbardziej ci odpowiada."
+    ),
+    "Vietnamese": (
+        "Tất cả mọi người sinh ra đều được tự do và bình đẳng về nhân phẩm và quyền lợi. Mọi con người đều được "
+        "tạo hóa ban cho lý trí và lương tâm và cần phải đối xử với nhau trong tình anh em. Tôi muốn biết bạn "
+        "nghĩ gì về thời tiết hôm nay, vì trời đã mưa cả buổi sáng và bọn trẻ muốn chơi ở bên ngoài. Cảm ơn bạn "
+        "rất nhiều vì đã giúp đỡ dự án; chúng tôi không thể hoàn thành nó nếu không có bạn. Ga tàu gần nhất ở "
+        "đâu và đi từ đây đến đó mất bao lâu? Cuộc họp đã được dời sang tuần sau, vì vậy hãy xem lịch của bạn và "
+        "cho tôi biết ngày nào phù hợp nhất với bạn."
+    ),
+    "Indonesian": (
+        "Semua orang dilahirkan merdeka dan mempunyai martabat dan hak-hak yang sama. Mereka dikaruniai akal dan "
+        "hati nurani dan hendaknya bergaul satu sama lain dalam semangat persaudaraan. Saya ingin tahu apa "
+        "pendapatmu tentang cuaca hari ini, karena hujan turun sepanjang pagi dan anak-anak ingin bermain di "
+        "luar. Terima kasih banyak atas bantuanmu dengan proyek ini; kami tidak akan bisa menyelesaikannya tanpa "
+        "kamu. Di mana stasiun kereta terdekat dan berapa lama waktu yang dibutuhkan untuk sampai ke sana dari "
+        "sini? Rapatnya dipindahkan ke minggu depan, jadi tolong periksa kalendermu dan beri tahu saya hari apa "
+        "yang paling cocok untukmu."
+    ),
+    "Swedish": (
+        "Alla människor är födda fria och lika i värde och rättigheter. De har utrustats med förnuft och samvete "
+        "och bör handla gentemot varandra i en anda av broderskap. Jag skulle vilja veta vad du tycker om vädret "
+        "i dag, eftersom det har regnat hela förmiddagen och barnen vill leka ute. Tack så mycket för din hjälp "
+        "med projektet; vi hade inte kunnat avsluta det utan dig. Var ligger närmaste tågstation och hur lång tid "
+        "tar det att komma dit härifrån? Mötet har flyttats till nästa vecka, så titta gärna i din kalender och "
+        "säg vilken dag som passar dig bäst."
+    ),
+}
+
+_NON_LETTERS = re.compile(r"[^\w]+|[\d_]+")
+_LETTERS = re.compile(r"[^\W\d_]")
+_SCRIPTS = [
+    (language, re.compile("[" + "".join(f"\\U{start:08x}-\\U{end:08x}" for start, end in ranges) + "]"))
+    for language, ranges in SCRIPT_RANGES
+]
+_FOREIGN = {language: re.compile(f"[{letters}]") for language, letters in SHARED_SCRIPTS.items() if letters}
+
+# Log-likelihood added to a language's score per distinct letter of it in the text: enough to
+# settle a short sentence, while a name in an otherwise English sentence still loses on n-grams
+DISTINCT_WEIGHT = 16.0
+
+
+def _normalize(text):
+    return " " + _NON_LETTERS.sub(" ", unicodedata.normalize("NFC", text).casefold()).strip() + " "
+
+
+def _ngrams(text):
+    # Counted with map/zip so the loops run in C
+    grams = Counter(text)
+    grams.update(map(operator.add, text, text[1:]))
+    grams.update(map("".join, zip(text, text[1:], text[2:])))
+    del grams[" "]
+    return grams
+
+
+@functools.lru_cache(maxsize=1)
+def _profiles():
+    """(languages, n-gram -> column, log-probability matrix), built once per process."""
+    languages = list(LATIN_SAMPLES)
+    counts = [_ngrams(_normalize(sample)) for sample in LATIN_SAMPLES.values()]
+    vocabulary = {gram: index for index, gram in enumerate(sorted(set().union(*counts)))}
+    matrix = np.empty((len(languages), len(vocabulary)), dtype=np.float32)
+    for row, grams in enumerate(counts):
+        # Add-one smoothing, so an n-gram a language never showed costs but does not veto it
+        total = sum(grams.values()) + len(vocabulary)
+        matrix[row] = math.log(1 / total)
+        for gram, count in grams.items():
+            matrix[row, vocabulary[gram]] = math.log((count + 1) / total)
+    return languages, vocabulary, matrix
+
+
+def _script_language(text):
+    letters = len(_LETTERS.findall(text))
+    counts = Counter({language: len(pattern.findall(text)) for language, pattern in _SCRIPTS})
+    if not letters or not +counts:
+        return None, letters
+    # Kana anywhere means Japanese, even though most of its characters may be Han
+    if counts["Japanese"]:
+        return "Japanese", letters
+    language, count = counts.most_common(1)[0]
+    return (language if count * 2 >= letters else None), letters
+
+
+def _distinct_weights(text, languages):
+    # Lowercased rather than casefolded, which would turn "ß" into "ss"
+    lowered = text.lower()
+    return np.array(
+        [sum(lowered.count(letter) for letter in DISTINCT_LETTERS.get(language, "")) for language in languages],
+        dtype=np.float32,
+    ) * DISTINCT_WEIGHT
+
+
+def detect_language(text):
+    """(language name from the Translator's list, "High" or "Medium"), or (None, None) if unsure."""
+    language, letters = _script_language(text)
+    if language is not None:
+        if language not in SHARED_SCRIPTS:
+            return language, "High" if letters >= 2 else "Medium"
+        foreign = _FOREIGN.get(language)
+        if foreign is not None and foreign.search(text.lower()):
+            return None, None
+        return language, "Medium"
+
+    languages, vocabulary, matrix = _profiles()
+    columns = []
+    weights = []
+    for gram, count in _ngrams(_normalize(text[:2000])).items():
+        column = vocabulary.get(gram)
+        if column is not None:
+            columns.append(column)
+            weights.append(count)
+    if not columns:
+        return None, None
+    scores = matrix[:, columns] @ np.asarray(weights, dtype=np.float32) + _distinct_weights(text[:2000], languages)
+    order = np.argsort(scores)[::-1]
+    margin = (scores[order[0]] - scores[order[1]]) / sum(weights)
+    if letters < MIN_LETTERS // 2 or margin < MIN_MARGIN / 2:
+        return None, None
+    language = languages[order[0]]
+    confident = letters >= MIN_LETTERS and margin >= MIN_MARGIN
+    if confident and language in CLOSE_RELATIVES:
+        lowered = text[:2000].lower()
+        confident = any(letter in lowered for letter in CLOSE_RELATIVES[language])
+    return language, "High" if confident else "Medium"
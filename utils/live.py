@@ -0,0 +1,37 @@
+"""Sentence splitting and reuse for live (translate-as-you-type) translation."""
+
+import os
+import re
+
+# Quiet period after an edit before it is sent; newer input arriving meanwhile supersedes it
+LIVE_DEBOUNCE = float(os.environ.get("LIVE_TRANSLATE_DEBOUNCE", "0.35"))
+
+# A sentence runs to terminal punctuation followed by whitespace, a CJK full stop, or the end of the line
+_SENTENCE = re.compile(r"\S.*?(?:[.!?…]+[\"'”’)\]]*(?=\s|$)|[。！？]+|(?=\n)|$)")
+
+
+def split_sentences(text):
+    """Split text into (sentence, separator) pairs; joining them gives back the text, minus leading space."""
+    sentences = []
+    for match in _SENTENCE.finditer(text):
+        end = separator_end = match.end()
+        while separator_end < len(text) and text[separator_end].isspace():
+            separator_end += 1
+        sentences.append((match.group(), text[end:separator_end]))
+    return sentences
+
+
+def join_sentences(translations, sentences):
+    """Join sentence translations with the separators of the source sentences they replace."""
+    return "".join(translation + separator for translation, (_, separator) in zip(translations, sentences))
+
+
+def reused_prefix(sentences, lookup):
+    """Translations of the leading sentences that `lookup` already knows, up to the first unknown one."""
+    translations = []
+    for sentence, _ in sentences:
+        translation = lookup(sentence)
+        if translation is None:
+            break
+        translations.append(translation)
+    return translations
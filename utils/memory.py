@@ -0,0 +1,246 @@
+"""Approximate memory accounting for session state, with LRU spill-over to disk.
+
+Each session registers the objects holding its large values: its chat
+conversations and one SpillableState per app. When their total across all
+sessions passes SESSION_MEMORY_BUDGET, the least recently active sessions
+are spilled to disk; their values reload transparently the next time they
+are used.
+"""
+
+import glob
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+import weakref
+from collections.abc import MutableMapping
+
+import streamlit as st
+
+from utils.cancellation import current_session_id
+from utils.paths import data_path
+
+SESSION_MEMORY_BUDGET = int(float(os.environ.get("SESSION_MEMORY_BUDGET_MB", "256")) * 1024 * 1024)
+
+# Spill down to this share of the budget, so it does not happen on every run
+SPILL_TARGET = 0.8
+
+# Sessions active more recently than this are never spilled, nor are sessions whose script is running
+SPILL_MIN_IDLE = 10
+
+
+def approx_size(value):
+    """Rough bytes held by a JSON-like value (strings, numbers, lists, dicts)."""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(approx_size(key) + approx_size(item) for key, item in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(approx_size(item) for item in value)
+    return size
+
+
+def format_bytes(size):
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class SpillableState(MutableMapping):
+    """A dict of one app's large session values that can be moved to disk and back.
+
+    Values must be JSON-serializable. After spill() the values live in a
+    file; the next read or write loads them back.
+    """
+
+    def __init__(self):
+        self.path = data_path("sessions", f"{uuid.uuid4().hex}.json")
+        self.spilled = False
+        self._values = {}
+        self._lock = threading.RLock()
+        # Spill files of sessions that ended are removed with the session
+        weakref.finalize(self, _remove, self.path)
+
+    def __getitem__(self, key):
+        with self._lock:
+            self._load()
+            return self._values[key]
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._load()
+            self._values[key] = value
+
+    def __delitem__(self, key):
+        with self._lock:
+            self._load()
+            del self._values[key]
+
+    def __iter__(self):
+        with self._lock:
+            self._load()
+            return iter(list(self._values))
+
+    def __len__(self):
+        with self._lock:
+            self._load()
+            return len(self._values)
+
+    def memory_bytes(self):
+        with self._lock:
+            return 0 if self.spilled else approx_size(self._values)
+
+    def spill(self):
+        """Write the values to disk and free them; returns the bytes freed."""
+        with self._lock:
+            if self.spilled or not self._values:
+                return 0
+            freed = approx_size(self._values)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._values, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+            self._values = {}
+            self.spilled = True
+            return freed
+
+    def _load(self):
+        if self.spilled:
+            with open(self.path, encoding="utf-8") as f:
+                self._values = json.load(f)
+            _remove(self.path)
+            self.spilled = False
+
+
+class SessionMemory:
+    """Tracks approximate bytes per session and app, spilling idle sessions over budget.
+
+    Holders are anything with memory_bytes() and spill(). They are held
+    weakly, so a session that ends drops out on its own. A holder is
+    measured when its own session runs, so one run never walks every other
+    session's data. Streamlit runs each script run on its own thread, so a
+    session whose last touching thread is still alive is mid-run (perhaps
+    streaming a long answer) and is left alone however long ago it started.
+    """
+
+    def __init__(self, budget=SESSION_MEMORY_BUDGET):
+        self.budget = budget
+        self.spills = 0
+        self.spilled_bytes = 0
+        self._sessions = {}
+        self._lock = threading.Lock()
+        # Spill files from before a restart belong to sessions that are gone
+        for path in glob.glob(data_path("sessions", "*.json")):
+            _remove(path)
+
+    def touch(self, session_id, app, holder):
+        """Record a session's activity and the current size of one of its holders."""
+        size = holder.memory_bytes()
+        now = time.monotonic()
+        with self._lock:
+            session = self._sessions.setdefault(session_id, {"holders": {}, "bytes": {}})
+            session["last_active"] = now
+            session["thread"] = threading.current_thread()
+            session["holders"][app] = weakref.ref(holder)
+            session["bytes"][app] = size
+            self._prune()
+            total = self._total()
+            if total <= self.budget:
+                return
+            idle = sorted(
+                (other for other_id, other in self._sessions.items()
+                 if other_id != session_id and now - other["last_active"] >= SPILL_MIN_IDLE
+                 and not other["thread"].is_alive()),
+                key=lambda other: other["last_active"]
+            )
+
+        target = self.budget * SPILL_TARGET
+        for other in idle:
+            for other_app, ref in list(other["holders"].items()):
+                holder = ref()
+                if holder is None:
+                    continue
+                freed = holder.spill()
+                if freed:
+                    total -= other["bytes"].get(other_app, freed)
+                    with self._lock:
+                        other["bytes"][other_app] = 0
+                        self.spills += 1
+                        self.spilled_bytes += freed
+            if total <= target:
+                break
+
+    def summary(self):
+        """Totals per app and per session (largest first), for the admin view."""
+        now = time.monotonic()
+        with self._lock:
+            self._prune()
+            apps = {}
+            sessions = []
+            for session_id, session in self._sessions.items():
+                spilled = []
+                for app, ref in session["holders"].items():
+                    apps[app] = apps.get(app, 0) + session["bytes"][app]
+                    holder = ref()
+                    if getattr(holder, "spilled", False):
+                        spilled.append(app)
+                sessions.append({
+                    "session": session_id,
+                    "apps": sorted(session["holders"]),
+                    "bytes": sum(session["bytes"].values()),
+                    "idle": now - session["last_active"],
+                    "spilled": spilled,
+                })
+            sessions.sort(key=lambda row: row["bytes"], reverse=True)
+            return {
+                "total": sum(apps.values()),
+                "budget": self.budget,
+                "apps": apps,
+                "sessions": sessions,
+                "spills": self.spills,
+                "spilled_bytes": self.spilled_bytes,
+            }
+
+    def _total(self):
+        return sum(sum(session["bytes"].values()) for session in self._sessions.values())
+
+    def _prune(self):
+        for session_id, session in list(self._sessions.items()):
+            for app, ref in list(session["holders"].items()):
+                if ref() is None:
+                    del session["holders"][app]
+                    del session["bytes"][app]
+            if not session["holders"]:
+                del self._sessions[session_id]
+
+
+@st.cache_resource
+def get_session_memory():
+    """Process-wide session memory tracker, created once per server."""
+    return SessionMemory()
+
+
+def track_memory(app, holder):
+    """Account one of this session's holders (e.g. a Conversation) under `app`."""
+    session_id = current_session_id()
+    if session_id:
+        get_session_memory().touch(session_id, app, holder)
+
+
+def session_storage(app):
+    """This session's spillable store for `app`'s large values, accounted on every run."""
+    key = f"{app}_storage"
+    if key not in st.session_state:
+        st.session_state[key] = SpillableState()
+    track_memory(app, st.session_state[key])
+    return st.session_state[key]
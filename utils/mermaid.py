@@ -0,0 +1,301 @@
+"""Lightweight Mermaid syntax checks for the common diagram types.
+
+This is not a full Mermaid parser. It catches the mistakes models make most
+often (unbalanced blocks, unquoted brackets in labels, malformed arrows and
+relationships) so they can be repaired before the diagram reaches the browser.
+Diagram types it does not know how to check are passed through as valid.
+"""
+
+import re
+
+_PAIRS = {"(": ")", "[": "]", "{": "}"}
+
+# Diagram types Mermaid supports but we do not check
+_UNCHECKED_TYPES = {
+    "gantt", "pie", "journey", "gitGraph", "mindmap", "timeline", "quadrantChart",
+    "requirementDiagram", "C4Context", "C4Container", "C4Component", "C4Dynamic",
+    "C4Deployment", "sankey-beta", "xychart-beta", "block-beta", "packet-beta",
+    "architecture-beta", "kanban", "radar-beta", "zenuml",
+}
+
+_FLOWCHART_DIRECTIVES = ("classDef ", "class ", "style ", "linkStyle ", "click ", "direction ")
+
+_SEQUENCE_MESSAGE = re.compile(
+    r"^(?P<source>[^:;]+?)\s*(?P<arrow><<-->>|<<->>|-->>|->>|--x|-x|--\)|-\)|-->|->)"
+    r"\s*[+-]?\s*(?P<target>[^:;]+?)\s*(?P<text>:.*)?$"
+)
+_SEQUENCE_KEYWORDS = (
+    "participant", "actor", "note", "activate", "deactivate", "autonumber", "title",
+    "acctitle", "accdescr", "create", "destroy", "link", "links", "properties", "details",
+)
+_SEQUENCE_BLOCKS = ("loop", "alt", "opt", "par", "critical", "break", "rect", "box")
+_SEQUENCE_BRANCHES = {"else": "alt", "and": "par", "option": "critical"}
+
+_CLASS_RELATION = re.compile(
+    r'^\S+(\s+"[^"]*")?\s*(<\|--|\*--|o--|<--|<\.\.|<\|\.\.|-->|--\*|--o|--\|>|\.\.>|\.\.\|>|--|\.\.)'
+    r'\s*("[^"]*"\s*)?\S+(\s*:.*)?$'
+)
+
+_ER_RELATION = re.compile(
+    r'^(?:"[^"]+"|[\w\-]+)\s*(?:\|o|\|\||\}o|\}\|)(?:--|\.\.)(?:o\||\|\||o\{|\|\{)\s*'
+    r'(?:"[^"]+"|[\w\-]+)\s*:\s*\S.*$'
+)
+_ER_ATTRIBUTE = re.compile(
+    r'^\*?[A-Za-z_][\w\-\[\]\(\)]*\s+\*?[A-Za-z_][\w\-\[\]\(\)]*'
+    r'(\s+(PK|FK|UK)(\s*,\s*(PK|FK|UK))*)?(\s+"[^"]*")?$'
+)
+
+
+def validate_mermaid(code):
+    """Return a list of human-readable syntax errors; empty if the code looks valid."""
+    statements = list(_statements(code))
+    if not statements:
+        return ["The diagram is empty."]
+
+    _, header = statements[0]
+    kind = header.split()[0]
+    body = statements[1:]
+
+    if kind in ("flowchart", "graph"):
+        return _check_flowchart(body)
+    if kind == "sequenceDiagram":
+        return _check_sequence(body)
+    if kind in ("classDiagram", "classDiagram-v2"):
+        return _check_class(body)
+    if kind == "erDiagram":
+        return _check_er(body)
+    if kind in ("stateDiagram", "stateDiagram-v2"):
+        return _check_state(body)
+    if kind in _UNCHECKED_TYPES:
+        return []
+    return [f"Line {statements[0][0]}: unknown diagram type '{kind}'."]
+
+
+def _statements(code):
+    """Yield (line number, stripped line), skipping comments, directives and front matter."""
+    seen_statement = False
+    in_front_matter = False
+    for number, line in enumerate(code.splitlines(), start=1):
+        stripped = line.strip()
+        if in_front_matter:
+            in_front_matter = stripped != "---"
+            continue
+        if not stripped or stripped.startswith("%%"):
+            continue
+        if stripped == "---" and not seen_statement:
+            in_front_matter = True
+            continue
+        seen_statement = True
+        yield number, stripped
+
+
+def _check_flowchart(statements):
+    errors = []
+    depth = 0
+    for number, line in statements:
+        for statement in _split_semicolons(line):
+            if statement == "end":
+                depth -= 1
+                if depth < 0:
+                    errors.append(f"Line {number}: 'end' without a matching 'subgraph'.")
+                    depth = 0
+                continue
+            if statement.startswith("subgraph"):
+                depth += 1
+                continue
+            if statement.startswith(_FLOWCHART_DIRECTIVES):
+                continue
+            errors.extend(f"Line {number}: {error}" for error in _check_flowchart_statement(statement))
+    if depth > 0:
+        errors.append(f"{depth} 'subgraph' block(s) are missing their closing 'end'.")
+    return errors
+
+
+def _check_flowchart_statement(statement):
+    """Check node shapes and edge labels in one flowchart statement."""
+    errors = []
+    skeleton = []
+    position = 0
+    length = len(statement)
+    while position < length:
+        char = statement[position]
+        if char == '"':
+            closing = statement.find('"', position + 1)
+            if closing == -1:
+                return ["unclosed double quote."]
+            position = closing + 1
+            skeleton.append("_")
+            continue
+        if char == "|":
+            closing = statement.find("|", position + 1)
+            if closing == -1:
+                return ["edge label is missing its closing '|'."]
+            label = statement[position + 1:closing].strip()
+            if not label.startswith('"') and any(bracket in label for bracket in "()[]{}"):
+                errors.append(f"edge label '{label}' contains brackets; wrap it in double quotes.")
+            position = closing + 1
+            skeleton.append("_")
+            continue
+        # A ">" straight after a node ID opens the asymmetric shape, e.g. A>label]
+        asymmetric = char == ">" and position > 0 and (statement[position - 1].isalnum() or statement[position - 1] == "_")
+        if char in _PAIRS or asymmetric:
+            # Shape openers can stack, e.g. "((", "[(", "{{", "(["
+            opener_end = position + 1
+            while opener_end < length and statement[opener_end] in _PAIRS and opener_end - position < 3 and not asymmetric:
+                opener_end += 1
+            opener = statement[position:opener_end]
+            closer = "]" if asymmetric else "".join(_PAIRS[bracket] for bracket in reversed(opener))
+            label_start = opener_end
+            if statement[label_start:label_start + 1] == '"':
+                quote_end = statement.find('"', label_start + 1)
+                if quote_end == -1:
+                    return ["unclosed double quote."]
+                label_start = quote_end + 1
+            closing = statement.find(closer, label_start)
+            if closing == -1:
+                return [f"'{opener}' is never closed with '{closer}'."]
+            label = statement[label_start:closing]
+            if any(bracket in label for bracket in "()[]{}"):
+                errors.append(f"node label '{label.strip()}' contains brackets; wrap it in double quotes.")
+            position = closing + len(closer)
+            skeleton.append("_")
+            continue
+        if char in ")]}":
+            return [f"unexpected '{char}'."]
+        skeleton.append(char)
+        position += 1
+
+    if re.search(r"(^|[\s&>-])end($|[\s&])", "".join(skeleton)):
+        errors.append("'end' is reserved and cannot be a node ID; use e.g. 'End' or 'finish'.")
+    return errors
+
+
+def _split_semicolons(line):
+    parts = []
+    current = []
+    quoted = False
+    for char in line:
+        if char == '"':
+            quoted = not quoted
+        if char == ";" and not quoted:
+            parts.append("".join(current).strip())
+            current = []
+        else:
+            current.append(char)
+    parts.append("".join(current).strip())
+    return [part for part in parts if part]
+
+
+def _check_sequence(statements):
+    errors = []
+    blocks = []
+    for number, line in statements:
+        word = line.split()[0].rstrip(":").lower()
+        if word in _SEQUENCE_BLOCKS:
+            blocks.append(word)
+        elif word in _SEQUENCE_BRANCHES:
+            if not blocks or blocks[-1] != _SEQUENCE_BRANCHES[word]:
+                errors.append(f"Line {number}: '{word}' can only be used inside an '{_SEQUENCE_BRANCHES[word]}' block.")
+        elif word == "end":
+            if blocks:
+                blocks.pop()
+            else:
+                errors.append(f"Line {number}: 'end' without a matching block.")
+        elif word in _SEQUENCE_KEYWORDS:
+            continue
+        else:
+            message = _SEQUENCE_MESSAGE.match(line)
+            if not message:
+                errors.append(f"Line {number}: unrecognized statement '{line}'.")
+            elif not message.group("text") or not message.group("text")[1:].strip():
+                errors.append(f"Line {number}: message is missing its ': text' part.")
+    if blocks:
+        errors.append(f"Block(s) {', '.join(blocks)} are missing their closing 'end'.")
+    return errors
+
+
+def _check_class(statements):
+    errors = []
+    depth = 0
+    for number, line in statements:
+        if line == "}":
+            depth -= 1
+            if depth < 0:
+                errors.append(f"Line {number}: '}}' without a matching '{{'.")
+                depth = 0
+            continue
+        if depth > 0:
+            # Member lines inside a class body are free-form
+            depth += line.count("{") - line.count("}")
+            continue
+        if line.endswith("{"):
+            depth += 1
+        if re.match(r"^class\s+\w+<", line):
+            errors.append(f"Line {number}: use '~T~' instead of '<T>' for generic classes.")
+        elif ("--" in line or ".." in line) and not line.startswith(("note", "link", "click", "callback")):
+            if not _CLASS_RELATION.match(line.rstrip("{").strip()):
+                errors.append(f"Line {number}: invalid relationship '{line}'.")
+    if depth > 0:
+        errors.append("A class body is missing its closing '}'.")
+    return errors
+
+
+def _check_er(statements):
+    errors = []
+    in_entity = False
+    for number, line in statements:
+        if in_entity:
+            if line == "}":
+                in_entity = False
+            elif not _ER_ATTRIBUTE.match(line):
+                errors.append(
+                    f"Line {number}: invalid attribute '{line}'; expected 'type name [PK|FK|UK] [\"comment\"]' "
+                    "with no commas or spaces inside the type."
+                )
+            continue
+        if line.endswith("{"):
+            in_entity = True
+        elif line == "}":
+            errors.append(f"Line {number}: '}}' without a matching entity block.")
+        elif "--" in line or ".." in line:
+            if not _ER_RELATION.match(line):
+                errors.append(
+                    f"Line {number}: invalid relationship '{line}'; expected e.g. 'CUSTOMER ||--o{{ ORDER : places'."
+                )
+    if in_entity:
+        errors.append("An entity block is missing its closing '}'.")
+    return errors
+
+
+def _check_state(statements):
+    errors = []
+    depth = 0
+    in_note = False
+    for number, line in statements:
+        if in_note:
+            in_note = line != "end note"
+            continue
+        if line.startswith("note ") and ":" not in line:
+            in_note = True
+            continue
+        if line == "}":
+            depth -= 1
+            if depth < 0:
+                errors.append(f"Line {number}: '}}' without a matching '{{'.")
+                depth = 0
+            continue
+        if line.endswith("{"):
+            depth += 1
+            continue
+        if "-->" in line:
+            source, _, rest = line.partition("-->")
+            target = rest.split(":", 1)[0].strip()
+            if not source.strip() or not target:
+                errors.append(f"Line {number}: transition '{line}' needs a state on both sides.")
+        elif re.search(r"\s->\s|\w->\w", line):
+            errors.append(f"Line {number}: transitions use '-->', not '->'.")
+    if in_note:
+        errors.append("A note is missing its closing 'end note'.")
+    if depth > 0:
+        errors.append("A composite state is missing its closing '}'.")
+    return errors
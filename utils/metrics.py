@@ -0,0 +1,318 @@
+"""Per-request latency and throughput metrics for upstream model calls.
+
+Every page records time to first token, throughput, total latency and
+request/response sizes per (page, model). The collector keeps a rolling
+window of recent samples for the sidebar panel and cumulative histograms
+that are written out in the Prometheus text format for the scraper.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+
+import streamlit as st
+
+from utils.context import estimate_text_tokens
+from utils.paths import data_path
+
+# Samples kept per (page, model) for the rolling percentiles in the panel
+ROLLING_WINDOW = int(os.environ.get("METRICS_ROLLING_WINDOW", "500"))
+
+# The Prometheus file is rewritten at most every METRICS_WRITE_INTERVAL seconds
+# (defaults to metrics/ai_world.prom under DATA_DIR)
+METRICS_FILE = os.environ.get("METRICS_FILE")
+METRICS_WRITE_INTERVAL = float(os.environ.get("METRICS_WRITE_INTERVAL", "10"))
+
+# name: (help text, histogram bucket upper bounds)
+HISTOGRAMS = {
+    "ttft_seconds": (
+        "Time from sending the request to the first content token",
+        (0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32),
+    ),
+    "latency_seconds": (
+        "Total time from sending the request to the end of the response",
+        (0.25, 0.5, 1, 2, 4, 8, 16, 32, 64, 128),
+    ),
+    "tokens_per_second": (
+        "Estimated completion tokens per second after the first token",
+        (5, 10, 20, 40, 80, 160, 320),
+    ),
+    "request_bytes": (
+        "Size of the JSON request payload",
+        (256, 1024, 4096, 16384, 65536, 262144, 1048576),
+    ),
+    "response_bytes": (
+        "Size of the response text",
+        (256, 1024, 4096, 16384, 65536, 262144),
+    ),
+}
+
+COUNTERS = {
+    "requests": "Upstream requests",
+    "errors": "Upstream requests that raised an error",
+    "parse_failures": "Responses that could not be parsed into the expected structure",
+    "repairs": "Malformed structured responses recovered by the repair parser",
+    "cancelled": "Requests closed before they finished: hedged losers, Stop presses and streams of sessions that went away",
+    "retries": "Requests retried after a transient failure",
+    "fallbacks": "Requests answered by a fallback model",
+    "resumes": "Streams resumed from the partial answer after breaking",
+    "prompt_tokens": "Prompt tokens reported by the provider",
+    "cached_tokens": "Prompt tokens the provider read from its prompt cache",
+}
+
+PREFIX = "ai_world_"
+
+
+class _Series:
+    """Rolling samples plus cumulative histogram buckets for one (page, model)."""
+
+    def __init__(self, window):
+        self.samples = {name: deque(maxlen=window) for name in HISTOGRAMS}
+        self.buckets = {name: [0] * len(bounds) for name, (_, bounds) in HISTOGRAMS.items()}
+        self.sums = dict.fromkeys(HISTOGRAMS, 0.0)
+        self.counts = dict.fromkeys(HISTOGRAMS, 0)
+
+    def observe(self, name, value):
+        self.samples[name].append(value)
+        self.sums[name] += value
+        self.counts[name] += 1
+        for index, bound in enumerate(HISTOGRAMS[name][1]):
+            if value <= bound:
+                self.buckets[name][index] += 1
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a sequence; None when it is empty."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(int(fraction * len(ordered)), len(ordered) - 1)
+    return ordered[index]
+
+
+class MetricsCollector:
+    """Thread-safe store for request metrics, shared by every session."""
+
+    def __init__(self, window=ROLLING_WINDOW, path=METRICS_FILE, write_interval=METRICS_WRITE_INTERVAL):
+        self.window = window
+        self.path = path or data_path("metrics", "ai_world.prom")
+        self.write_interval = write_interval
+        self._series = {}
+        self._counters = {}
+        self._last_write = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, page, model, **values):
+        """Record one request's measurements, e.g. observe(page, model, ttft_seconds=0.4)."""
+        with self._lock:
+            series = self._series.get((page, model))
+            if series is None:
+                series = self._series[(page, model)] = _Series(self.window)
+            for name, value in values.items():
+                if value is not None:
+                    series.observe(name, value)
+        self.write()
+
+    def increment(self, name, page, model, amount=1):
+        """Add to one of the COUNTERS."""
+        with self._lock:
+            key = (name, page, model)
+            self._counters[key] = self._counters.get(key, 0) + amount
+        self.write()
+
+    def track(self, page, model):
+        """Return a RequestTracker for one call; safe to use from worker threads."""
+        return RequestTracker(self, page, model)
+
+    def count(self, name, page, model):
+        with self._lock:
+            return self._counters.get((name, page, model), 0)
+
+    def summary(self, page=None):
+        """Rolling per-model figures for the panel, optionally limited to one page."""
+        rows = {}
+        with self._lock:
+            for (series_page, model), series in self._series.items():
+                if page is None or series_page == page:
+                    row = rows.setdefault(model, {name: [] for name in HISTOGRAMS})
+                    for name in HISTOGRAMS:
+                        row[name].extend(series.samples[name])
+            by_model = {}
+            for (name, counter_page, model), value in self._counters.items():
+                if page is None or counter_page == page:
+                    by_model.setdefault(model, dict.fromkeys(COUNTERS, 0))[name] += value
+
+        summary = []
+        for model in sorted(set(rows) | set(by_model)):
+            samples = rows.get(model, {name: [] for name in HISTOGRAMS})
+            counts = by_model.get(model, dict.fromkeys(COUNTERS, 0))
+            summary.append({
+                "model": model,
+                "requests": counts["requests"],
+                "errors": counts["errors"],
+                "parse_failures": counts["parse_failures"],
+                "cancelled": counts["cancelled"],
+                "cached_share": counts["cached_tokens"] / counts["prompt_tokens"] if counts["prompt_tokens"] else None,
+                "ttft_p50": percentile(samples["ttft_seconds"], 0.5),
+                "ttft_p95": percentile(samples["ttft_seconds"], 0.95),
+                "latency_p50": percentile(samples["latency_seconds"], 0.5),
+                "latency_p95": percentile(samples["latency_seconds"], 0.95),
+                "tokens_per_second_p50": percentile(samples["tokens_per_second"], 0.5),
+            })
+        return summary
+
+    def prometheus_text(self):
+        """Render every histogram and counter in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name, (help_text, bounds) in HISTOGRAMS.items():
+                metric = PREFIX + name
+                lines.append(f"# HELP {metric} {help_text}")
+                lines.append(f"# TYPE {metric} histogram")
+                for (page, model), series in sorted(self._series.items()):
+                    if not series.counts[name]:
+                        continue
+                    labels = f'page="{_escape(page)}",model="{_escape(model)}"'
+                    for bound, count in zip(bounds, series.buckets[name]):
+                        lines.append(f'{metric}_bucket{{{labels},le="{bound}"}} {count}')
+                    lines.append(f'{metric}_bucket{{{labels},le="+Inf"}} {series.counts[name]}')
+                    lines.append(f"{metric}_sum{{{labels}}} {series.sums[name]:.6f}")
+                    lines.append(f"{metric}_count{{{labels}}} {series.counts[name]}")
+            for name, help_text in COUNTERS.items():
+                metric = f"{PREFIX}{name}_total"
+                lines.append(f"# HELP {metric} {help_text}")
+                lines.append(f"# TYPE {metric} counter")
+                for (counter, page, model), value in sorted(self._counters.items()):
+                    if counter == name:
+                        lines.append(f'{metric}{{page="{_escape(page)}",model="{_escape(model)}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def write(self, force=False):
+        """Atomically rewrite the metrics file if the write interval has passed."""
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._last_write < self.write_interval:
+                return
+            self._last_write = now
+        try:
+            temporary = f"{self.path}.{os.getpid()}.tmp"
+            with open(temporary, "w", encoding="utf-8") as handle:
+                handle.write(self.prometheus_text())
+            os.replace(temporary, self.path)
+        except OSError:
+            # Metrics are best-effort; never fail a request over them
+            pass
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class RequestTracker:
+    """Times a single upstream call and reports it to the collector when finished.
+
+    Call start() with the messages right before the request is sent, chunk()
+    for every piece of content received, and finish() at the end - or
+    finish(error=e) from an exception handler. Only the first finish() counts.
+    """
+
+    def __init__(self, collector, page, model):
+        self.collector = collector
+        self.page = page
+        self.model = model
+        self.started = None
+        self.first_token = None
+        self.request_bytes = None
+        self.response_bytes = 0
+        self.tokens = 0
+        self.finished = False
+
+    def start(self, messages, **request_options):
+        payload = {"model": self.model, "messages": messages, **request_options}
+        self.request_bytes = len(json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8"))
+        self.started = time.perf_counter()
+        return self
+
+    def chunk(self, content):
+        if not content:
+            return
+        if self.first_token is None:
+            self.first_token = time.perf_counter()
+        self.response_bytes += len(content.encode("utf-8"))
+        self.tokens += estimate_text_tokens(content)
+
+    def finish(self, error=None, completion_tokens=None, cancelled=False, prompt_tokens=None, cached_tokens=None):
+        """Record the request; pass the token counts when the API reports usage."""
+        if self.finished:
+            return
+        self.finished = True
+        self.collector.increment("requests", self.page, self.model)
+        if prompt_tokens:
+            self.collector.increment("prompt_tokens", self.page, self.model, prompt_tokens)
+            self.collector.increment("cached_tokens", self.page, self.model, cached_tokens or 0)
+        if error is not None:
+            self.collector.increment("errors", self.page, self.model)
+        if cancelled:
+            self.collector.increment("cancelled", self.page, self.model)
+        if self.started is None:
+            return
+
+        ended = time.perf_counter()
+        tokens = completion_tokens or self.tokens
+        values = {"latency_seconds": ended - self.started, "request_bytes": self.request_bytes}
+        if self.first_token is not None:
+            values["ttft_seconds"] = self.first_token - self.started
+            values["response_bytes"] = self.response_bytes
+            generation = ended - self.first_token
+            if error is None and tokens and generation > 0:
+                values["tokens_per_second"] = tokens / generation
+        if error is not None or cancelled:
+            # Failed and cancelled calls only count as such; their timings would skew the histograms
+            values = {"request_bytes": self.request_bytes}
+        self.collector.observe(self.page, self.model, **values)
+
+
+@st.cache_resource
+def get_metrics():
+    """Process-wide metrics collector, created once per server."""
+    return MetricsCollector()
+
+
+def track_request(page, model):
+    """Return a RequestTracker reporting to the shared collector."""
+    return get_metrics().track(page, model)
+
+
+def _format(value, unit):
+    return "-" if value is None else f"{value:.2f}{unit}" if unit == "s" else f"{value:.0f}{unit}"
+
+
+def render_performance_panel(page):
+    """Sidebar panel with rolling per-model figures for this page."""
+    with st.expander("📈 Performance"):
+        all_pages = st.toggle("All pages", key=f"{page}_metrics_all_pages")
+        rows = get_metrics().summary(None if all_pages else page)
+        if not rows:
+            st.caption("No requests recorded yet.")
+            return
+
+        table = [
+            "| Model | Reqs | TTFT p50/p95 | Latency p50/p95 | Tok/s | Cached | Errors |",
+            "|---|---|---|---|---|---|---|",
+        ]
+        for row in rows:
+            errors = row["errors"] + row["parse_failures"]
+            table.append(
+                f"| `{row['model'].split('/')[-1]}` | {row['requests']} "
+                f"| {_format(row['ttft_p50'], 's')} / {_format(row['ttft_p95'], 's')} "
+                f"| {_format(row['latency_p50'], 's')} / {_format(row['latency_p95'], 's')} "
+                f"| {_format(row['tokens_per_second_p50'], '')} "
+                f"| {'-' if row['cached_share'] is None else format(row['cached_share'], '.0%')} | {errors} |"
+            )
+        st.markdown("\n".join(table))
+        st.caption(
+            f"Last {ROLLING_WINDOW} requests per model. Cached is the share of prompt tokens "
+            "read from the provider's prompt cache. Errors include unparseable responses."
+        )
@@ -0,0 +1,94 @@
+"""Process-wide pool of OpenRouter clients shared by every page and rerun."""
+
+import hashlib
+import importlib.util
+import os
+import threading
+import time
+
+import httpx
+import streamlit as st
+from openai import DefaultHttpxClient, OpenAI
+
+# Point at another OpenAI-compatible server (e.g. the benchmark mock) with OPENROUTER_BASE_URL
+OPENROUTER_BASE_URL = os.environ.get("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
+
+DEFAULT_HEADERS = {
+    "HTTP-Referer": "https://shahs-ai-world.hf.space",
+    "X-Title": "Shah's AI World",
+}
+
+# Connection pool tuning (override through environment variables)
+MAX_CONNECTIONS = int(os.environ.get("OPENROUTER_MAX_CONNECTIONS", "50"))
+MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get("OPENROUTER_MAX_KEEPALIVE", "20"))
+KEEPALIVE_EXPIRY = float(os.environ.get("OPENROUTER_KEEPALIVE_EXPIRY", "120"))
+CLIENT_IDLE_TTL = float(os.environ.get("OPENROUTER_CLIENT_IDLE_TTL", "1800"))
+
+# HTTP/2 needs the optional `h2` package; fall back to HTTP/1.1 keep-alive without it
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+class ClientRegistry:
+    """Hands out one long-lived client per (API key, base URL) and evicts idle ones."""
+
+    def __init__(self, idle_ttl=CLIENT_IDLE_TTL):
+        self.idle_ttl = idle_ttl
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def get(self, api_key, base_url=OPENROUTER_BASE_URL):
+        # Key on a digest so raw API keys are never kept as dict keys
+        key = (hashlib.sha256(api_key.encode("utf-8")).hexdigest(), base_url)
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now, keep=key)
+            entry = self._clients.get(key)
+            if entry is None:
+                entry = {"client": _build_client(api_key, base_url), "last_used": now}
+                self._clients[key] = entry
+            entry["last_used"] = now
+            return entry["client"]
+
+    def stats(self):
+        """Return the number of pooled clients and whether HTTP/2 is in use."""
+        with self._lock:
+            return {"clients": len(self._clients), "http2": HTTP2_AVAILABLE}
+
+    def _evict_idle(self, now, keep=None):
+        for key in list(self._clients):
+            if key == keep:
+                continue
+            entry = self._clients[key]
+            if now - entry["last_used"] > self.idle_ttl:
+                del self._clients[key]
+                entry["client"].close()
+
+
+def _build_client(api_key, base_url):
+    http_client = DefaultHttpxClient(
+        http2=HTTP2_AVAILABLE,
+        limits=httpx.Limits(
+            max_connections=MAX_CONNECTIONS,
+            max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=KEEPALIVE_EXPIRY,
+        ),
+    )
+    return OpenAI(
+        base_url=base_url,
+        api_key=api_key,
+        default_headers=DEFAULT_HEADERS,
+        http_client=http_client,
+        # Retries, backoff and fallbacks are handled by utils.resilience
+        max_retries=0,
+    )
+
+
+@st.cache_resource
+def get_client_registry():
+    """Process-wide client registry, created once per server."""
+    return ClientRegistry()
+
+
+def get_client(api_key, base_url=OPENROUTER_BASE_URL):
+    """Return the pooled OpenRouter client for this API key."""
+    return get_client_registry().get(api_key, base_url)
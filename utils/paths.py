@@ -0,0 +1,24 @@
+"""Where the app keeps data that should survive restarts."""
+
+import os
+import tempfile
+
+
+def _default_data_dir():
+    # Hugging Face Spaces mounts persistent storage at /data when it is enabled
+    if os.path.isdir("/data") and os.access("/data", os.W_OK):
+        return "/data/ai-world"
+    home = os.path.expanduser("~")
+    if os.access(home, os.W_OK):
+        return os.path.join(home, ".cache", "ai-world")
+    return os.path.join(tempfile.gettempdir(), "ai-world")
+
+
+DATA_DIR = os.environ.get("AI_WORLD_DATA_DIR") or _default_data_dir()
+
+
+def data_path(*parts):
+    """Return a path inside DATA_DIR, creating its parent directory."""
+    path = os.path.join(DATA_DIR, *parts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
@@ -0,0 +1,66 @@
+"""Provider prompt caching for static system prompts and stable conversation prefixes.
+
+Anthropic (and Gemini) models behind OpenRouter only cache a prompt prefix
+up to an explicit `cache_control` breakpoint. Requests to them mark the end
+of the static system prompt and the end of the conversation so far, so the
+next turn reads both back from the cache instead of prefilling them again.
+Other providers (DeepSeek, OpenAI) cache prefixes on their own and get the
+messages unchanged. Cached-token counts come back in the response usage.
+"""
+
+# Model id prefixes that take explicit cache_control breakpoints
+CACHE_CONTROL_PREFIXES = ("anthropic/", "google/gemini")
+
+EPHEMERAL = {"type": "ephemeral"}
+
+
+def supports_cache_control(model):
+    return bool(model) and model.startswith(CACHE_CONTROL_PREFIXES)
+
+
+def _with_breakpoint(message):
+    """A copy of the message whose last text part carries a cache breakpoint."""
+    content = message.get("content")
+    if isinstance(content, str):
+        if not content:
+            return message
+        parts = [{"type": "text", "text": content}]
+    elif isinstance(content, list) and content:
+        parts = [dict(part) for part in content]
+    else:
+        return message
+    for part in reversed(parts):
+        if part.get("type") == "text" and part.get("text"):
+            part["cache_control"] = EPHEMERAL
+            return {**message, "content": parts}
+    return message
+
+
+def cacheable_messages(messages, model):
+    """Messages for `model` with breakpoints after the system prompt and the last message.
+
+    The first breakpoint covers the static system prompt, which is shared by
+    every conversation on a page; the second covers the whole conversation
+    so far, which the next turn repeats as its prefix. The caller's list is
+    never modified.
+    """
+    if not messages or not supports_cache_control(model):
+        return messages
+    marked = list(messages)
+    if marked[0].get("role") == "system":
+        marked[0] = _with_breakpoint(marked[0])
+    if len(marked) > 1:
+        marked[-1] = _with_breakpoint(marked[-1])
+    return marked
+
+
+def usage_counts(usage):
+    """Token counts from a response's usage, as keyword arguments for RequestTracker.finish()."""
+    if usage is None:
+        return {}
+    details = getattr(usage, "prompt_tokens_details", None)
+    return {
+        "prompt_tokens": getattr(usage, "prompt_tokens", None),
+        "completion_tokens": getattr(usage, "completion_tokens", None),
+        "cached_tokens": getattr(details, "cached_tokens", None) or 0,
+    }
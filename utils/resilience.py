@@ -0,0 +1,188 @@
+"""Retries, per-model circuit breakers and fallback chains for upstream calls.
+
+Transient failures (rate limits, 5xx responses, dropped connections) are
+retried with jittered exponential backoff. A model that keeps failing has
+its circuit opened for a while, and requests fall through to the next model
+in the page's model list instead of waiting on it.
+"""
+
+import os
+import random
+import threading
+import time
+
+import httpx
+import openai
+import streamlit as st
+
+from utils.prompt_cache import cacheable_messages, usage_counts
+
+# Retries per model before falling through to the next one
+RETRY_ATTEMPTS = int(os.environ.get("OPENROUTER_RETRY_ATTEMPTS", "2"))
+RETRY_BASE_DELAY = float(os.environ.get("OPENROUTER_RETRY_BASE_DELAY", "0.5"))
+RETRY_MAX_DELAY = float(os.environ.get("OPENROUTER_RETRY_MAX_DELAY", "8"))
+
+# Consecutive failures that open a model's circuit, and how long it stays open
+BREAKER_FAILURES = int(os.environ.get("OPENROUTER_BREAKER_FAILURES", "3"))
+BREAKER_RESET_SECONDS = float(os.environ.get("OPENROUTER_BREAKER_RESET", "30"))
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504, 529}
+
+
+class ModelUnavailableError(Exception):
+    """Every model in the chain has an open circuit."""
+
+
+class StreamInterruptedError(Exception):
+    """The stream ended without a finish reason, i.e. the connection was cut."""
+
+
+def is_retryable(error):
+    """True for failures worth retrying: rate limits, 5xx, timeouts and dropped streams."""
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in RETRYABLE_STATUS
+    if isinstance(error, (openai.APIConnectionError, httpx.TransportError, StreamInterruptedError)):
+        return True
+    # A bare APIError is raised for error events sent in the middle of a stream
+    return type(error) is openai.APIError
+
+
+def should_fall_through(error):
+    """True when another model might succeed where this one failed."""
+    if is_retryable(error) or isinstance(error, ModelUnavailableError):
+        return True
+    # The model may have been removed or may not support this request
+    return isinstance(error, (openai.NotFoundError, openai.UnprocessableEntityError))
+
+
+def backoff_delay(attempt, error=None):
+    """Seconds to wait before retry number `attempt` (1-based), honouring Retry-After."""
+    if isinstance(error, openai.APIStatusError):
+        retry_after = error.response.headers.get("retry-after")
+        try:
+            return min(float(retry_after), RETRY_MAX_DELAY)
+        except (TypeError, ValueError):
+            pass
+    # Equal jitter: half the exponential step, plus a random share of the other half
+    step = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempt - 1))
+    return step / 2 + random.uniform(0, step / 2)
+
+
+def error_hint(error):
+    """What to tell the user after a request finally failed."""
+    if isinstance(error, (openai.AuthenticationError, openai.PermissionDeniedError)):
+        return "Please check your API key and try again."
+    if isinstance(error, openai.RateLimitError):
+        return "OpenRouter is rate limiting requests. Please wait a moment and try again."
+    if isinstance(error, ModelUnavailableError):
+        return "All models are failing right now. Please try again in a minute or pick another model."
+    if is_retryable(error):
+        return "The model provider is having trouble. Please try again, or pick another model."
+    return "Please check your API key and try again."
+
+
+class CircuitBreaker:
+    """Per-model circuit breaker shared by every session.
+
+    After BREAKER_FAILURES consecutive failures a model's circuit opens and
+    it is skipped for BREAKER_RESET_SECONDS. Then one trial request is let
+    through (half-open); success closes the circuit, failure re-opens it.
+    """
+
+    def __init__(self, failures=BREAKER_FAILURES, reset_seconds=BREAKER_RESET_SECONDS):
+        self.failures = failures
+        self.reset_seconds = reset_seconds
+        self._state = {}
+        self._lock = threading.Lock()
+
+    def allow(self, model):
+        """Whether a request to this model should be attempted now."""
+        with self._lock:
+            state = self._state.get(model)
+            if state is None or state["opened_at"] is None:
+                return True
+            if time.monotonic() - state["opened_at"] < self.reset_seconds:
+                return False
+            # Half-open: let one trial through; another only if it never reports back
+            state["opened_at"] = time.monotonic()
+            state["trial"] = True
+            return True
+
+    def record_success(self, model):
+        with self._lock:
+            self._state.pop(model, None)
+
+    def record_failure(self, model):
+        with self._lock:
+            state = self._state.setdefault(model, {"failures": 0, "opened_at": None, "trial": False})
+            state["failures"] += 1
+            if state["trial"] or state["failures"] >= self.failures:
+                state["opened_at"] = time.monotonic()
+                state["trial"] = False
+
+    def is_open(self, model):
+        """Whether the model is inside its open period; unlike allow(), never claims the half-open trial."""
+        with self._lock:
+            state = self._state.get(model)
+            if state is None or state["opened_at"] is None:
+                return False
+            return time.monotonic() - state["opened_at"] < self.reset_seconds
+
+
+@st.cache_resource
+def get_circuit_breaker():
+    """Process-wide circuit breaker, created once per server."""
+    return CircuitBreaker()
+
+
+def fallback_chain(model, fallbacks=()):
+    """The model followed by the other fallbacks, in order and without duplicates."""
+    return list(dict.fromkeys([model, *fallbacks]))
+
+
+def resilient_create(client, model, fallbacks=(), breaker=None, metrics=None, page=None, **create_kwargs):
+    """Non-streaming create() with retries, fallback and prompt caching; returns (response, model used).
+
+    With a `metrics` collector, every attempt is recorded under `page` against
+    the model it was sent to, along with the retries and fallbacks it took.
+    """
+    breaker = breaker or get_circuit_breaker()
+    last_error = None
+    for candidate in fallback_chain(model, fallbacks):
+        if not breaker.allow(candidate):
+            continue
+        if candidate != model and metrics is not None:
+            metrics.increment("fallbacks", page, candidate)
+        for attempt in range(RETRY_ATTEMPTS + 1):
+            if attempt:
+                if metrics is not None:
+                    metrics.increment("retries", page, candidate)
+                time.sleep(backoff_delay(attempt, last_error))
+            request = create_kwargs
+            if "messages" in create_kwargs:
+                request = {**create_kwargs, "messages": cacheable_messages(create_kwargs["messages"], candidate)}
+            tracker = None
+            if metrics is not None:
+                tracker = metrics.track(page, candidate).start(request.get("messages", []))
+            try:
+                response = client.chat.completions.create(model=candidate, **request)
+            except Exception as e:
+                if tracker is not None:
+                    tracker.finish(error=e)
+                last_error = e
+                if not is_retryable(e):
+                    # The provider answered, so the model itself is healthy
+                    breaker.record_success(candidate)
+                    if should_fall_through(e):
+                        break
+                    raise
+                breaker.record_failure(candidate)
+                if not breaker.allow(candidate):
+                    break
+                continue
+            if tracker is not None:
+                tracker.chunk(response.choices[0].message.content if response.choices else "")
+                tracker.finish(**usage_counts(response.usage))
+            breaker.record_success(candidate)
+            return response, candidate
+    raise last_error or ModelUnavailableError("All models are temporarily unavailable.")
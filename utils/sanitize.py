@@ -0,0 +1,67 @@
+"""Removes model special tokens from streamed output in a single pass."""
+
+import functools
+import re
+
+DEFAULT_SPECIAL_TOKENS = ("<s>", "<|im_start|>", "<|im_end|>", "<|OUT|>")
+
+# Extra tokens some models are known to leak, keyed by model ID
+MODEL_SPECIAL_TOKENS = {
+    "deepseek/deepseek-v3.2": DEFAULT_SPECIAL_TOKENS + (
+        "<｜begin▁of▁sentence｜>",
+        "<｜end▁of▁sentence｜>",
+    ),
+}
+
+
+def special_tokens_for(model):
+    """Return the special tokens to strip for a model."""
+    return MODEL_SPECIAL_TOKENS.get(model, DEFAULT_SPECIAL_TOKENS)
+
+
+@functools.lru_cache(maxsize=None)
+def _compile(tokens):
+    # Longest tokens first so overlapping tokens are removed whole
+    ordered = sorted(set(tokens), key=len, reverse=True)
+    pattern = re.compile("|".join(re.escape(token) for token in ordered))
+    prefixes = frozenset(token[:i] for token in ordered for i in range(1, len(token)))
+    longest_prefix = max((len(token) for token in ordered), default=1) - 1
+    return pattern, prefixes, longest_prefix
+
+
+class StreamSanitizer:
+    """Strips special tokens from a chunk stream, holding back possible token starts.
+
+    A chunk ending in e.g. "<|im_" is kept in a small tail buffer until the
+    next chunk shows whether it completes a token, so tokens split across
+    SSE chunks never reach the page.
+    """
+
+    def __init__(self, tokens=DEFAULT_SPECIAL_TOKENS):
+        self._pattern, self._prefixes, self._longest_prefix = _compile(tuple(tokens))
+        self._buffer = ""
+
+    @classmethod
+    def for_model(cls, model):
+        return cls(special_tokens_for(model))
+
+    def feed(self, chunk):
+        """Return the part of the stream that is safe to display."""
+        text = self._pattern.sub("", self._buffer + chunk)
+        for size in range(min(self._longest_prefix, len(text)), 0, -1):
+            if text[-size:] in self._prefixes:
+                self._buffer = text[-size:]
+                return text[:-size]
+        self._buffer = ""
+        return text
+
+    def flush(self):
+        """Release anything still held back once the stream has ended."""
+        text, self._buffer = self._buffer, ""
+        return text
+
+
+def sanitize(text, model=None):
+    """Strip special tokens from a complete piece of text."""
+    pattern, _, _ = _compile(tuple(special_tokens_for(model)))
+    return pattern.sub("", text)
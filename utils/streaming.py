@@ -0,0 +1,139 @@
+"""Frame-rate-limited renderer for streamed markdown answers."""
+
+import os
+import re
+import time
+
+import streamlit as st
+
+# Flush buffered chunks at most every FLUSH_INTERVAL seconds, or sooner once
+# FLUSH_BYTES characters are waiting
+FLUSH_INTERVAL = float(os.environ.get("STREAM_FLUSH_INTERVAL", "0.08"))
+FLUSH_BYTES = int(os.environ.get("STREAM_FLUSH_BYTES", "2048"))
+
+# Set STREAM_DEBUG=1 to show how many bytes each answer pushed to the browser
+DEBUG = os.environ.get("STREAM_DEBUG", "") not in ("", "0")
+
+CURSOR = "▌"
+
+_FENCE_OPEN = re.compile(r"^\s*(`{3,}|~{3,})")
+_FENCE_CLOSE = re.compile(r"^\s*(`{3,}|~{3,})\s*$")
+
+
+def split_complete_blocks(text):
+    """Split off markdown blocks that can no longer change.
+
+    A block is complete once its closing code fence has arrived, or once a
+    blank line is followed by a non-indented line (so list continuations and
+    indented content stay with their block). Returns (blocks, open_tail);
+    joining blocks + open_tail gives back the original text.
+    """
+    blocks = []
+    start = 0
+    pos = 0
+    fence = None
+    pending_break = None
+
+    for line in text.splitlines(keepends=True):
+        if not line.endswith("\n"):
+            break
+        end = pos + len(line)
+
+        if fence:
+            closing = _FENCE_CLOSE.match(line)
+            if closing and closing.group(1)[0] == fence[0] and len(closing.group(1)) >= len(fence):
+                fence = None
+                blocks.append(text[start:end])
+                start = end
+        elif not line.strip():
+            if pending_break is not None or text[start:pos].strip():
+                pending_break = end
+        else:
+            if pending_break is not None:
+                if not line[0].isspace():
+                    blocks.append(text[start:pending_break])
+                    start = pending_break
+                pending_break = None
+            opening = _FENCE_OPEN.match(line)
+            if opening:
+                fence = opening.group(1)
+
+        pos = end
+
+    return blocks, text[start:]
+
+
+class StreamRenderer:
+    """Buffers streamed chunks and re-renders only the open tail block.
+
+    Finished paragraphs and code fences are written once as their own
+    elements; the last, still-growing block is redrawn at most once per
+    frame instead of resending the whole answer on every token.
+    """
+
+    def __init__(self, container=None, flush_interval=FLUSH_INTERVAL,
+                 flush_bytes=FLUSH_BYTES, debug=DEBUG):
+        self.container = container if container is not None else st.container()
+        self.flush_interval = flush_interval
+        self.flush_bytes = flush_bytes
+        self.debug = debug
+
+        self.bytes_pushed = 0
+        self.frames = 0
+
+        self._committed = []
+        self._tail = ""
+        self._pending = []
+        self._pending_size = 0
+        self._last_flush = time.monotonic()
+        self._placeholder = self.container.empty()
+
+    @property
+    def text(self):
+        """Everything received so far."""
+        return "".join(self._committed) + self._tail + "".join(self._pending)
+
+    def write(self, chunk):
+        """Queue a chunk, flushing if the frame interval or byte threshold is reached."""
+        if not chunk:
+            return
+        self._pending.append(chunk)
+        self._pending_size += len(chunk)
+        if (self._pending_size >= self.flush_bytes
+                or time.monotonic() - self._last_flush >= self.flush_interval):
+            self.flush()
+
+    def flush(self, final=False):
+        """Commit finished blocks and redraw the open tail."""
+        if self._pending:
+            self._tail += "".join(self._pending)
+            self._pending = []
+            self._pending_size = 0
+
+        blocks, self._tail = split_complete_blocks(self._tail)
+        for block in blocks:
+            self._render(block)
+            self._committed.append(block)
+            self._placeholder = self.container.empty()
+
+        if final:
+            self._render(self._tail)
+        elif self._tail or blocks:
+            self._render(self._tail + CURSOR)
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        """Render whatever is left without the cursor and return the full text."""
+        self.flush(final=True)
+        text = self.text
+        if self.debug:
+            self.container.caption(
+                f"🔧 {self.bytes_pushed:,} bytes pushed in {self.frames} frames "
+                f"for a {len(text.encode('utf-8')):,} byte answer"
+            )
+        return text
+
+    def _render(self, markdown):
+        self._placeholder.markdown(markdown)
+        self.bytes_pushed += len(markdown.encode("utf-8"))
+        self.frames += 1
@@ -0,0 +1,123 @@
+"""Schema-constrained JSON output and a tolerant repair parser for what still slips through.
+
+Each model is asked for structured output the way its provider supports it
+through OpenRouter: a strict JSON schema (`response_format`), a forced tool
+call whose arguments follow the schema, or plain JSON mode. The streamed
+text is the JSON object either way (see utils.completions.chunk_content).
+"""
+
+import json
+import re
+
+# How each provider takes a schema, by model id prefix; other models rely on the prompt alone
+STRUCTURED_OUTPUT_MODES = (
+    ("openai/", "json_schema"),
+    ("google/", "json_schema"),
+    ("anthropic/", "tool"),
+    ("deepseek/", "json_object"),
+)
+
+# Models sometimes emit raw newlines inside strings; accept them
+_decode = json.JSONDecoder(strict=False).decode
+
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+_DANGLING_KEY = re.compile(r'([{,])\s*"(?:[^"\\]|\\.)*"\s*:?\s*$')
+_PYTHON_CONSTANTS = {"True": "true", "False": "false", "None": "null"}
+
+
+def structured_mode(model):
+    for prefix, mode in STRUCTURED_OUTPUT_MODES:
+        if model.startswith(prefix):
+            return mode
+    return None
+
+
+def structured_output_options(model, structured_output):
+    """Request options asking `model` for JSON matching structured_output = {"name", "schema"}."""
+    if not structured_output:
+        return {}
+    name = structured_output["name"]
+    schema = structured_output["schema"]
+    mode = structured_mode(model)
+    if mode == "json_schema":
+        return {"response_format": {"type": "json_schema", "json_schema": {"name": name, "strict": True, "schema": schema}}}
+    if mode == "tool":
+        return {
+            "tools": [{"type": "function", "function": {"name": name, "description": f"Return the {name}", "parameters": schema}}],
+            "tool_choice": {"type": "function", "function": {"name": name}},
+        }
+    if mode == "json_object":
+        return {"response_format": {"type": "json_object"}}
+    return {}
+
+
+def repair_json(text):
+    """Best-effort parse of a JSON object from model output; None if nothing usable.
+
+    Handles code fences and chatter around the object, trailing commas,
+    Python-style constants, and output cut off mid-way (open strings,
+    arrays and objects are closed, and a dangling key is dropped).
+    """
+    start = text.find("{")
+    if start == -1:
+        return None
+    end = text.rfind("}")
+    if end > start:
+        try:
+            value = _decode(text[start:end + 1])
+            return value if isinstance(value, dict) else None
+        except json.JSONDecodeError:
+            pass
+
+    pieces = []
+    stack = []
+    in_string = escape = False
+    word = ""
+    for char in text[start:]:
+        if in_string:
+            pieces.append(char)
+            if escape:
+                escape = False
+            elif char == "\\":
+                escape = True
+            elif char == '"':
+                in_string = False
+            continue
+        if char.isalpha():
+            word += char
+            continue
+        if word:
+            pieces.append(_PYTHON_CONSTANTS.get(word, word))
+            word = ""
+        if char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+        elif char in "}]":
+            if not stack:
+                break
+            stack.pop()
+            if not stack:
+                pieces.append(char)
+                break
+        pieces.append(char)
+    # A literal cut off mid-word is dropped, and its key with it
+    if word in _PYTHON_CONSTANTS or word in _PYTHON_CONSTANTS.values():
+        pieces.append(_PYTHON_CONSTANTS.get(word, word))
+
+    repaired = "".join(pieces)
+    if in_string:
+        if escape:
+            repaired = repaired[:-1]
+        repaired += '"'
+    repaired = repaired.rstrip()
+    # Cut off after a comma, or in an object after a key: drop the dangling part before closing
+    if stack and stack[-1] == "}":
+        repaired = _DANGLING_KEY.sub(r"\1", repaired)
+    repaired = repaired.rstrip().rstrip(",")
+    repaired += "".join(reversed(stack))
+    try:
+        value = _decode(_TRAILING_COMMA.sub(r"\1", repaired))
+    except json.JSONDecodeError:
+        return None
+    return value if isinstance(value, dict) else None
@@ -0,0 +1,53 @@
+"""Windowed rendering of long chat transcripts."""
+
+import functools
+
+import streamlit as st
+
+# Messages always shown as chat bubbles; older ones are paged behind a toggle
+RECENT_MESSAGES = 20
+PAGE_SIZE = 20
+
+ROLE_LABELS = {"user": "🧑 **You**", "assistant": "🤖 **Assistant**"}
+
+
+@functools.lru_cache(maxsize=256)
+def _page_markdown(turns):
+    """Render a page of finalized (role, content) turns as a single markdown blob."""
+    return "\n\n---\n\n".join(
+        f"{ROLE_LABELS.get(role, role)}\n\n{content}" for role, content in turns
+    )
+
+
+def render_transcript(messages, key, recent=RECENT_MESSAGES, page_size=PAGE_SIZE):
+    """Show the last `recent` messages in full and older ones one page at a time.
+
+    Older pages are only rendered when the user asks for them, and each page
+    is drawn as one cached markdown element, so rerun cost stays flat as the
+    conversation grows.
+    """
+    older = max(len(messages) - recent, 0)
+
+    if older:
+        pages = (older + page_size - 1) // page_size
+        if st.toggle(f"🕘 Show {older} earlier message{'s' if older > 1 else ''}", key=f"{key}_show_earlier"):
+            page = pages
+            if pages > 1:
+                page = st.select_slider(
+                    "Page",
+                    options=list(range(1, pages + 1)),
+                    value=pages,
+                    key=f"{key}_earlier_page"
+                )
+            start = (page - 1) * page_size
+            end = min(start + page_size, older)
+            turns = tuple((message["role"], message["content"]) for message in messages[start:end])
+            with st.container(border=True):
+                st.caption(f"Messages {start + 1}-{end} of {len(messages)}")
+                st.markdown(_page_markdown(turns))
+
+    for message in messages[older:]:
+        with st.chat_message(message["role"]):
+            st.markdown(message["content"])
+            if message.get("stopped"):
+                st.caption("⏹️ Stopped before the answer was complete")
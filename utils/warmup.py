@@ -0,0 +1,87 @@
+"""Background warm-up of cached answers for fixed prompts, such as conversation starters."""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+
+from utils.cache import get_cache
+from utils.metrics import get_metrics
+from utils.resilience import get_circuit_breaker, resilient_create
+from utils.sanitize import StreamSanitizer
+
+# Warm-up requests in flight at once, across all sessions
+WARMUP_WORKERS = int(os.environ.get("WARMUP_WORKERS", "2"))
+
+
+class CacheWarmer:
+    """Generates answers for known prompts in the background and stores them in a result cache.
+
+    Jobs are (cache key, messages) pairs. Keys that are already cached or
+    already queued are skipped, so asking for the same warm-up from many
+    sessions costs one request per key. Answers are stored as
+    {"answer": text, "model": model id}.
+    """
+
+    def __init__(self, cache, max_workers=WARMUP_WORKERS):
+        self.cache = cache
+        self.warmed = 0
+        self.failed = 0
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="warmup")
+        self._queued = set()
+        self._lock = threading.Lock()
+        # Handed to the worker threads, which cannot use st.cache_resource themselves
+        self._breaker = get_circuit_breaker()
+        self._metrics = get_metrics()
+
+    def warm(self, client, model, page, jobs, **request_options):
+        """Queue every job whose answer is not cached yet; returns how many were queued."""
+        queued = 0
+        for key, messages in jobs:
+            with self._lock:
+                if key in self._queued:
+                    continue
+                self._queued.add(key)
+            self._executor.submit(self._generate, client, model, page, key, messages, request_options)
+            queued += 1
+        return queued
+
+    def pending(self):
+        with self._lock:
+            return len(self._queued)
+
+    def _generate(self, client, model, page, key, messages, request_options):
+        # Runs in a worker thread - no Streamlit calls here
+        try:
+            if self.cache.contains(key):
+                return
+            response, used = resilient_create(
+                client,
+                model,
+                breaker=self._breaker,
+                metrics=self._metrics,
+                page=page,
+                messages=messages,
+                **request_options
+            )
+            content = response.choices[0].message.content or ""
+
+            # Drop special tokens, as the streamed answers do
+            sanitizer = StreamSanitizer.for_model(used)
+            answer = (sanitizer.feed(content) + sanitizer.flush()).strip()
+            if answer:
+                self.cache.set(key, {"answer": answer, "model": used})
+                self.warmed += 1
+        except Exception:
+            # Warm-up is best effort; the prompt is answered live instead
+            self.failed += 1
+        finally:
+            with self._lock:
+                self._queued.discard(key)
+
+
+@st.cache_resource
+def get_cache_warmer(name):
+    """Process-wide warmer filling the named result cache, created once per server."""
+    return CacheWarmer(get_cache(name))